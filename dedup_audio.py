@@ -0,0 +1,131 @@
+import subprocess
+
+import numpy as np
+
+from dedup_hash import pack_bits, hamming
+from dedup_watchdog import DecodeWatchdog
+
+# ==========================================
+# AUDIO FINGERPRINT (kênh phụ cho dedup)
+# ==========================================
+# Bản re-upload thường giữ nguyên audio nhưng sửa hình (crop, overlay, lật ngang...)
+# nên dhash của hình không bắt được. Audio được decode thành PCM mono tần số thấp,
+# chia thành các dải tần (thang log) rồi lấy dấu của độ chênh năng lượng giữa 2 dải kề nhau
+# theo thời gian (kiểu Haitsma-Kalker): mỗi frame = 64 bit = 1 số uint64, giống hash hình.
+
+AUDIO_RATE = 8000
+# 1000 mẫu / frame = 8 frame mỗi giây, cùng nhịp với TARGET_FPS của hash hình
+AUDIO_HOP = 1000
+AUDIO_WINDOW = 2048
+AUDIO_BANDS = 65           # 65 dải -> 64 bit chênh lệch
+AUDIO_FMIN = 300
+AUDIO_FMAX = 3000
+# Frame có năng lượng thấp hơn ngưỡng (so với frame to nhất) coi là im lặng -> hash 0
+AUDIO_SILENCE_RATIO = 1e-4
+# Số frame xử lý một lần (giới hạn bộ nhớ khi tính FFT)
+AUDIO_BLOCK = 1024
+
+# So khớp: frame trùng nếu khác nhau < AUDIO_MAX_DISTANCE bit (frame ngẫu nhiên lệch ~32 bit)
+AUDIO_MAX_DISTANCE = 20
+AUDIO_MIN_FRAMES = 16      # Cần ít nhất ~2 giây có tiếng ở cả 2 file
+# Signature dùng làm bộ lọc nhanh: hash của vài frame cố định (bit của 1 frame thay đổi
+# nhanh theo thời gian nên không lấy đa số như hash hình). Chỉ cần 1 slot khớp là thành ứng viên.
+AUDIO_SIGNATURE_FRAMES = (4, 12, 20, 28, 40, 56, 80, 120)
+
+def audio_settings():
+    """Tham số ảnh hưởng tới hash audio (đổi -> index cũ mất hiệu lực)"""
+    return {"rate": AUDIO_RATE, "hop": AUDIO_HOP, "window": AUDIO_WINDOW,
+            "bands": AUDIO_BANDS, "fmin": AUDIO_FMIN, "fmax": AUDIO_FMAX}
+
+def _band_edges():
+    freqs = np.geomspace(AUDIO_FMIN, AUDIO_FMAX, AUDIO_BANDS + 1)
+    return np.round(freqs * AUDIO_WINDOW / AUDIO_RATE).astype(np.intp)
+
+_EDGES = _band_edges()
+_HANN = np.hanning(AUDIO_WINDOW).astype(np.float32)
+
+def band_energies(samples, count):
+    """Năng lượng từng dải tần của `count` frame đầu tiên trong `samples`. Trả về (count, AUDIO_BANDS)"""
+    frames = np.lib.stride_tricks.sliding_window_view(samples, AUDIO_WINDOW)[:count * AUDIO_HOP:AUDIO_HOP]
+    spectrum = np.abs(np.fft.rfft(frames * _HANN, axis=1)) ** 2
+    return np.add.reduceat(spectrum[:, _EDGES[0]:_EDGES[-1]], _EDGES[:-1] - _EDGES[0], axis=1)
+
+def energies_to_hashes(energies):
+    """(N, AUDIO_BANDS) năng lượng -> (N - 1,) hash uint64"""
+    if len(energies) < 2:
+        return np.zeros(0, dtype=np.uint64)
+    diff = energies[:, :-1] - energies[:, 1:]
+    hashes = pack_bits(diff[1:] - diff[:-1] > 0)
+    total = energies.sum(axis=1)
+    silent = np.minimum(total[1:], total[:-1]) <= total.max() * AUDIO_SILENCE_RATIO
+    hashes[silent] = 0
+    return hashes
+
+def audio_fingerprint(file_path, ffmpeg_path='ffmpeg', timeout=None):
+    """Hash audio của từng frame (uint64). Mảng rỗng nếu file không có audio.
+
+    Quá `timeout` giây -> DecodeBudgetExceeded.
+    """
+    command = [
+        ffmpeg_path,
+        '-v', 'error',
+        '-i', file_path,
+        '-vn',
+        '-ac', '1',
+        '-ar', str(AUDIO_RATE),
+        '-f', 's16le',
+        '-'
+    ]
+    try:
+        pipe = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        return np.zeros(0, dtype=np.uint64)
+
+    chunk_size = AUDIO_HOP * AUDIO_BLOCK * 2
+    tail = np.zeros(0, dtype=np.float32)
+    blocks = []
+    with DecodeWatchdog(pipe, timeout) as watchdog:
+        while True:
+            raw = pipe.stdout.read(chunk_size)
+            samples = np.concatenate([tail, np.frombuffer(raw[:len(raw) // 2 * 2], dtype='<i2').astype(np.float32)])
+            if len(samples) >= AUDIO_WINDOW:
+                count = (len(samples) - AUDIO_WINDOW) // AUDIO_HOP + 1
+                blocks.append(band_energies(samples, count))
+                tail = samples[count * AUDIO_HOP:]
+            else:
+                tail = samples
+            if len(raw) < chunk_size:
+                break
+        watchdog.check()
+
+    if not blocks:
+        return np.zeros(0, dtype=np.uint64)
+    return energies_to_hashes(np.concatenate(blocks))
+
+def audio_signatures(hashes):
+    """{slot: hash frame} cho CandidateIndex, bỏ qua frame im lặng"""
+    if hashes is None:
+        return {}
+    signatures = {}
+    for slot, frame in enumerate(AUDIO_SIGNATURE_FRAMES):
+        if frame >= len(hashes):
+            break
+        if hashes[frame]:
+            signatures[slot] = int(hashes[frame])
+    return signatures
+
+def audio_similarity(hashes1, hashes2):
+    """% frame audio trùng (lấy mẫu ~100 điểm, chỉ tính frame có tiếng ở cả 2 file)"""
+    if hashes1 is None or hashes2 is None:
+        return 0
+    min_len = min(len(hashes1), len(hashes2))
+    if min_len < AUDIO_MIN_FRAMES:
+        return 0
+    step = max(1, min_len // 100)
+    a, b = hashes1[0:min_len:step], hashes2[0:min_len:step]
+    voiced = (a != 0) & (b != 0)
+    comparisons = np.count_nonzero(voiced)
+    if comparisons * step < AUDIO_MIN_FRAMES:
+        return 0
+    matches = np.count_nonzero(hamming(a[voiced], b[voiced]) < AUDIO_MAX_DISTANCE)
+    return (matches / comparisons) * 100
@@ -0,0 +1,418 @@
+import sys
+import os
+import json
+import time
+import random
+import subprocess
+import tracemalloc
+
+import numpy as np
+
+from dedup_engine import (
+    parse_options, calculate_similarity, find_subclip_offsets, list_video_files,
+    process_video_ffmpeg, find_duplicate_clusters, CascadeStats, DECODE_STRATEGIES, SPARSE_POINTS
+)
+from dedup_index import CandidateIndex, SIGNATURE_STARTS, SIGNATURE_RADIUS
+from dedup_hash import hamming_one_to_many, hamming_matrix, dhash_frames, pack_bits, scene_fingerprint
+
+# ==========================================
+# BENCHMARK TOOL CHO DEDUP ENGINE
+# Cách dùng: python dedup_bench.py <tên benchmark> [--option=value]
+#   python dedup_bench.py corpus --out=bench_corpus --ffmpeg=ffmpeg --sources=10
+#   python dedup_bench.py corpus --out=bench_shots --ffmpeg=ffmpeg --duration=120 --shots=20
+#   python dedup_bench.py suite --corpus=bench_corpus --ffmpeg=ffmpeg [--subclips] [--confirm]
+# ==========================================
+
+def synthetic_signatures(count, dup_ratio=0.05, max_flips=6, seed=1):
+    """Sinh signature ngẫu nhiên, trong đó dup_ratio số video là bản sao (bị lật vài bit)"""
+    rng = random.Random(seed)
+    videos = []
+    planted = set()
+    for i in range(count):
+        if videos and rng.random() < dup_ratio:
+            src = rng.randrange(len(videos))
+            sig = {}
+            for slot, code in videos[src].items():
+                for _ in range(rng.randint(0, max_flips)):
+                    code ^= 1 << rng.randrange(64)
+                sig[slot] = code
+            planted.add((src, i))
+        else:
+            slots = rng.randint(1, len(SIGNATURE_STARTS))
+            sig = {slot: rng.getrandbits(64) for slot in range(slots)}
+        videos.append(sig)
+    return videos, planted
+
+def synthetic_video(frames, rng):
+    hashes = rng.integers(0, 2**64, size=frames, dtype=np.uint64)
+    return {"hashes": hashes, "duration": frames / 8}
+
+def bench_hamming(options):
+    """Tốc độ so sánh hash uint64: từng cặp video, một-nhiều và nhiều-nhiều"""
+    rng = np.random.default_rng(0)
+    frames = int(options.get('frames', 100))
+    va, vb = synthetic_video(frames, rng), synthetic_video(frames, rng)
+
+    loops = 20000
+    t0 = time.perf_counter()
+    for _ in range(loops):
+        calculate_similarity(va, vb)
+    print(f"calculate_similarity ({frames} frames): {(time.perf_counter() - t0) / loops * 1e6:.1f} us/pair")
+
+    codes = synthetic_video(1_000_000, rng)['hashes']
+    t0 = time.perf_counter()
+    hamming_one_to_many(codes[0], codes)
+    elapsed = time.perf_counter() - t0
+    print(f"hamming_one_to_many: {len(codes) / elapsed / 1e6:.1f} M hashes/s")
+
+    block = codes[:4000]
+    t0 = time.perf_counter()
+    hamming_matrix(block, block)
+    elapsed = time.perf_counter() - t0
+    print(f"hamming_matrix 4000x4000: {elapsed * 1e3:.1f} ms ({len(block) ** 2 / elapsed / 1e6:.1f} M pairs/s)")
+
+def decode_gray_frames(file_path, ffmpeg, size=64, fps=8):
+    raw = subprocess.run([ffmpeg, '-v', 'error', '-i', file_path, '-vf', f'fps={fps},scale={size}:{size}',
+                          '-f', 'rawvideo', '-pix_fmt', 'gray', '-'], stdout=subprocess.PIPE).stdout
+    count = len(raw) // (size * size)
+    return np.frombuffer(raw, dtype=np.uint8, count=count * size * size).reshape(count, size, size)
+
+def bench_dhash(options):
+    """dhash theo lô bằng NumPy so với PIL + imagehash từng frame: kiểm tra trùng bit và tốc độ"""
+    from PIL import Image
+    import imagehash
+
+    folder = options.get('folder')
+    if folder:
+        ffmpeg = options.get('ffmpeg', 'ffmpeg')
+        parts = [decode_gray_frames(f, ffmpeg) for f in list_video_files(folder)]
+        frames = np.concatenate([p for p in parts if len(p)]) if parts else np.zeros((0, 64, 64), np.uint8)
+    else:
+        # Ảnh nhiễu + ảnh sóng mượt (nhiều pixel bằng nhau sau resize, dễ lộ sai khác khi làm tròn)
+        rng = np.random.default_rng(0)
+        count = int(options.get('frames', 5000))
+        x = np.linspace(0, 1, 64)
+        waves = np.sin(rng.uniform(1, 20, (count, 1, 1)) * x[None, :, None]
+                       + rng.uniform(0, 6, (count, 1, 1)) * x[None, None, :]) * 127 + 128
+        frames = np.concatenate([rng.integers(0, 256, (count, 64, 64), dtype=np.uint8),
+                                 waves.astype(np.uint8)])
+
+    t0 = time.perf_counter()
+    reference = pack_bits(np.array([
+        imagehash.dhash(Image.frombytes('L', (64, 64), frame.tobytes()), hash_size=8).hash for frame in frames
+    ]).reshape(len(frames), -1))
+    pil_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batched = dhash_frames(frames)
+    numpy_time = time.perf_counter() - t0
+
+    mismatches = int(np.count_nonzero(reference != batched))
+    print(f"frames: {len(frames)}  mismatches: {mismatches}")
+    print(f"PIL + imagehash : {pil_time * 1e3:8.1f} ms  {len(frames) / pil_time:10.0f} frames/s")
+    print(f"dhash_frames    : {numpy_time * 1e3:8.1f} ms  {len(frames) / numpy_time:10.0f} frames/s  "
+          f"({pil_time / numpy_time:.1f}x)")
+
+def bench_candidates(options):
+    """So sánh chi phí tìm ứng viên bằng index với so sánh tất cả các cặp"""
+    sizes = [int(x) for x in str(options.get('sizes', '1000,5000,10000,20000')).split(',')]
+    frames = int(options.get('frames', 100))
+
+    # Chi phí 1 lần calculate_similarity (dùng để ước lượng thời gian so sánh tất cả)
+    rng = np.random.default_rng(0)
+    va, vb = synthetic_video(frames, rng), synthetic_video(frames, rng)
+    loops = 200
+    t0 = time.perf_counter()
+    for _ in range(loops):
+        calculate_similarity(va, vb)
+    per_compare = (time.perf_counter() - t0) / loops
+
+    print(f"calculate_similarity: {per_compare * 1e6:.1f} us/pair ({frames} frames)")
+    print(f"{'videos':>8} {'build':>8} {'query':>8} {'cand.pairs':>11} {'all pairs':>12} "
+          f"{'recall':>7} {'phase2 idx':>11} {'phase2 all':>11}")
+
+    for n in sizes:
+        videos, planted = synthetic_signatures(n)
+
+        t0 = time.perf_counter()
+        index = CandidateIndex(SIGNATURE_RADIUS)
+        for sig in videos:
+            index.add(sig)
+        build_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        pairs = set()
+        for i in range(n):
+            for j in index.candidates(i):
+                if j > i:
+                    pairs.add((i, j))
+        query_time = time.perf_counter() - t0
+
+        all_pairs = n * (n - 1) // 2
+        recall = len(planted & pairs) / len(planted) if planted else 1.0
+        est_index = build_time + query_time + len(pairs) * per_compare
+        est_all = all_pairs * per_compare
+        print(f"{n:>8} {build_time:>7.2f}s {query_time:>7.2f}s {len(pairs):>11} {all_pairs:>12} "
+              f"{recall:>7.3f} {est_index:>10.1f}s {est_all:>10.1f}s")
+
+def cluster_pairs(videos, clusters):
+    """Các cặp (theo tên file) cùng nằm trong 1 nhóm mà find_duplicate_clusters trả về"""
+    pairs = set()
+    for cluster in clusters:
+        names = sorted(videos[i]['filename'] for i in cluster)
+        for a in range(len(names)):
+            for b in range(a + 1, len(names)):
+                pairs.add(frozenset((names[a], names[b])))
+    return pairs
+
+def duplicate_pairs(videos):
+    """Tham chiếu: so tất cả các cặp bằng calculate_similarity (không index, không cascade), điểm >= 90"""
+    offsets = find_subclip_offsets(videos)
+    pairs = set()
+    for i in range(len(videos)):
+        for j in range(i + 1, len(videos)):
+            score = calculate_similarity(videos[i], videos[j])
+            if score < 90 and (i, j) in offsets:
+                score = max(score, calculate_similarity(videos[i], videos[j], offsets[(i, j)]))
+            if score >= 90:
+                pairs.add(frozenset((videos[i]['filename'], videos[j]['filename'])))
+    return pairs
+
+def precision_recall(found, expected):
+    hits = len(found & expected)
+    precision = hits / len(found) if found else 1.0
+    recall = hits / len(expected) if expected else 1.0
+    return precision, recall
+
+def bench_strategies(options):
+    """Tốc độ và độ chính xác của từng chiến lược decode trên một thư mục video.
+
+    Độ chính xác tính so với kết quả của chế độ 'full' (không cần đáp án có sẵn).
+    """
+    folder = options.get('folder')
+    if not folder:
+        print("Missing --folder=<video folder>")
+        return
+    ffmpeg = options.get('ffmpeg', 'ffmpeg')
+    points = int(options.get('points', SPARSE_POINTS))
+    files = list_video_files(folder)
+
+    print(f"{len(files)} files in {folder}")
+    print(f"{'strategy':>10} {'time':>8} {'files/s':>8} {'media x':>8} {'pairs':>6} {'precision':>9} {'recall':>7}")
+
+    reference = None
+    for strategy in DECODE_STRATEGIES:
+        t0 = time.perf_counter()
+        videos = [v for v in (process_video_ffmpeg(f, ffmpeg, strategy, points) for f in files) if v]
+        elapsed = time.perf_counter() - t0
+
+        media_seconds = sum(v['duration'] for v in videos)
+        pairs = duplicate_pairs(videos)
+        if reference is None:
+            reference = pairs
+        precision, recall = precision_recall(pairs, reference)
+        print(f"{strategy:>10} {elapsed:>7.2f}s {len(files) / elapsed:>8.2f} {media_seconds / elapsed:>7.1f}x "
+              f"{len(pairs):>6} {precision:>9.3f} {recall:>7.3f}")
+
+# ==========================================
+# SYNTHETIC CORPUS (tạo video thử bằng lavfi của ffmpeg)
+# ==========================================
+# Mỗi nguồn là một mẫu lavfi khác nhau (seed/tham số khác nhau -> nội dung khác nhau)
+LAVFI_SOURCES = [
+    "mandelbrot=size={w}x{h}:rate=25:start_x={x}:start_y=-0.0001",
+    "life=size={w}x{h}:rate=25:seed={seed}:mold=10:ratio=0.2",
+    "cellauto=size={w}x{h}:rate=25:seed={seed}:rule=110",
+    "gradients=size={w}x{h}:rate=25:seed={seed}:speed=0.02:nb_colors=4",
+    "sierpinski=size={w}x{h}:rate=25:seed={seed}:jump=50",
+]
+
+# Nguồn nhiều cảnh quay (--shots=N): mỗi cảnh là 1 frame tĩnh của một mẫu lavfi được zoom/lia
+# chậm + nhiễu hạt như camera thật, các cảnh nối liền nhau bằng cắt cảnh cứng
+SHOT_MOTIONS = [
+    "zoompan=z='1+0.0008*on':d={frames}:s={w}x{h}:fps=25",
+    "zoompan=z='1.1':x='on/2':d={frames}:s={w}x{h}:fps=25",
+    "zoompan=z='1.1':y='on/3':d={frames}:s={w}x{h}:fps=25",
+]
+
+def shot_source_args(k, shots, duration, w=320, h=240):
+    """Tham số ffmpeg tạo nguồn thứ k gồm `shots` cảnh (các input lavfi + filter_complex)"""
+    frames = max(1, int(duration * 25 / shots))
+    inputs, chains = [], []
+    for s in range(shots):
+        pattern = LAVFI_SOURCES[(k + s) % len(LAVFI_SOURCES)].format(
+            w=w, h=h, seed=1000 + k * shots + s, x=-0.743643887 + (k * shots + s) * 0.01)
+        motion = SHOT_MOTIONS[(k + s) % len(SHOT_MOTIONS)].format(frames=frames, w=w, h=h)
+        inputs += ['-f', 'lavfi', '-i', pattern]
+        chains.append(f"[{s}]trim=start_frame=25:end_frame=26,{motion},noise=alls=6:allf=t[v{s}]")
+    concat = ''.join(f"[v{s}]" for s in range(shots)) + f"concat=n={shots}:v=1:a=0"
+    return [*inputs, '-filter_complex', ';'.join(chains + [concat])]
+
+# Biến thể tạo từ mỗi nguồn: (tên, tham số đặt trước -i, tham số sau -i)
+# Thời điểm/độ dài của 'trim' tính theo tỉ lệ thời lượng nguồn
+VARIANTS = {
+    "remux":    lambda d: ([], ['-c', 'copy'], '.mkv'),
+    "reencode": lambda d: ([], ['-vf', 'scale=iw/2:-2', '-c:v', 'libx264', '-crf', '36'], '.mp4'),
+    "crop":     lambda d: ([], ['-vf', 'crop=iw*0.9:ih*0.9,scale=320:240', '-c:v', 'libx264'], '.mp4'),
+    "trim":     lambda d: (['-ss', f'{d * 0.3:.2f}'], ['-t', f'{d * 0.4:.2f}', '-c:v', 'libx264'], '.mp4'),
+    "speed":    lambda d: ([], ['-vf', 'setpts=PTS/1.25', '-c:v', 'libx264'], '.mp4'),
+}
+
+def run_ffmpeg(ffmpeg, args):
+    result = subprocess.run([ffmpeg, '-hide_banner', '-v', 'error', '-y', *args],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip())
+
+def bench_corpus(options):
+    """Tạo bộ video thử + truth.json (nhóm bản sao của từng nguồn)"""
+    out = options.get('out')
+    if not out:
+        print("Missing --out=<folder>")
+        return
+    ffmpeg = options.get('ffmpeg', 'ffmpeg')
+    sources = int(options.get('sources', 10))
+    duration = float(options.get('duration', 20))
+    shots = int(options.get('shots', 0))
+    kinds = str(options.get('variants', ','.join(VARIANTS))).split(',')
+    os.makedirs(out, exist_ok=True)
+
+    truth = {"sources": {}, "variants": kinds}
+    t0 = time.perf_counter()
+    for k in range(sources):
+        if shots > 0:
+            source = shot_source_args(k, shots, duration)
+        else:
+            source = ['-f', 'lavfi', '-i', LAVFI_SOURCES[k % len(LAVFI_SOURCES)].format(
+                w=320, h=240, seed=1000 + k, x=-0.743643887 + k * 0.01)]
+        name = f"src_{k:03d}.mp4"
+        run_ffmpeg(ffmpeg, [*source, '-t', str(duration),
+                            '-pix_fmt', 'yuv420p', '-c:v', 'libx264', '-g', '50', os.path.join(out, name)])
+        group = {}
+        for kind in kinds:
+            pre, post, ext = VARIANTS[kind](duration)
+            variant = f"src_{k:03d}_{kind}{ext}"
+            run_ffmpeg(ffmpeg, [*pre, '-i', os.path.join(out, name), *post, os.path.join(out, variant)])
+            group[variant] = kind
+        truth["sources"][name] = group
+        print(f"[{k + 1}/{sources}] {name} + {len(group)} variants")
+
+    with open(os.path.join(out, 'truth.json'), 'w', encoding='utf-8') as f:
+        json.dump(truth, f, indent=2)
+    print(f"Corpus ready in {time.perf_counter() - t0:.1f}s: {out}")
+
+def load_truth(folder):
+    """Trả về (tập cặp trùng theo tên file, {cặp: loại biến thể})"""
+    with open(os.path.join(folder, 'truth.json'), 'r', encoding='utf-8') as f:
+        truth = json.load(f)
+    pairs = {}
+    for source, group in truth["sources"].items():
+        names = [source] + list(group)
+        for i in range(len(names)):
+            for j in range(i + 1, len(names)):
+                kind = group.get(names[j]) if i == 0 else f"{group[names[i]]}~{group[names[j]]}"
+                pairs[frozenset((names[i], names[j]))] = kind
+    return set(pairs), pairs
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def bench_suite(options):
+    """Chạy toàn bộ pipeline trên corpus có truth.json: thời gian từng phase, bộ nhớ, precision/recall"""
+    folder = options.get('corpus')
+    if not folder:
+        print("Missing --corpus=<folder created by 'corpus'>")
+        return
+    ffmpeg = options.get('ffmpeg', 'ffmpeg')
+    strategy = options.get('decode', 'full')
+    scenes = bool(options.get('scenes'))
+    expected, kinds = load_truth(folder)
+    files = list_video_files(folder)
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    videos = [v for v in (process_video_ffmpeg(f, ffmpeg, strategy) for f in files) if v]
+    frame_bytes = sum(v['hashes'].nbytes for v in videos)
+    if scenes:
+        for v in videos:
+            v['hashes'] = scene_fingerprint(v['hashes'])
+    scan_time = time.perf_counter() - t0
+    media_seconds = sum(v['duration'] for v in videos)
+    fingerprint_bytes = sum(v['hashes'].nbytes for v in videos)
+
+    t0 = time.perf_counter()
+    pair_count = 0
+    for i in range(len(videos)):
+        for j in range(i + 1, len(videos)):
+            calculate_similarity(videos[i], videos[j])
+            pair_count += 1
+    compare_time = time.perf_counter() - t0
+
+    # Đúng pipeline PHASE 2 (signature -> dhash/audio -> xác nhận nếu --confirm): precision/recall tính
+    # trên các nhóm mà engine trả về
+    confirm = options.get('confirm')
+    stats = CascadeStats()
+    t0 = time.perf_counter()
+    clusters = find_duplicate_clusters(videos, bool(options.get('subclips')), None,
+                                       'phash' if confirm is True else confirm, ffmpeg, stats)
+    dedup_time = time.perf_counter() - t0
+    found = cluster_pairs(videos, clusters)
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    reference = duplicate_pairs(videos)
+
+    precision, recall = precision_recall(found, expected)
+    print(f"corpus: {len(files)} files, {media_seconds:.0f}s of video, decode={strategy}"
+          + (", scene segments" if scenes else ""))
+    print(f"process_video_ffmpeg : {scan_time:8.2f}s  {len(files) / scan_time:6.2f} files/s  "
+          f"{media_seconds / scan_time:6.1f}x realtime")
+    print(f"calculate_similarity : {compare_time:8.3f}s  {pair_count} pairs  "
+          f"{compare_time / max(pair_count, 1) * 1e6:6.1f} us/pair")
+    print(f"phase 2 (clusters)   : {dedup_time:8.3f}s  {len(clusters)} groups")
+    print(f"fingerprints         : {fingerprint_bytes / 1024:8.1f} KB  "
+          f"({fingerprint_bytes / max(len(videos), 1) / 1024:.1f} KB/video, "
+          f"{frame_bytes / max(fingerprint_bytes, 1):.1f}x smaller than per-frame hashes)")
+    rss = peak_rss_mb()
+    print(f"memory peak          : python {py_peak / 1024 / 1024:.1f} MB"
+          + (f", process RSS {rss:.1f} MB" if rss else ""))
+    print(f"precision {precision:.3f}  recall {recall:.3f}  ({len(found)} found / {len(expected)} expected)")
+    ref_precision, ref_recall = precision_recall(reference, expected)
+    print(f"  reference (all pairs, no index): precision {ref_precision:.3f}  recall {ref_recall:.3f}  "
+          f"({len(reference)} found)")
+
+    # Recall theo loại biến thể, để thấy ngưỡng/thuật toán đang bỏ sót loại nào
+    by_kind = {}
+    for pair, kind in kinds.items():
+        total, hits = by_kind.get(kind, (0, 0))
+        by_kind[kind] = (total + 1, hits + (pair in found))
+    for kind, (total, hits) in sorted(by_kind.items(), key=lambda item: str(item[0])):
+        print(f"  recall {kind:<20} {hits:>4}/{total:<4} {hits / total:.3f}")
+    false_hits = found - expected
+    for pair in sorted(false_hits, key=sorted)[:10]:
+        print(f"  false match: {' <-> '.join(sorted(pair))}")
+    # Tỉ lệ qua và thời gian từng tầng của cascade
+    stats.report()
+
+BENCHMARKS = {
+    "candidates": bench_candidates,
+    "hamming": bench_hamming,
+    "dhash": bench_dhash,
+    "strategies": bench_strategies,
+    "corpus": bench_corpus,
+    "suite": bench_suite,
+}
+
+def main():
+    args, options = parse_options(sys.argv[1:])
+    if not args or args[0] not in BENCHMARKS:
+        print(f"Usage: python dedup_bench.py <{'|'.join(BENCHMARKS)}> [--option=value]")
+        return
+    BENCHMARKS[args[0]](options)
+
+if __name__ == "__main__":
+    main()
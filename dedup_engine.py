@@ -1,13 +1,97 @@
 import sys
 import os
 import json
+import re
 import subprocess
 import time
 import shutil  # Thư viện để di chuyển file
+import socket
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import Counter
 
 # --- CẤU HÌNH ---
 # Tên thư mục chứa file trùng lặp
 TRASH_FOLDER_NAME = "Delete duplicate"
+# Thư mục index fingerprint (mặc định nằm trong thư mục quét đầu tiên)
+INDEX_DIR_NAME = ".dedup_index"
+# Số file mới quét được trước khi ghi index xuống đĩa (giải phóng RAM)
+INDEX_FLUSH_EVERY = 200
+
+# Tham số hash - đổi bất kỳ giá trị nào sẽ làm cache cũ mất hiệu lực
+TARGET_FPS = 8
+SIZE = 64
+HASH_SIZE = 8
+# Số frame đọc từ pipe ffmpeg mỗi lần (hash cả lô một lúc bằng NumPy)
+PIPE_READ_FRAMES = 256
+
+# Watchdog decode (--timeout=giây, 0 = không giới hạn): mỗi file được DECODE_TIMEOUT giây
+# cộng thêm DECODE_TIMEOUT_PER_MB giây cho mỗi MB. Quá thời gian hoặc xuất quá
+# DECODE_MAX_FRAMES frame (file hỏng có timestamp sai) -> dừng ffmpeg, ghi file là bị bỏ qua.
+DECODE_TIMEOUT = 120
+DECODE_TIMEOUT_PER_MB = 1.0
+DECODE_MAX_FRAMES = TARGET_FPS * 3600 * 24
+PROBE_TIMEOUT = 30
+
+# Chiến lược decode (--decode=...):
+#   full      : decode toàn bộ frame rồi lọc về TARGET_FPS (chính xác nhất, chậm nhất)
+#   keyframes : chỉ decode keyframe, fps filter lặp lại keyframe gần nhất cho đủ TARGET_FPS
+#   lowres    : decoder xuất ảnh độ phân giải thấp, bỏ deblocking (codec không hỗ trợ lowres vẫn chạy được)
+#   sparse    : seek tới SPARSE_POINTS vị trí rải đều và chỉ decode 1 frame mỗi vị trí
+#               (chỉ so khớp được bản sao cùng độ dài: re-encode, remux...)
+DECODE_STRATEGIES = ('full', 'keyframes', 'lowres', 'sparse')
+SPARSE_POINTS = 32
+
+# Cascade so sánh: signature (index) -> dhash từng frame -> xác nhận bằng hash mạnh hơn (--confirm=phash).
+# Cặp có điểm dhash trong [CONFIRM_LOW, CONFIRM_HIGH) được decode lại CONFIRM_POINTS frame ở
+# độ phân giải CONFIRM_SIZE x CONFIRM_SIZE tại các vị trí tương ứng và chấm lại bằng pHash.
+CONFIRM_HASHES = ('phash',)
+CONFIRM_LOW = 80
+CONFIRM_HIGH = 95
+CONFIRM_POINTS = 10
+CONFIRM_SIZE = 32
+CONFIRM_MAX_DISTANCE = 16
+
+# Fingerprint theo cảnh (--scenes): mỗi đoạn cảnh chỉ lưu 1 hash kèm frame bắt đầu
+# (xem scene_segments trong dedup_hash.py), so khớp/căn clip con theo chuỗi đoạn cảnh
+
+# Tìm clip con bị cắt ở giữa video dài (--subclips, mặc định tắt). Clip cắt từ đầu video vẫn được
+# tìm thấy khi tắt (qua index signature). Inverted index giữ trong RAM 1/SUBCLIP_INDEX_STEP số frame
+# của MỌI video, mỗi frame MIH_CHUNKS posting x 8 byte: ~32 byte/frame được index, tức ~230 KB cho
+# mỗi giờ video (8 fps), cộng ~4 MB bảng bucket; lúc dựng index cần thêm khoảng gấp đôi.
+# Thư viện 10.000 giờ -> ~2.3 GB RAM.
+
+# Gộp các frame liên tiếp có hash giống hệt nhau khi giữ trong RAM (--collapse)
+# Kích thước 1 object ImageHash (dhash 8x8) đo bằng tracemalloc, dùng để so sánh trong log
+IMAGEHASH_FRAME_BYTES = 340
+
+# Watch mode: số giây giữa 2 lần kiểm tra thư mục
+WATCH_INTERVAL = 3
+
+# Chọn file giữ lại trong mỗi nhóm trùng (--keep=...):
+#   longest    : thời lượng dài nhất (mặc định, giữ bản gốc thay vì đoạn cắt)
+#   resolution : độ phân giải cao nhất
+#   bitrate    : bitrate lớn nhất (chất lượng encode tốt nhất)
+KEEP_POLICIES = ('longest', 'resolution', 'bitrate')
+# Policy chỉ áp dụng giữa các bản trùng trọn vẹn (thời lượng lệch không quá FULL_MATCH_TOLERANCE).
+# Clip con chỉ khớp 1 đoạn luôn nhường cho file dài nhất chứa nó, dù độ phân giải/bitrate cao hơn
+FULL_MATCH_TOLERANCE = 0.05
+
+# Kênh audio (tắt bằng --no-audio): bắt bản re-upload giữ nguyên tiếng nhưng sửa hình.
+# Chỉ dùng audio để kết luận trùng khi thời lượng 2 file lệch nhau không quá 5%
+# (tránh nhầm 2 video khác nhau dùng chung một đoạn nhạc nền)
+AUDIO_DURATION_TOLERANCE = 0.05
+
+# File fingerprint di động (xem dedup_portable.py):
+#   --export=file.dvfp              : ghi toàn bộ index ra 1 file sau khi quét
+#   --import=a.dvfp;b.dvfp          : nhập fingerprint của máy khác cho file có mặt ở máy này
+#   --remap=D:\Share=/mnt/share|... : đổi tiền tố đường dẫn khi nhập (ổ mạng gắn ở chỗ khác)
+#   --from-fingerprints=a.dvfp;...  : chỉ so sánh các file fingerprint, không đọc video nào (chỉ báo cáo)
+# File cục bộ nhận fingerprint nhập vào nếu cùng kích thước và mtime lệch không quá 2 giây
+# (SMB/FAT làm tròn mtime)
+IMPORT_MTIME_TOLERANCE_NS = 2 * 10**9
+
+# PHASE 0 (tắt bằng --no-exact): bản copy y hệt và bản remux được xử lý trước khi quét,
+# không decode frame nào (xem dedup_exact.py)
 
 # Ép buộc Encoding UTF-8 cho Windows console
 if sys.platform == "win32":
@@ -19,22 +103,141 @@ def send_json(msg_type, data):
     sys.stdout.flush()
 
 try:
-    from PIL import Image
-    import imagehash
+    import numpy as np
 except ImportError as e:
-    send_json("error", {"message": f"Missing Library: {e}. Please install: pip install pillow imagehash"})
+    send_json("error", {"message": f"Missing Library: {e}. Please install: pip install numpy"})
     sys.exit(1)
 
+from dedup_store import FingerprintIndex
+from dedup_exact import exact_groups, remux_groups, stream_hash
+from dedup_portable import FingerprintFile, write_fingerprint_file
+from dedup_watchdog import DecodeWatchdog, DecodeBudgetExceeded
+from dedup_index import CandidateIndex, SubclipIndex, window_signatures, SUBCLIP_MIN_COVERAGE
+from dedup_hash import (
+    dhash_frames, phash_frames, hamming, RunLengthHashes, scene_fingerprint,
+    SCENE_CUT_DISTANCE, SCENE_FALLBACK_FRAMES, SCENE_MIN_SHRINK
+)
+from dedup_audio import (
+    audio_fingerprint, audio_settings, audio_signatures, audio_similarity, AUDIO_SIGNATURE_FRAMES
+)
+
+def fingerprint_settings(strategy='full', sparse_points=SPARSE_POINTS, audio=True, scenes=False):
+    settings = {"fps": TARGET_FPS, "size": SIZE, "hash": "dhash", "hash_size": HASH_SIZE, "decode": strategy}
+    if strategy == 'sparse':
+        settings["points"] = sparse_points
+    if audio:
+        settings["audio"] = audio_settings()
+    if scenes:
+        settings["scenes"] = {"cut": SCENE_CUT_DISTANCE, "fallback": SCENE_FALLBACK_FRAMES,
+                              "min_shrink": SCENE_MIN_SHRINK}
+    return settings
+
 # ==========================================
 # 1. CORE LOGIC (FFMPEG PIPE)
 # ==========================================
-def process_video_ffmpeg(file_path, ffmpeg_path='ffmpeg'):
+def frames_from_bytes(raw):
+    """Dữ liệu rawvideo gray -> mảng (N, SIZE, SIZE), bỏ phần frame thiếu ở cuối"""
+    count = len(raw) // (SIZE * SIZE)
+    return np.frombuffer(raw, dtype=np.uint8, count=count * SIZE * SIZE).reshape(count, SIZE, SIZE)
+
+def decode_input_args(strategy):
+    """Tham số đặt trước '-i' để giảm chi phí decode"""
+    if strategy == 'keyframes':
+        return ['-skip_frame', 'nokey']
+    if strategy == 'lowres':
+        return ['-lowres', '2', '-skip_loop_filter', 'all', '-flags2', '+fast']
+    return []
+
+def probe_media(file_path, ffmpeg_path='ffmpeg'):
+    """Đọc thông tin từ header container (ffmpeg -i in ra 'Duration: ...', 'bitrate: ...', 'Video: ... WxH')"""
+    info = {"duration": 0, "width": 0, "height": 0, "bitrate": 0, "streams": []}
+    try:
+        result = subprocess.run([ffmpeg_path, '-hide_banner', '-i', file_path],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=PROBE_TIMEOUT)
+    except Exception:
+        return info
+
+    match = re.search(rb'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', result.stderr)
+    if match:
+        hrs, mins, secs = match.groups()
+        info["duration"] = int(hrs) * 3600 + int(mins) * 60 + float(secs)
+    match = re.search(rb'bitrate: (\d+) kb/s', result.stderr)
+    if match:
+        info["bitrate"] = int(match.group(1)) * 1000
+    match = re.search(rb'Stream #.*?Video: .*?(\d{2,5})x(\d{2,5})', result.stderr)
+    if match:
+        info["width"], info["height"] = int(match.group(1)), int(match.group(2))
+    # Danh sách luồng dạng 'video:h264', 'audio:aac' (dùng để nhận ra bản remux)
+    info["streams"] = [f"{kind.decode().lower()}:{codec.decode()}" for kind, codec in
+                       re.findall(rb'Stream #\d+:\d+\S*: (Video|Audio|Subtitle): ([\w-]+)', result.stderr)]
+    return info
+
+def probe_duration(file_path, ffmpeg_path='ffmpeg'):
+    return probe_media(file_path, ffmpeg_path)["duration"]
+
+def grab_frames(file_path, ffmpeg_path, positions, size=SIZE, timeout=None):
+    """Decode 1 frame xám size x size tại mỗi vị trí (giây). Trả về list bytes (b'' nếu lỗi)"""
+    deadline = time.monotonic() + timeout if timeout else None
+    frame_size = size * size
+    images = []
+    for position in positions:
+        # Seek trước '-i' (nhảy tới keyframe gần nhất) nên mỗi điểm chỉ decode vài frame
+        command = [
+            ffmpeg_path,
+            '-ss', f'{max(position, 0):.3f}',
+            '-i', file_path,
+            '-frames:v', '1',
+            '-vf', f'scale={size}:{size}',
+            '-f', 'rawvideo',
+            '-pix_fmt', 'gray',
+            '-'
+        ]
+        remaining = max(0.1, deadline - time.monotonic()) if deadline else None
+        try:
+            raw_image = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                       timeout=remaining).stdout
+        except subprocess.TimeoutExpired:
+            raise DecodeBudgetExceeded(f"decode timed out after {timeout:.0f}s")
+        images.append(raw_image[:frame_size] if len(raw_image) >= frame_size else b'')
+    return images
+
+def process_video_sparse(file_path, ffmpeg_path='ffmpeg', points=SPARSE_POINTS, timeout=None):
+    try:
+        duration = probe_duration(file_path, ffmpeg_path)
+        if duration <= 0: return None
+
+        positions = [duration * (k + 0.5) / points for k in range(points)]
+        images = []
+        for raw_image in grab_frames(file_path, ffmpeg_path, positions, SIZE, timeout):
+            if raw_image:
+                images.append(raw_image)
+            elif images:
+                # Giữ đúng số điểm để các video vẫn so khớp theo vị trí
+                images.append(images[-1])
+
+        if not images: return None
+
+        return {
+            "path": file_path,
+            "filename": os.path.basename(file_path),
+            "duration": duration,
+            "hashes": dhash_frames(frames_from_bytes(b''.join(images)), HASH_SIZE)
+        }
+
+    except DecodeBudgetExceeded:
+        raise
+    except Exception:
+        return None
+
+def process_video_ffmpeg(file_path, ffmpeg_path='ffmpeg', strategy='full', sparse_points=SPARSE_POINTS,
+                         timeout=None):
+    if strategy == 'sparse':
+        return process_video_sparse(file_path, ffmpeg_path, sparse_points, timeout)
+
     try:
-        TARGET_FPS = 8 
-        SIZE = 64
-        
         command = [
             ffmpeg_path,
+            *decode_input_args(strategy),
             '-i', file_path,
             '-vf', f'fps={TARGET_FPS},scale={SIZE}:{SIZE}',
             '-f', 'image2pipe',
@@ -45,21 +248,29 @@ def process_video_ffmpeg(file_path, ffmpeg_path='ffmpeg'):
         
         pipe = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=10**8)
         
-        hashes = []
-        frame_size = SIZE * SIZE 
+        parts = []
+        frame_count = 0
+        chunk_size = SIZE * SIZE * PIPE_READ_FRAMES
         
-        while True:
-            raw_image = pipe.stdout.read(frame_size)
-            if len(raw_image) != frame_size:
-                break
-            
-            image = Image.frombytes('L', (SIZE, SIZE), raw_image)
-            h = imagehash.dhash(image, hash_size=8)
-            hashes.append(h)
-            
-        pipe.terminate()
+        # Watchdog giết ffmpeg nếu quá thời gian; khi ra khỏi khối with ffmpeg luôn được dừng + thu hồi
+        with DecodeWatchdog(pipe, timeout) as watchdog:
+            # Đọc nhiều frame một lần và hash cả lô (trùng bit với PIL + imagehash.dhash)
+            while True:
+                raw = pipe.stdout.read(chunk_size)
+                frames = frames_from_bytes(raw)
+                if len(frames):
+                    parts.append(dhash_frames(frames, HASH_SIZE))
+                    frame_count += len(frames)
+                if frame_count > DECODE_MAX_FRAMES:
+                    raise DecodeBudgetExceeded(f"more than {DECODE_MAX_FRAMES} frames decoded")
+                if len(raw) != chunk_size:
+                    break
+            watchdog.check()
         
-        if not hashes: return None
+        if not parts: return None
+
+        # Lưu hash dạng mảng uint64 liền mạch thay vì list các object ImageHash
+        hashes = np.concatenate(parts)
         
         return {
             "path": file_path,
@@ -68,18 +279,49 @@ def process_video_ffmpeg(file_path, ffmpeg_path='ffmpeg'):
             "hashes": hashes
         }
 
+    except DecodeBudgetExceeded:
+        raise
     except Exception:
         return None
 
+def decode_timeout(file_path, base=DECODE_TIMEOUT):
+    """Thời gian decode tối đa cho một file (None = không giới hạn)"""
+    if not base or base <= 0:
+        return None
+    try:
+        size_mb = os.path.getsize(file_path) / (1024 * 1024)
+    except OSError:
+        size_mb = 0
+    return base + size_mb * DECODE_TIMEOUT_PER_MB
+
+def fingerprint_video(file_path, ffmpeg_path='ffmpeg', strategy='full', sparse_points=SPARSE_POINTS, audio=True,
+                      timeout_base=DECODE_TIMEOUT, scenes=False):
+    """Hash hình + hash audio (nếu bật) của một file. Quá giới hạn decode -> DecodeBudgetExceeded"""
+    timeout = decode_timeout(file_path, timeout_base)
+    data = process_video_ffmpeg(file_path, ffmpeg_path, strategy, sparse_points, timeout)
+    if data and scenes:
+        data['hashes'] = scene_fingerprint(data['hashes'])
+    if data and audio:
+        # Decode audio 8kHz mono rất nhẹ so với decode hình
+        data['audio'] = audio_fingerprint(file_path, ffmpeg_path, timeout)
+    return data
+
 # ==========================================
 # 2. HELPER FUNCTIONS
 # ==========================================
-def calculate_similarity(video1, video2):
+def calculate_similarity(video1, video2, offset=0):
     hashes1 = video1['hashes']
     hashes2 = video2['hashes']
+
+    # offset: frame của video1 ứng với frame 0 của video2 (âm nghĩa là ngược lại)
+    if offset < 0:
+        hashes1, hashes2, offset = hashes2, hashes1, -offset
+    if offset:
+        # Clip con phải nằm gần trọn trong video dài, không chỉ chồng lên một đoạn ngắn
+        if len(hashes1) - offset < len(hashes2) * SUBCLIP_MIN_COVERAGE: return 0
     
-    len1, len2 = len(hashes1), len(hashes2)
-    if len1 == 0 or len2 == 0: return 0
+    len1, len2 = len(hashes1) - offset, len(hashes2)
+    if len1 <= 0 or len2 == 0: return 0
     
     # Nếu độ dài chênh lệch quá lớn (> 50%) thì coi như không trùng (để an toàn)
     # Tùy nhu cầu: Nếu bạn muốn tìm clip con 2s trong clip 30s thì bỏ dòng này đi
@@ -92,20 +334,132 @@ def calculate_similarity(video1, video2):
     else:
         step = max(1, min_len // 100) # Lấy mẫu 100 điểm ảnh
     
-    matches = 0
-    comparisons = 0
-    limit = min_len
-    
-    # So sánh hash
-    for i in range(0, limit, step):
-        diff = hashes1[i] - hashes2[i]
-        if diff < 12: # Tăng nhẹ ngưỡng chấp nhận sai số (10 -> 12)
-            matches += 1
-        comparisons += 1
+    # So sánh hash (XOR + đếm bit trên toàn bộ các frame được lấy mẫu cùng lúc)
+    # (chỉ lấy đúng các frame mẫu, không cắt/bung cả mảng khi hash đang nén run-length)
+    diffs = hamming(hashes1[offset:offset + min_len:step], hashes2[0:min_len:step])
+    comparisons = len(diffs)
+    matches = np.count_nonzero(diffs < 12) # Tăng nhẹ ngưỡng chấp nhận sai số (10 -> 12)
         
     if comparisons == 0: return 0
     return (matches / comparisons) * 100
 
+def match_score(video1, video2, offset=0):
+    """Điểm trùng của 2 video. Hash hình quyết định trước; chưa đủ 90 thì audio phân xử.
+
+    Trả về (score, độ lệch frame cho điểm hình tốt nhất: 0 hoặc `offset`, kênh cho ra score: 'visual' | 'audio')
+    """
+    score = calculate_similarity(video1, video2)
+    best_offset = 0
+    channel = 'visual'
+    if score < 90 and offset:
+        shifted = calculate_similarity(video1, video2, offset)
+        if shifted > score:
+            score, best_offset = shifted, offset
+    if score < 90 and video1.get('audio') is not None and video2.get('audio') is not None:
+        longest = max(video1['duration'], video2['duration'])
+        if longest and abs(video1['duration'] - video2['duration']) <= longest * AUDIO_DURATION_TOLERANCE:
+            audio_score = audio_similarity(video1['audio'], video2['audio'])
+            if audio_score > score:
+                score, channel = audio_score, 'audio'
+    return score, best_offset, channel
+
+def confirm_similarity(video1, video2, offset=0, ffmpeg_exec='ffmpeg', method='phash'):
+    """Chấm lại cặp sát ngưỡng: decode CONFIRM_POINTS frame tương ứng ở độ phân giải cao hơn, so bằng pHash"""
+    if offset < 0:
+        video1, video2, offset = video2, video1, -offset
+    len1, len2 = len(video1['hashes']) - offset, len(video2['hashes'])
+    overlap = min(len1, len2)
+    if overlap <= 0:
+        return 0
+
+    # Đổi chỉ số frame hash -> giây (sparse: mỗi "frame" là một điểm rải đều theo thời lượng)
+    step1 = video1['duration'] / len(video1['hashes'])
+    step2 = video2['duration'] / len(video2['hashes'])
+    frames = [(k + 0.5) * overlap / CONFIRM_POINTS for k in range(CONFIRM_POINTS)]
+    try:
+        images1 = grab_frames(video1['path'], ffmpeg_exec, [(f + offset) * step1 for f in frames],
+                              CONFIRM_SIZE, PROBE_TIMEOUT)
+        images2 = grab_frames(video2['path'], ffmpeg_exec, [f * step2 for f in frames], CONFIRM_SIZE, PROBE_TIMEOUT)
+    except DecodeBudgetExceeded:
+        return 0
+
+    pairs = [(a, b) for a, b in zip(images1, images2) if a and b]
+    if not pairs:
+        return 0
+    shape = (len(pairs), CONFIRM_SIZE, CONFIRM_SIZE)
+    hashes1 = phash_frames(np.frombuffer(b''.join(a for a, _ in pairs), dtype=np.uint8).reshape(shape))
+    hashes2 = phash_frames(np.frombuffer(b''.join(b for _, b in pairs), dtype=np.uint8).reshape(shape))
+    matches = np.count_nonzero(hamming(hashes1, hashes2) < CONFIRM_MAX_DISTANCE)
+    # Frame không decode được tính là không khớp
+    return matches / CONFIRM_POINTS * 100
+
+class CascadeStats:
+    """Đếm số cặp vào/qua và thời gian của từng tầng so sánh"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, pairs, passed, seconds):
+        entry = self.stages.setdefault(stage, [0, 0, 0.0])
+        entry[0] += pairs
+        entry[1] += passed
+        entry[2] += seconds
+
+    def report(self):
+        for name, (pairs, passed, seconds) in self.stages.items():
+            rate = passed / pairs * 100 if pairs else 0
+            print(f"[CASCADE] {name}: {pairs} pairs -> {passed} passed ({rate:.2f}%) in {seconds:.2f}s")
+        sys.stdout.flush()
+
+def cascade_score(video1, video2, offset=0, confirm=None, ffmpeg_exec='ffmpeg', stats=None):
+    """Điểm cuối cùng của một cặp ứng viên: dhash (+ audio), rồi xác nhận nếu sát ngưỡng.
+
+    Chỉ xác nhận điểm do hash hình quyết định: cặp khớp nhờ audio (bản crop/overlay/lật hình)
+    sẽ bị pHash chấm thấp oan.
+    """
+    t0 = time.perf_counter()
+    score, offset, channel = match_score(video1, video2, offset)
+    borderline = bool(confirm) and channel == 'visual' and CONFIRM_LOW <= score < CONFIRM_HIGH
+    if stats:
+        stats.add("dhash", 1, int(score >= 90 or borderline), time.perf_counter() - t0)
+    if borderline:
+        t0 = time.perf_counter()
+        score = confirm_similarity(video1, video2, offset, ffmpeg_exec, confirm)
+        if stats:
+            stats.add(confirm, 1, int(score >= 90), time.perf_counter() - t0)
+    return score
+
+def build_audio_index(videos):
+    """Index hash audio: video không có tiếng (hoặc chưa quét audio) không thành ứng viên"""
+    index = CandidateIndex(slots=len(AUDIO_SIGNATURE_FRAMES), match_unindexed=False)
+    for video in videos:
+        index.add(audio_signatures(video.get('audio')))
+    return index
+
+def build_candidate_index(videos):
+    """Tạo index signature theo đúng thứ tự của danh sách video"""
+    index = CandidateIndex()
+    for video in videos:
+        index.add(window_signatures(video['hashes']))
+    return index
+
+def find_subclip_offsets(videos):
+    """Tìm các cặp (i, j) mà video j là đoạn cắt từ video i. Trả về {(i, j): offset}.
+
+    Khóa luôn là (chỉ số nhỏ, chỉ số lớn); offset âm nếu video có chỉ số lớn là nguồn.
+    """
+    index = SubclipIndex()
+    index.build([v['hashes'] for v in videos])
+    print(f"[MEMORY] Subclip index: {index.nbytes / 1024 / 1024:.1f} MB for {len(videos)} videos")
+    sys.stdout.flush()
+    offsets = {}
+    for j, video in enumerate(videos):
+        for i, offset, _ in index.query(j, video['hashes']):
+            key = (i, j) if i < j else (j, i)
+            if key not in offsets:
+                offsets[key] = offset if i < j else -offset
+    return offsets
+
 def move_to_trash(file_info, trash_path):
     """Di chuyển file vào thư mục rác, đổi tên nếu trùng"""
     try:
@@ -124,127 +478,899 @@ def move_to_trash(file_info, trash_path):
     except Exception as e:
         return False, str(e)
 
+VIDEO_EXTS = {'.mp4', '.mov', '.mkv', '.avi', '.flv', '.wmv', '.webm'}
+
+def list_video_files(folder_path, recursive=False):
+    files = []
+    for current, dirs, names in os.walk(folder_path):
+        # Bỏ qua thư mục rác để không quét lại file đã xóa, và thư mục ẩn (index...)
+        dirs[:] = sorted(d for d in dirs if d != TRASH_FOLDER_NAME and not d.startswith('.'))
+        for f in sorted(names):
+            if os.path.splitext(f)[1].lower() in VIDEO_EXTS:
+                files.append(os.path.join(current, f))
+        if not recursive:
+            break
+    return files
+
+def path_key(path):
+    """Khóa so sánh đường dẫn: đường dẫn thật (bỏ symlink, '/' thừa ở cuối), không phân biệt hoa/thường trên Windows"""
+    return os.path.normcase(os.path.realpath(path))
+
+def normalize_roots(roots, recursive=False):
+    """Bỏ root trùng nhau (khác cách viết) và, khi quét đệ quy, root nằm bên trong root khác.
+
+    Nếu không, cùng 1 file được liệt kê 2 lần và PHASE 0 coi nó là bản copy của chính nó.
+    """
+    result, keys = [], []
+    for root in roots:
+        key = path_key(root)
+        if key in keys:
+            continue
+        result.append(os.path.realpath(root))
+        keys.append(key)
+    if not recursive:
+        return result
+    return [root for root, key in zip(result, keys)
+            if not any(key != other and key.startswith(os.path.join(other, '')) for other in keys)]
+
+def list_library_files(roots, recursive=False):
+    files = []
+    seen = set()
+    for root in roots:
+        for file_path in list_video_files(root, recursive):
+            key = path_key(file_path)
+            if key not in seen:
+                seen.add(key)
+                files.append(file_path)
+    return files
+
+def trash_folder_for(file_path, roots):
+    """Thư mục rác của root chứa file (mỗi ổ đĩa / thư mục gốc có thư mục rác riêng)"""
+    file_path = os.path.abspath(file_path)
+    owners = [r for r in roots if file_path.startswith(os.path.join(os.path.abspath(r), ''))]
+    root = max(owners, key=len) if owners else roots[0]
+    return os.path.join(root, TRASH_FOLDER_NAME)
+
+def parse_options(argv):
+    """Tách tham số vị trí và các cờ dạng --key=value (cờ không có giá trị = True)"""
+    positional, options = [], {}
+    for arg in argv:
+        if arg.startswith('--'):
+            key, sep, value = arg[2:].partition('=')
+            options[key.replace('-', '_')] = value if sep else True
+        else:
+            positional.append(arg)
+    return positional, options
+
+def default_workers():
+    # ffmpeg tự dùng nhiều thread để decode, nên chỉ chạy song song khoảng nửa số core
+    return max(1, (os.cpu_count() or 2) // 2)
+
 # ==========================================
-# 3. MAIN EXECUTION
+# 3. SCANNING (PHASE 0 + PHASE 1)
 # ==========================================
-def main():
-    if len(sys.argv) < 2:
-        send_json("error", {"message": "Missing arguments"})
-        return
+def resolve_exact_duplicates(files, ffmpeg_exec, cache, roots, policy='longest', dry_run=False):
+    """PHASE 0: xử lý bản copy y hệt và bản remux mà không decode frame nào.
 
-    folder_path = sys.argv[1]
-    ffmpeg_exec = sys.argv[2] if len(sys.argv) > 2 else 'ffmpeg'
-    
-    # --- TẠO THƯ MỤC RÁC ---
-    trash_path = os.path.join(folder_path, TRASH_FOLDER_NAME)
-    if not os.path.exists(trash_path):
+    Trả về (các file còn lại cần quét, số file đã chuyển, các nhóm cho báo cáo).
+    """
+    total = len(files)
+    t0 = time.perf_counter()
+    send_json("progress", {"phase": "Pre-check", "current": 0, "total": total, "msg": "Looking for exact copies..."})
+
+    # Bản copy y hệt: cùng kích thước + cùng hash đầu/giữa/cuối file
+    groups = [(sorted(group), 'exact') for group in exact_groups(files)]
+    grouped = {p for group, _ in groups for p in group}
+
+    # Bản remux: thông tin container (chỉ đọc header, có cache) rồi hash packet hình của
+    # các file trùng codec/độ phân giải/thời lượng
+    rest = [p for p in files if p not in grouped]
+    infos = {}
+    for n, file_path in enumerate(rest):
         try:
-            os.makedirs(trash_path)
-        except Exception as e:
-            send_json("error", {"message": f"Cannot create folder '{TRASH_FOLDER_NAME}': {e}"})
-            return
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+        info = cache.media_info(file_path, stat)
+        if info is None:
+            info = probe_media(file_path, ffmpeg_exec)
+            cache.put_media(file_path, stat, info)
+        infos[file_path] = info
+        if n % 20 == 0 or n == len(rest) - 1:
+            send_json("progress", {
+                "phase": "Pre-check",
+                "current": len(grouped) + n + 1,
+                "total": total,
+                "msg": f"Reading {os.path.basename(file_path)}..."
+            })
+    groups += [(sorted(group), 'remux') for group in
+               remux_groups(rest, infos, lambda p: stream_hash(p, ffmpeg_exec))]
 
-    valid_exts = {'.mp4', '.mov', '.mkv', '.avi', '.flv', '.wmv', '.webm'}
-    files = []
-    try:
-        for f in os.listdir(folder_path):
-            full_path = os.path.join(folder_path, f)
-            # Bỏ qua thư mục rác để không quét lại file đã xóa
-            if os.path.isfile(full_path) and f != TRASH_FOLDER_NAME:
-                if os.path.splitext(f)[1].lower() in valid_exts:
-                    files.append(full_path)
-    except Exception as e:
-        send_json("error", {"message": str(e)})
+    handled = set()
+    moved_count = 0
+    counts = {'exact': 0, 'remux': 0}
+    report = []
+    for group, kind in groups:
+        videos = [{"path": p, "filename": os.path.basename(p), "duration": infos.get(p, {}).get('duration', 0)}
+                  for p in group]
+        if kind == 'remux':
+            for video in videos:
+                video['media'] = infos[video['path']]
+            keeper_id = max(range(len(videos)), key=lambda i: (keeper_key(videos[i], policy, ffmpeg_exec), -i))
+        else:
+            # Nội dung giống hệt -> policy nào cũng như nhau, giữ file đầu tiên
+            keeper_id = 0
+        keeper = videos[keeper_id]
+        entry = {"keep": keeper['path'], "duplicates": []}
+        for i, victim in enumerate(videos):
+            if i == keeper_id:
+                continue
+            entry["duplicates"].append({"path": victim['path'], "score": 100, "kind": kind})
+            if report_match(keeper, victim, 100, roots, cache, dry_run):
+                handled.add(victim['path'])
+                moved_count += 1
+                counts[kind] += 1
+        report.append(entry)
+
+    if groups:
+        print(f"[EXACT] {counts['exact']} identical copies, {counts['remux']} remuxes "
+              f"resolved without decoding in {time.perf_counter() - t0:.1f}s")
+        sys.stdout.flush()
+    return [p for p in files if p not in handled], moved_count, report
+
+def compact_hashes(video, collapse=False):
+    """Nén hash hình trong RAM bằng run-length (index trên đĩa vẫn giữ nguyên từng frame)"""
+    if collapse and not isinstance(video['hashes'], RunLengthHashes):
+        video['hashes'] = RunLengthHashes.from_hashes(video['hashes'])
+    return video
+
+def report_memory(videos):
+    """In dung lượng fingerprint trong RAM, so với cách cũ (list object ImageHash)"""
+    if not videos:
         return
+    visual = sum(v['hashes'].nbytes for v in videos)
+    audio = sum(v['audio'].nbytes for v in videos if v.get('audio') is not None)
+    frames = sum(len(v['hashes']) for v in videos)
+    legacy = frames * IMAGEHASH_FRAME_BYTES
+    total = visual + audio
+    print(f"[MEMORY] Fingerprints: {total / 1024:.1f} KB for {len(videos)} videos "
+          f"({total / len(videos) / 1024:.1f} KB/video, audio {audio / 1024:.1f} KB). "
+          f"Visual hashes {visual / max(frames, 1):.2f} B/frame, "
+          f"{legacy / max(visual, 1):.0f}x smaller than ImageHash objects")
+    sys.stdout.flush()
+
+def scan_videos(files, ffmpeg_exec, cache, workers=1, strategy='full', sparse_points=SPARSE_POINTS, audio=True,
+                collapse=False, timeout_base=DECODE_TIMEOUT, scenes=False):
+    """Tính fingerprint cho danh sách file, dùng cache nếu có và chạy song song nhiều process.
 
+    Mỗi file quét xong được ghi ngay vào journal của index nên lần chạy sau (sau khi app bị tắt)
+    sẽ tiếp tục từ chỗ đang dở.
+    """
     total = len(files)
-    if total < 2:
-        send_json("done", {"message": "Not enough videos to compare."})
-        return
+    results = {}
+    pending = []
+    done_count = 0
+    skipped_count = 0
 
-    processed_videos = []
-    
-    # --- PHASE 1: SCANNING ---
-    for i, file_path in enumerate(files):
+    def report(file_path):
+        nonlocal done_count
+        done_count += 1
         send_json("progress", {
             "phase": "Scanning",
-            "current": i + 1,
+            "current": done_count,
             "total": total,
             "msg": f"Analysing: {os.path.basename(file_path)}"
         })
-        
-        data = process_video_ffmpeg(file_path, ffmpeg_exec)
+
+    for file_path in files:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            report(file_path)
+            continue
+
+        # File từng làm ffmpeg treo/quá giới hạn và chưa bị sửa -> không thử lại
+        if cache.skip_reason(file_path, stat):
+            skipped_count += 1
+            report(file_path)
+            continue
+
+        entry = cache.get(file_path, stat)
+        if entry:
+            results[file_path] = compact_hashes({
+                "path": file_path,
+                "filename": os.path.basename(file_path),
+                "duration": entry['duration'],
+                "hashes": entry['hashes'],
+                "audio": entry['audio']
+            }, collapse)
+            report(file_path)
+        else:
+            pending.append((file_path, stat))
+
+    cached_count = len(results)
+    if cached_count:
+        print(f"[CACHE] Reused {cached_count}/{total} fingerprints")
+        sys.stdout.flush()
+    if skipped_count:
+        print(f"[SKIPPED] {skipped_count} files failed to decode in a previous scan (use --retry-skipped)")
+        sys.stdout.flush()
+
+    # File lớn nhất (thường là dài nhất) chạy trước để tránh 1 file dài chạy một mình ở cuối
+    pending.sort(key=lambda item: item[1].st_size, reverse=True)
+
+    unflushed = []
+
+    def store(file_path, stat, data):
         if data:
-            processed_videos.append(data)
-            
-        time.sleep(0.01)
+            results[file_path] = data
+            cache.put(file_path, stat, data['duration'], data['hashes'], data.get('audio'))
+            unflushed.append(file_path)
+        report(file_path)
 
-    # --- PHASE 2: COMPARING & MOVING ---
+        # Ghi định kỳ xuống index rồi đọc lại qua memmap để RAM không tăng theo số file
+        if len(unflushed) >= INDEX_FLUSH_EVERY:
+            flush()
+
+    def skip(file_path, stat, reason):
+        cache.skip(file_path, stat, reason)
+        print(f"[SKIPPED] {os.path.basename(file_path)}: {reason}")
+        sys.stdout.flush()
+        report(file_path)
+
+    def flush():
+        try:
+            cache.save()
+        except OSError:
+            return
+        for path in unflushed:
+            results[path]['hashes'] = cache.hashes(path)
+            results[path]['audio'] = cache.audio(path)
+            compact_hashes(results[path], collapse)
+        unflushed.clear()
+
+    if workers <= 1 or len(pending) <= 1:
+        for file_path, stat in pending:
+            try:
+                data = fingerprint_video(file_path, ffmpeg_exec, strategy, sparse_points, audio, timeout_base,
+                                         scenes)
+            except DecodeBudgetExceeded as e:
+                skip(file_path, stat, str(e))
+                continue
+            store(file_path, stat, data)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            futures = {
+                pool.submit(fingerprint_video, file_path, ffmpeg_exec, strategy, sparse_points, audio,
+                            timeout_base, scenes): (file_path, stat)
+                for file_path, stat in pending
+            }
+            # Progress gửi theo thứ tự hoàn thành, "current" luôn tăng dần 1..total
+            for future in as_completed(futures):
+                file_path, stat = futures[future]
+                try:
+                    data = future.result()
+                except DecodeBudgetExceeded as e:
+                    skip(file_path, stat, str(e))
+                    continue
+                except Exception:
+                    data = None
+                store(file_path, stat, data)
+
+    flush()
+    # Không ghi được index -> vẫn nén các kết quả còn giữ trong RAM
+    for path in unflushed:
+        compact_hashes(results[path], collapse)
+
+    # Giữ nguyên thứ tự file gốc để kết quả không phụ thuộc vào thứ tự hoàn thành
+    videos = [results[f] for f in files if f in results]
+    report_memory(videos)
+    return videos
+
+# ==========================================
+# 4. COMPARING (PHASE 2)
+# ==========================================
+def report_match(keeper, victim, score, roots, cache, dry_run=False):
+    """Chuyển file trùng vào thư mục rác và báo cho UI. Trả về True nếu chuyển được"""
+    if dry_run:
+        # Chỉ báo cáo, không đụng tới file
+        send_json("match", {
+            "file_a": keeper['filename'],
+            "file_b": victim['filename'],
+            "score": round(score, 2),
+            "dry_run": True
+        })
+        print(f"[DRY-RUN] Would move {victim['filename']} (keep {keeper['filename']})")
+        sys.stdout.flush()
+        return True
+
+    success, msg = move_to_trash(victim, trash_folder_for(victim['path'], roots))
+    if not success:
+        return False
+
+    cache.discard(victim['path'])
+    send_json("match", {
+        "file_a": keeper['filename'], # File giữ lại
+        "file_b": msg,                # File đã chuyển đi
+        "score": round(score, 2)
+    })
+
+    # Log riêng việc đã xóa để UI hiển thị màu đỏ
+    # Định dạng log này app.jsx sẽ bắt được nhờ check "[DELETED]" hoặc "[MOVED]"
+    print(f"[DELETED] Moved {victim['filename']} to {TRASH_FOLDER_NAME}") 
+    sys.stdout.flush()
+    return True
+
+class DisjointSet:
+    """Union-find: gom các cặp trùng thành nhóm, kết quả không phụ thuộc thứ tự so sánh"""
+
+    def __init__(self, count):
+        self.parent = list(range(count))
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        self.parent[max(ra, rb)] = min(ra, rb)
+        return True
+
+def keeper_key(video, policy, ffmpeg_exec='ffmpeg'):
+    """Khóa sắp xếp chọn file giữ lại (lớn hơn = ưu tiên giữ). Thời lượng luôn là tiêu chí phụ"""
+    if policy == 'longest':
+        return (video['duration'],)
+    if 'media' not in video:
+        video['media'] = probe_media(video['path'], ffmpeg_exec)
+    media = video['media']
+    if policy == 'resolution':
+        return (media['width'] * media['height'], media['bitrate'], video['duration'])
+    bitrate = media['bitrate']
+    if not bitrate and video['duration'] > 0:
+        # Container không ghi bitrate -> ước lượng từ kích thước file
+        try:
+            bitrate = os.path.getsize(video['path']) * 8 / video['duration']
+        except OSError:
+            bitrate = 0
+    return (bitrate, video['duration'])
+
+def is_full_match(video1, video2):
+    """2 video cùng độ dài (không bản nào chỉ là đoạn cắt của bản kia)"""
+    longest = max(video1['duration'], video2['duration'])
+    return abs(video1['duration'] - video2['duration']) <= longest * FULL_MATCH_TOLERANCE
+
+def prefers(candidate, existing, policy, ffmpeg_exec='ffmpeg'):
+    """True nếu nên giữ `candidate` thay cho `existing` (hòa -> giữ existing). Clip con luôn nhường file dài"""
+    if not is_full_match(candidate, existing):
+        policy = 'longest'
+    return keeper_key(candidate, policy, ffmpeg_exec) > keeper_key(existing, policy, ffmpeg_exec)
+
+def choose_keeper(cluster, videos, policy, ffmpeg_exec='ffmpeg'):
+    """Chỉ số file giữ lại của 1 nhóm {chỉ số video: {chỉ số khác: score}}.
+
+    Policy chỉ chọn giữa file dài nhất và các bản trùng trọn vẹn với nó (nối trực tiếp trong nhóm);
+    clip con (kể cả clip nối vào nhóm qua file khác) được gắn vào file dài nhất.
+    """
+    longest = max(cluster, key=lambda i: (videos[i]['duration'], -i))
+    full = {longest}
+    stack = [longest]
+    while stack:
+        i = stack.pop()
+        for j in cluster[i]:
+            if j not in full and is_full_match(videos[longest], videos[j]):
+                full.add(j)
+                stack.append(j)
+    # Hòa thì giữ file đứng trước (dài hơn)
+    return max(full, key=lambda i: (keeper_key(videos[i], policy, ffmpeg_exec), -i))
+
+def find_duplicate_clusters(processed_videos, subclips=False, progress=None, confirm=None, ffmpeg_exec='ffmpeg',
+                            stats=None):
+    """Tìm các nhóm video trùng. Trả về list nhóm, mỗi nhóm là {chỉ số video: {chỉ số khác: score}}"""
+    total_videos = len(processed_videos)
+    t0 = time.perf_counter()
+
+    # Index signature: chỉ so sánh chi tiết các cặp có khả năng trùng
+    index = build_candidate_index(processed_videos)
+    # Inverted index tìm clip con bị cắt ở giữa video dài (không bắt đầu từ frame 0)
+    subclip_offsets = find_subclip_offsets(processed_videos) if subclips else {}
+    subclip_partners = {}
+    for a, b in subclip_offsets:
+        subclip_partners.setdefault(a, set()).add(b)
+    # Cặp có audio gần giống: bắt được cả bản bị crop/overlay/lật hình
+    audio_index = build_audio_index(processed_videos)
+
+    signature_time = time.perf_counter() - t0
+    candidate_pairs = 0
+
+    sets = DisjointSet(total_videos)
+    edges = {}
+    for i in range(total_videos):
+        if progress:
+            progress(i)
+        t0 = time.perf_counter()
+        candidates = index.candidates(i) | subclip_partners.get(i, set()) | audio_index.candidates(i)
+        candidates = sorted(c for c in candidates if c > i)
+        signature_time += time.perf_counter() - t0
+        candidate_pairs += len(candidates)
+        for j in candidates:
+            # Đã cùng nhóm qua cặp khác -> không cần so sánh lại
+            if sets.find(i) == sets.find(j):
+                continue
+
+            score = cascade_score(processed_videos[i], processed_videos[j], subclip_offsets.get((i, j), 0),
+                                  confirm, ffmpeg_exec, stats)
+            if score >= 90:
+                sets.union(i, j)
+                edges.setdefault(i, {})[j] = score
+                edges.setdefault(j, {})[i] = score
+
+    if stats:
+        # Tầng rẻ nhất: signature/index loại các cặp không thể trùng mà không cần so sánh hash từng frame
+        stats.stages = {"signature": [total_videos * (total_videos - 1) // 2, candidate_pairs, signature_time],
+                        **stats.stages}
+
+    groups = {}
+    for i in edges:
+        groups.setdefault(sets.find(i), {})[i] = edges[i]
+    return [groups[root] for root in sorted(groups)]
+
+def compare_videos(processed_videos, roots, cache, subclips=False, policy='longest',
+                   dry_run=False, ffmpeg_exec='ffmpeg', confirm=None, report=None):
+    """So sánh, gom nhóm và chuyển file trùng. Trả về (số file đã chuyển, danh sách video còn lại, các nhóm)
+
+    report: các nhóm đã xử lý ở PHASE 0 (được gộp vào báo cáo).
+    """
     # Sắp xếp danh sách video theo thời lượng giảm dần (Dài trước - Ngắn sau)
-    # Điều này giúp ưu tiên giữ file gốc (dài) và loại bỏ file cắt (ngắn)
-    processed_videos.sort(key=lambda x: x['duration'], reverse=True)
-    
+    # để thứ tự so sánh (và kết quả) ổn định giữa các lần chạy
+    processed_videos.sort(key=lambda x: (-x['duration'], x['path']))
     total_videos = len(processed_videos)
-    moved_files = set() # Danh sách các file đã bị di chuyển
+
+    def progress(i):
+        # Gửi progress (giảm tần suất gửi để đỡ lag)
+        if i % 10 == 0 or i == total_videos - 1:
+            send_json("progress", {
+                "phase": "Comparing",
+                "current": i + 1,
+                "total": total_videos,
+                "msg": f"Checking {processed_videos[i]['filename']}..."
+            })
+
+    stats = CascadeStats()
+    clusters = find_duplicate_clusters(processed_videos, subclips, progress, confirm, ffmpeg_exec, stats)
+    stats.report()
+
+    moved_files = set()
     moved_count = 0
-    
-    for i in range(total_videos):
-        vid_a = processed_videos[i]
-        
-        # Nếu Vid A đã bị chuyển đi trước đó, bỏ qua
-        if vid_a['path'] in moved_files:
+    earlier = list(report or [])
+    report = []
+    for cluster in clusters:
+        keeper_id = choose_keeper(cluster, processed_videos, policy, ffmpeg_exec)
+        keeper = processed_videos[keeper_id]
+        entry = {"keep": keeper['path'], "duplicates": []}
+        for i in sorted(cluster):
+            if i == keeper_id:
+                continue
+            victim = processed_videos[i]
+            # Score của cặp khớp tốt nhất trong nhóm (có thể nối qua file khác, không trực tiếp với keeper)
+            score = cluster[i].get(keeper_id, max(cluster[i].values()))
+            entry["duplicates"].append({"path": victim['path'], "score": round(score, 2)})
+            if report_match(keeper, victim, score, roots, cache, dry_run):
+                moved_files.add(victim['path'])
+                moved_count += 1
+        # Nhóm PHASE 0 có file giữ lại nằm trong nhóm này -> gộp thành 1 nhóm
+        members = {keeper['path']} | {d['path'] for d in entry["duplicates"]}
+        for other in [e for e in earlier if e["keep"] in members]:
+            earlier.remove(other)
+            entry["duplicates"] = other["duplicates"] + entry["duplicates"]
+        report.append(entry)
+    report = earlier + report
+
+    if dry_run:
+        send_json("report", {"groups": report})
+        return moved_count, processed_videos, report
+    return moved_count, [v for v in processed_videos if v['path'] not in moved_files], report
+
+# ==========================================
+# 5. WATCH MODE (Theo dõi thư mục liên tục)
+# ==========================================
+def watch_folder(roots, ffmpeg_exec, cache, videos, subclips=False, recursive=False,
+                 strategy='full', sparse_points=SPARSE_POINTS, interval=WATCH_INTERVAL,
+                 policy='longest', dry_run=False, audio=True, collapse=False, timeout_base=DECODE_TIMEOUT,
+                 confirm=None, scenes=False, handled=()):
+    """Chạy mãi: file mới chỉ được so với index hiện có, file trùng bị chuyển ngay.
+
+    handled: các file đã được xử lý trước đó mà không nằm trong `videos` (bản trùng PHASE 0 khi dry-run)
+    """
+    videos = list(videos)
+    index = build_candidate_index(videos)
+    audio_index = build_audio_index(videos)
+    subclip_index = SubclipIndex()
+    subclip_dirty = True
+    known = {v['path'] for v in videos} | set(handled)
+    removed = set()     # Id video trong index đã bị chuyển vào thư mục rác
+    pending = {}        # File đang được ghi: path -> (size, mtime) lần kiểm tra trước
+
+    send_json("progress", {
+        "phase": "Watching",
+        "current": len(videos),
+        "total": len(videos),
+        "msg": f"Watching {', '.join(roots)} ({len(videos)} videos indexed)"
+    })
+
+    while True:
+        time.sleep(interval)
+        try:
+            files = list_library_files(roots, recursive)
+        except OSError:
             continue
-            
-        for j in range(i + 1, total_videos):
-            vid_b = processed_videos[j]
-            
-            # Nếu Vid B đã bị chuyển đi, bỏ qua
-            if vid_b['path'] in moved_files:
+
+        for file_path in files:
+            if file_path in known:
+                continue
+            try:
+                stat = os.stat(file_path)
+            except OSError:
                 continue
 
-            # Gửi progress (giảm tần suất gửi để đỡ lag)
-            if j % 10 == 0:
-                send_json("progress", {
-                    "phase": "Comparing",
-                    "current": i + 1,
-                    "total": total_videos,
-                    "msg": f"Checking {vid_a['filename']}..."
-                })
+            # Chỉ xử lý khi kích thước/mtime không đổi giữa 2 lần kiểm tra (đã copy xong)
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if pending.get(file_path) != signature:
+                pending[file_path] = signature
+                continue
+            del pending[file_path]
+            known.add(file_path)
 
-            score = calculate_similarity(vid_a, vid_b)
-            
-            # Nếu trùng khớp (Score > 90%)
-            if score >= 90:
-                # Logic xác định file nào cần xóa (file ngắn hơn hoặc file sau)
-                if vid_a['duration'] < vid_b['duration']:
-                    victim = vid_a
-                    keeper = vid_b
-                else:
-                    victim = vid_b
-                    keeper = vid_a
-                
-                # Thực hiện di chuyển
-                success, msg = move_to_trash(victim, trash_path)
-                
-                if success:
-                    moved_files.add(victim['path'])
-                    moved_count += 1
-                    
-                    send_json("match", {
-                        "file_a": keeper['filename'], # File giữ lại
-                        "file_b": msg,                # File đã chuyển đi
-                        "score": round(score, 2)
-                    })
-                    
-                    # Log riêng việc đã xóa để UI hiển thị màu đỏ
-                    # Định dạng log này app.jsx sẽ bắt được nhờ check "[DELETED]" hoặc "[MOVED]"
-                    print(f"[DELETED] Moved {victim['filename']} to {TRASH_FOLDER_NAME}") 
-                    sys.stdout.flush()
-                
-                # Nếu vid_a là nạn nhân, dừng vòng lặp j ngay lập tức (vì A không còn ở đó để so sánh nữa)
-                if victim == vid_a:
-                    break
+            # File từng làm ffmpeg treo/quá giới hạn và chưa bị sửa -> không thử lại (như PHASE 1)
+            if cache.skip_reason(file_path, stat):
+                continue
+
+            try:
+                data = fingerprint_video(file_path, ffmpeg_exec, strategy, sparse_points, audio, timeout_base,
+                                         scenes)
+            except DecodeBudgetExceeded as e:
+                cache.skip(file_path, stat, str(e))
+                print(f"[SKIPPED] {os.path.basename(file_path)}: {e}")
+                sys.stdout.flush()
+                continue
+            if not data:
+                continue
+            cache.put(file_path, stat, data['duration'], data['hashes'], data.get('audio'))
+
+            # Ứng viên: signature gần giống (so khớp từ đầu) + audio gần giống + clip con theo cả 2 chiều
+            candidates = {c: 0 for c in index.query(window_signatures(data['hashes']))}
+            for c in audio_index.query(audio_signatures(data.get('audio'))):
+                candidates.setdefault(c, 0)
+            if subclips:
+                if subclip_dirty:
+                    subclip_index.build([v['hashes'] for v in videos])
+                    subclip_dirty = False
+                for vid, offset, _ in subclip_index.query(-1, data['hashes'], reverse=True):
+                    candidates.setdefault(vid, offset)
 
+            kept = True
+            for vid in sorted(candidates):
+                if vid in removed:
+                    continue
+                existing = videos[vid]
+                score = cascade_score(existing, data, candidates[vid], confirm, ffmpeg_exec)
+                if score < 90:
+                    continue
+
+                # Chọn file giữ lại theo cùng policy với PHASE 2 (hòa thì giữ file cũ)
+                if not prefers(data, existing, policy, ffmpeg_exec):
+                    if report_match(existing, data, score, roots, cache, dry_run):
+                        kept = False
+                        break
+                elif report_match(data, existing, score, roots, cache, dry_run):
+                    removed.add(vid)
+
+            if kept:
+                compact_hashes(data, collapse)
+                index.add(window_signatures(data['hashes']))
+                audio_index.add(audio_signatures(data.get('audio')))
+                videos.append(data)
+                subclip_dirty = True
+
+            try:
+                cache.save()
+            except OSError:
+                pass
+
+            send_json("progress", {
+                "phase": "Watching",
+                "current": len(videos) - len(removed),
+                "total": len(videos) - len(removed),
+                "msg": f"Checked {data['filename']}"
+            })
+
+        # File đã biến mất (bị xóa/di chuyển) -> bỏ khỏi index, xử lý lại nếu xuất hiện lần nữa
+        current = set(files)
+        for vid, video in enumerate(videos):
+            if vid not in removed and video['path'] not in current:
+                removed.add(vid)
+        known &= current
+
+# ==========================================
+# 6. FINGERPRINT FILES (export / import / chạy trung tâm)
+# ==========================================
+def split_paths(value):
+    """'a.dvfp;b.dvfp' (phân cách bằng os.pathsep như --roots) -> list đường dẫn"""
+    if not value or value is True:
+        return []
+    return [p for p in str(value).split(os.pathsep) if p]
+
+def parse_remaps(value):
+    """'OLD=NEW|OLD2=NEW2' -> [(OLD, NEW), ...]"""
+    if not value or value is True:
+        return []
+    pairs = []
+    for item in str(value).split('|'):
+        old, sep, new = item.partition('=')
+        if sep and old:
+            pairs.append((old, new))
+    return pairs
+
+def remap_path(path, remaps):
+    for old, new in remaps:
+        if path.startswith(old):
+            path = new + path[len(old):]
+            # Đường dẫn Windows gắn sang máy Linux/macOS
+            return path.replace('\\', '/') if os.sep == '/' else path
+    return path
+
+def open_fingerprint_files(paths, settings=None):
+    """Mở các file fingerprint, bỏ qua file hỏng hoặc có tham số hash khác `settings`
+    (None = khác file hợp lệ đầu tiên)"""
+    opened = []
+    for path in paths:
+        try:
+            fingerprints = FingerprintFile(path)
+        except (OSError, ValueError) as e:
+            print(f"[IMPORT] Skipped {path}: {e}")
+            continue
+        expected = settings if settings is not None else (opened[0].settings if opened else fingerprints.settings)
+        if fingerprints.settings != expected:
+            print(f"[IMPORT] Skipped {path}: fingerprint settings differ")
+            continue
+        opened.append(fingerprints)
+    sys.stdout.flush()
+    return opened
+
+def export_fingerprints(cache, out_path, ffmpeg_exec='ffmpeg'):
+    """Ghi index ra file fingerprint (kèm thông tin container để máy trung tâm chọn file giữ lại theo --keep)"""
+    records = []
+    for path, meta, data in cache.records():
+        if 'media' not in meta:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            if stat and stat.st_size == meta['size'] and stat.st_mtime_ns == meta['mtime']:
+                meta['media'] = probe_media(path, ffmpeg_exec)
+                cache.put_media(path, stat, meta['media'])
+        records.append((path, meta, data))
+    try:
+        count = write_fingerprint_file(out_path, cache.settings, records, socket.gethostname())
+    except OSError as e:
+        print(f"[EXPORT] Cannot write {out_path}: {e}")
+    else:
+        print(f"[EXPORT] {count} fingerprints -> {out_path} ({os.path.getsize(out_path) / 1024:.1f} KB)")
+    sys.stdout.flush()
+
+def import_fingerprints(cache, paths, remaps=()):
+    """Nhập fingerprint của máy khác vào index, chỉ cho các file có mặt ở máy này với cùng nội dung"""
+    for fingerprints in open_fingerprint_files(paths, cache.settings):
+        added = 0
+        for i, entry in enumerate(fingerprints.entries):
+            local_path = remap_path(entry['path'], remaps)
+            try:
+                stat = os.stat(local_path)
+            except OSError:
+                continue
+            if stat.st_size != entry['size'] or abs(stat.st_mtime_ns - entry['mtime']) > IMPORT_MTIME_TOLERANCE_NS:
+                continue
+            if cache.merge(local_path, stat, entry, fingerprints.raw(i)):
+                added += 1
+        source = f" from {fingerprints.node}" if fingerprints.node else ""
+        print(f"[IMPORT] {os.path.basename(fingerprints.path)}{source}: {added}/{len(fingerprints)} fingerprints added")
+        sys.stdout.flush()
+
+def run_from_fingerprints(paths, subclips=False, policy='longest'):
+    """Tìm trùng chỉ từ các file fingerprint (máy trung tâm). Không đọc và không di chuyển video nào"""
+    opened = open_fingerprint_files(paths)
+    if not opened:
+        send_json("error", {"message": "No usable fingerprint files."})
+        return
+
+    # Cùng máy, cùng đường dẫn -> export mới nhất thay cho export cũ
+    latest = {}
+    for fingerprints in sorted(opened, key=lambda f: f.created):
+        for i, entry in enumerate(fingerprints.entries):
+            latest[(fingerprints.node or fingerprints.path, entry['path'])] = (fingerprints, i)
+    # Khác máy: chỉ gộp khi cùng đường dẫn + kích thước + mtime (cùng 1 file trên ổ dùng chung).
+    # Hai file khác nhau tình cờ cùng đường dẫn trên 2 máy được giữ cả hai
+    files = {}
+    for fingerprints, i in sorted(latest.values(), key=lambda item: item[0].created):
+        entry = fingerprints.entries[i]
+        same = files.setdefault((entry['path'], entry['size']), [])
+        for k, (mtime, _, _) in enumerate(same):
+            if abs(mtime - entry['mtime']) <= IMPORT_MTIME_TOLERANCE_NS:
+                same[k] = (entry['mtime'], fingerprints, i)
+                break
+        else:
+            same.append((entry['mtime'], fingerprints, i))
+    chosen = [(fingerprints, i) for same in files.values() for _, fingerprints, i in same]
+    path_count = Counter(fingerprints.entries[i]['path'] for fingerprints, i in chosen)
+    videos = []
+    for fingerprints, i in chosen:
+        video = fingerprints.video(i)
+        if path_count[video['path']] > 1:
+            # Ghi rõ máy nguồn trong báo cáo để phân biệt
+            node = fingerprints.node or os.path.basename(fingerprints.path)
+            video['path'] = f"{node}:{video['path']}"
+            video['filename'] = f"{node}:{video['filename']}"
+        videos.append(video)
+    if policy != 'longest' and any('media' not in v for v in videos):
+        # Không có file gốc để probe -> không so được độ phân giải/bitrate của mọi file
+        print("[IMPORT] Container info missing in some fingerprint files, using --keep=longest")
+        policy = 'longest'
+    nodes = sorted({f.node for f in opened if f.node})
+    print(f"[IMPORT] {len(videos)} fingerprints from {len(opened)} files"
+          + (f" ({', '.join(nodes)})" if nodes else ""))
+    sys.stdout.flush()
+    report_memory(videos)
+
+    moved_count, _, groups = compare_videos(videos, [], None, subclips, policy, dry_run=True)
+    send_json("done", {"message": f"Fingerprint run: {moved_count} duplicates in {len(groups)} groups "
+                                  f"across {len(opened)} fingerprint files. Nothing was moved."})
+
+# ==========================================
+# 7. MAIN EXECUTION
+# ==========================================
+def main():
+    args, options = parse_options(sys.argv[1:])
+    if len(args) < 1 and not options.get('from_fingerprints'):
+        send_json("error", {"message": "Missing arguments"})
+        return
+
+    folder_path = args[0] if args else None
+    ffmpeg_exec = args[1] if len(args) > 1 else 'ffmpeg'
+    try:
+        workers = int(options.get('workers', default_workers()))
+    except ValueError:
+        workers = 1
+    # Tìm clip con ở giữa video dài: tốn RAM theo tổng thời lượng thư viện, phải bật riêng
+    subclips = bool(options.get('subclips'))
+    audio = not options.get('no_audio')
+    collapse = bool(options.get('collapse'))
+    scenes = bool(options.get('scenes'))
+    confirm = options.get('confirm') or None
+    if confirm is True:
+        confirm = CONFIRM_HASHES[0]
+    if confirm and confirm not in CONFIRM_HASHES:
+        send_json("error", {"message": f"Unknown confirm hash '{confirm}'. Use: {', '.join(CONFIRM_HASHES)}"})
+        return
+    try:
+        timeout_base = float(options.get('timeout', DECODE_TIMEOUT))
+    except ValueError:
+        timeout_base = DECODE_TIMEOUT
+    watch = bool(options.get('watch'))
+    try:
+        interval = max(0.5, float(options.get('interval', WATCH_INTERVAL)))
+    except ValueError:
+        interval = WATCH_INTERVAL
+    strategy = options.get('decode', 'full')
+    if strategy not in DECODE_STRATEGIES:
+        send_json("error", {"message": f"Unknown decode strategy '{strategy}'. Use: {', '.join(DECODE_STRATEGIES)}"})
+        return
+    try:
+        sparse_points = max(1, int(options.get('points', SPARSE_POINTS)))
+    except ValueError:
+        sparse_points = SPARSE_POINTS
+    
+    recursive = bool(options.get('recursive'))
+    policy = options.get('keep', 'longest')
+    if policy not in KEEP_POLICIES:
+        send_json("error", {"message": f"Unknown keep policy '{policy}'. Use: {', '.join(KEEP_POLICIES)}"})
+        return
+    # Chỉ báo cáo các nhóm trùng, không chuyển file nào
+    dry_run = bool(options.get('dry_run'))
+
+    # Máy trung tâm: chỉ dùng fingerprint export từ các máy ingest
+    if options.get('from_fingerprints'):
+        run_from_fingerprints(split_paths(options['from_fingerprints']), subclips, policy)
+        return
+
+    # Nhiều thư mục gốc (có thể ở các ổ đĩa khác nhau): --roots=D:\Videos;E:\Archive
+    roots = [folder_path] + [extra for extra in str(options.get('roots', '')).split(os.pathsep) if extra]
+    for root in roots:
+        if not os.path.isdir(root):
+            send_json("error", {"message": f"Folder not found: {root}"})
+            return
+    roots = normalize_roots(roots, recursive)
+    
+    # --- TẠO THƯ MỤC RÁC (mỗi root một thư mục) ---
+    for root in roots:
+        trash_path = os.path.join(root, TRASH_FOLDER_NAME)
+        if not os.path.exists(trash_path):
+            try:
+                os.makedirs(trash_path)
+            except Exception as e:
+                send_json("error", {"message": f"Cannot create folder '{TRASH_FOLDER_NAME}': {e}"})
+                return
+
+    try:
+        files = list_library_files(roots, recursive)
+    except Exception as e:
+        send_json("error", {"message": str(e)})
+        return
+
+    total = len(files)
+    if total < 2 and not watch:
+        send_json("done", {"message": "Not enough videos to compare."})
+        return
+
+    # --- INDEX: bỏ qua các file đã quét và chưa bị sửa ---
+    index_dir = options.get('index') or os.path.join(roots[0], INDEX_DIR_NAME)
+    cache = FingerprintIndex(index_dir, fingerprint_settings(strategy, sparse_points, audio, scenes))
+    cache.load()
+    cache.prune()
+    if options.get('retry_skipped'):
+        cache.clear_skipped()
+    try:
+        cache.compact()
+    except OSError:
+        pass
+    if options.get('import'):
+        import_fingerprints(cache, split_paths(options['import']), parse_remaps(options.get('remap')))
+
+    # --- PHASE 0: BẢN COPY / REMUX (không decode) ---
+    exact_moved, exact_report = 0, []
+    if not options.get('no_exact'):
+        files, exact_moved, exact_report = resolve_exact_duplicates(files, ffmpeg_exec, cache, roots, policy, dry_run)
+
+    # --- PHASE 1: SCANNING ---
+    processed_videos = scan_videos(files, ffmpeg_exec, cache, workers, strategy, sparse_points, audio, collapse,
+                                   timeout_base, scenes)
+
+    try:
+        cache.save()
+    except OSError as e:
+        print(f"[CACHE] Cannot save index: {e}")
+        sys.stdout.flush()
+
+    # --- PHASE 2: COMPARING & MOVING ---
+    moved_count, kept_videos, groups = compare_videos(processed_videos, roots, cache, subclips,
+                                                      policy, dry_run, ffmpeg_exec, confirm, exact_report)
+    moved_count += exact_moved
+
+    try:
+        cache.save()
+    except OSError:
+        pass
+    if options.get('export') and options['export'] is not True:
+        export_fingerprints(cache, options['export'], ffmpeg_exec)
+        try:
+            cache.save()
+        except OSError:
+            pass
+
+    if watch:
+        # Bản trùng PHASE 0 (dry-run: vẫn nằm trong thư mục) không bị báo lại ở mỗi lần kiểm tra
+        exact_paths = [d['path'] for entry in exact_report for d in entry['duplicates']]
+        watch_folder(roots, ffmpeg_exec, cache, kept_videos, subclips, recursive, strategy, sparse_points,
+                     interval, policy, dry_run, audio, collapse, timeout_base, confirm, scenes, exact_paths)
+        return
+
+    if dry_run:
+        send_json("done", {"message": f"Dry run: {moved_count} duplicates in {len(groups)} groups. Nothing was moved."})
+        return
     send_json("done", {"message": f"Completed. Moved {moved_count} duplicates to '{TRASH_FOLDER_NAME}'."})
 
 if __name__ == "__main__":
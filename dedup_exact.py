@@ -0,0 +1,115 @@
+import os
+import re
+import hashlib
+import subprocess
+
+# ==========================================
+# EXACT / REMUX DUPLICATES (không cần decode)
+# ==========================================
+# - Bản copy y hệt: cùng kích thước + cùng hash của 3 đoạn đầu/giữa/cuối file.
+# - Bản remux (đổi container mp4 <-> mkv <-> mov, giữ nguyên luồng hình): cùng codec, độ phân giải,
+#   thời lượng, và cùng hash của toàn bộ packet hình đọc bằng '-c copy' (chỉ tách gói, không decode).
+
+EXACT_CHUNK = 1024 * 1024
+# Thời lượng container có thể lệch chút ít giữa các định dạng (mkv làm tròn tới ms)
+REMUX_DURATION_TOLERANCE = 0.1
+STREAM_HASH_TIMEOUT = 600
+
+def partial_hash(file_path, chunk=EXACT_CHUNK):
+    """Hash nhanh: kích thước + đoạn đầu, giữa, cuối (file nhỏ thì đọc toàn bộ)"""
+    size = os.path.getsize(file_path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(file_path, 'rb') as f:
+        if size <= 3 * chunk:
+            digest.update(f.read())
+        else:
+            for offset in (0, (size - chunk) // 2, size - chunk):
+                f.seek(offset)
+                digest.update(f.read(chunk))
+    return digest.hexdigest()
+
+def stream_hash(file_path, ffmpeg_path='ffmpeg', timeout=STREAM_HASH_TIMEOUT):
+    """MD5 của toàn bộ packet luồng hình đầu tiên (stream copy, không decode). None nếu lỗi"""
+    command = [
+        ffmpeg_path,
+        '-v', 'error',
+        '-i', file_path,
+        '-map', '0:v:0',
+        '-c', 'copy',
+        '-f', 'hash',
+        '-hash', 'md5',
+        '-'
+    ]
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    match = re.search(rb'MD5=([0-9a-f]+)', result.stdout)
+    return match.group(1).decode() if match else None
+
+def exact_groups(files):
+    """Nhóm các file giống hệt nhau (chỉ đọc vài MB mỗi file, và chỉ với file trùng kích thước)"""
+    by_size = {}
+    for file_path in files:
+        try:
+            by_size.setdefault(os.path.getsize(file_path), []).append(file_path)
+        except OSError:
+            pass
+
+    groups = []
+    for same_size in by_size.values():
+        if len(same_size) < 2:
+            continue
+        by_hash = {}
+        for file_path in same_size:
+            try:
+                by_hash.setdefault(partial_hash(file_path), []).append(file_path)
+            except OSError:
+                pass
+        groups.extend(g for g in by_hash.values() if len(g) > 1)
+    return groups
+
+def media_key(info):
+    """Khóa nhóm remux từ thông tin container: (các luồng, độ phân giải). None nếu không có luồng hình"""
+    streams = info.get('streams') or []
+    if not any(s.startswith('video:') for s in streams) or info.get('duration', 0) <= 0:
+        return None
+    return (tuple(sorted(streams)), info.get('width', 0), info.get('height', 0))
+
+def remux_groups(files, infos, hasher):
+    """Nhóm các file có cùng luồng hình trong container khác nhau.
+
+    infos: {path: thông tin container}; hasher(path) -> hash luồng hình (chỉ gọi cho file
+    có codec/độ phân giải/thời lượng trùng với file khác).
+    """
+    buckets = {}
+    for file_path in files:
+        key = media_key(infos.get(file_path, {}))
+        if key is not None:
+            buckets.setdefault(key, []).append(file_path)
+
+    groups = []
+    for bucket in buckets.values():
+        if len(bucket) < 2:
+            continue
+        bucket.sort(key=lambda p: infos[p]['duration'])
+        # Chia tiếp theo thời lượng (các file liền nhau lệch không quá dung sai)
+        runs, run = [], [bucket[0]]
+        for file_path in bucket[1:]:
+            if infos[file_path]['duration'] - infos[run[-1]]['duration'] <= REMUX_DURATION_TOLERANCE:
+                run.append(file_path)
+            else:
+                runs.append(run)
+                run = [file_path]
+        runs.append(run)
+
+        for run in runs:
+            if len(run) < 2:
+                continue
+            by_hash = {}
+            for file_path in run:
+                digest = hasher(file_path)
+                if digest:
+                    by_hash.setdefault(digest, []).append(file_path)
+            groups.extend(g for g in by_hash.values() if len(g) > 1)
+    return groups
@@ -0,0 +1,237 @@
+import math
+
+import numpy as np
+
+# ==========================================
+# PACKED HASH (mỗi frame hash = 1 số uint64)
+# ==========================================
+# Thứ tự bit giống str(ImageHash): bit đầu tiên của hash là bit cao nhất,
+# nên hex của số uint64 trùng với hex của imagehash.
+
+def pack_bits(bits):
+    """Mảng bool (N, 64) hoặc (N, 8, 8) -> mảng uint64 (N,)"""
+    bits = np.asarray(bits, dtype=bool).reshape(len(bits), -1)
+    return np.packbits(bits, axis=1).view('>u8').ravel().astype(np.uint64)
+
+def unpack_bits(hashes):
+    """Mảng uint64 (N,) -> mảng bool (N, 64)"""
+    raw = np.ascontiguousarray(hashes, dtype='>u8').view(np.uint8)
+    return np.unpackbits(raw).reshape(-1, 64).astype(bool)
+
+def hashes_to_hex(hashes):
+    """Mã hóa mảng hash thành chuỗi hex (dùng để lưu JSON)"""
+    return np.ascontiguousarray(hashes, dtype='<u8').tobytes().hex()
+
+def hashes_from_hex(text):
+    return np.frombuffer(bytes.fromhex(text), dtype='<u8').astype(np.uint64)
+
+def popcount64(values):
+    """Đếm số bit 1 của từng phần tử trong mảng uint64"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    v = values.astype(np.uint64)
+    v = v - ((v >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    v = (v & np.uint64(0x3333333333333333)) + ((v >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    v = (v + (v >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((v * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.uint8)
+
+def hamming(a, b):
+    """Khoảng cách Hamming từng cặp phần tử (a[i] với b[i])"""
+    return popcount64(np.bitwise_xor(a, b))
+
+def hamming_one_to_many(code, codes):
+    """Khoảng cách từ một hash tới mọi hash trong `codes`"""
+    return popcount64(np.bitwise_xor(np.asarray(codes, dtype=np.uint64), np.uint64(code)))
+
+def hamming_matrix(codes_a, codes_b, block=4096):
+    """Ma trận khoảng cách (len(a), len(b)), tính theo khối để giới hạn bộ nhớ tạm"""
+    codes_a = np.asarray(codes_a, dtype=np.uint64)
+    codes_b = np.asarray(codes_b, dtype=np.uint64)
+    out = np.empty((len(codes_a), len(codes_b)), dtype=np.uint8)
+    for start in range(0, len(codes_a), block):
+        chunk = codes_a[start:start + block]
+        out[start:start + len(chunk)] = popcount64(chunk[:, None] ^ codes_b[None, :])
+    return out
+
+# ==========================================
+# DHASH THEO LÔ (thay cho PIL + imagehash từng frame)
+# ==========================================
+# imagehash.dhash = resize ảnh xám về (hash_size + 1) x hash_size bằng LANCZOS của PIL
+# rồi so sánh 2 pixel kề nhau theo chiều ngang. Ở đây làm lại đúng phép resize của PIL
+# (Resample.c, ảnh 8 bit): hệ số lanczos làm tròn về số nguyên 22 bit, resize ngang trước,
+# dọc sau, mỗi lượt làm tròn + kẹp về 0..255 -> kết quả trùng từng bit với imagehash,
+# nhưng tính cho cả nghìn frame một lúc bằng phép nhân ma trận.
+PIL_PRECISION_BITS = 32 - 8 - 2
+LANCZOS_SUPPORT = 3.0
+
+def _sinc(x):
+    if x == 0.0:
+        return 1.0
+    x = x * math.pi
+    return math.sin(x) / x
+
+def _lanczos(x):
+    if -LANCZOS_SUPPORT <= x < LANCZOS_SUPPORT:
+        return _sinc(x) * _sinc(x / 3)
+    return 0.0
+
+def resample_weights(in_size, out_size):
+    """Ma trận hệ số (in_size, out_size) giống precompute_coeffs + normalize_coeffs_8bpc của PIL"""
+    scale = in_size / out_size
+    filterscale = max(scale, 1.0)
+    support = LANCZOS_SUPPORT * filterscale
+    weights = np.zeros((in_size, out_size), dtype=np.float64)
+    for xx in range(out_size):
+        center = (xx + 0.5) * scale
+        ss = 1.0 / filterscale
+        xmin = max(int(center - support + 0.5), 0)
+        xmax = min(int(center + support + 0.5), in_size) - xmin
+        k = [_lanczos((x + xmin - center + 0.5) * ss) for x in range(xmax)]
+        ww = sum(k)
+        for x in range(xmax):
+            w = k[x] / ww if ww != 0.0 else k[x]
+            # Làm tròn ra xa số 0 giống (int)(±0.5 + w * (1 << PRECISION_BITS)) trong C
+            weights[xmin + x, xx] = int(w * (1 << PIL_PRECISION_BITS) + (0.5 if w >= 0 else -0.5))
+    return weights
+
+def _clip8(values):
+    # (tổng + 0.5) >> PRECISION_BITS rồi kẹp 0..255. Mọi giá trị đều là số nguyên < 2^53 nên float64 tính chính xác
+    return np.clip(np.floor((values + (1 << (PIL_PRECISION_BITS - 1))) / (1 << PIL_PRECISION_BITS)), 0, 255)
+
+_WEIGHT_CACHE = {}
+# Số frame mỗi lần nhân ma trận (mảng float64 tạm vừa cache CPU)
+DHASH_BLOCK = 256
+
+def dhash_frames(frames, hash_size=8):
+    """frames: mảng uint8 (N, H, W) ảnh xám -> mảng uint64 (N,), trùng bit với imagehash.dhash"""
+    frames = np.asarray(frames, dtype=np.uint8)
+    count, height, width = frames.shape
+    if count == 0:
+        return np.zeros(0, dtype=np.uint64)
+    if count > DHASH_BLOCK:
+        return np.concatenate([dhash_frames(frames[i:i + DHASH_BLOCK], hash_size)
+                               for i in range(0, count, DHASH_BLOCK)])
+    key = (height, width, hash_size)
+    if key not in _WEIGHT_CACHE:
+        _WEIGHT_CACHE[key] = (resample_weights(width, hash_size + 1), resample_weights(height, hash_size).T)
+    horizontal, vertical = _WEIGHT_CACHE[key]
+
+    # Gộp N frame thành một phép nhân ma trận lớn cho mỗi lượt (nhanh hơn nhiều so với N phép nhân nhỏ)
+    rows = _clip8(frames.reshape(count * height, width).astype(np.float64) @ horizontal)
+    rows = rows.reshape(count, height, hash_size + 1).transpose(1, 0, 2).reshape(height, -1)
+    pixels = _clip8(vertical @ rows).reshape(hash_size, count, hash_size + 1).transpose(1, 0, 2)
+    return pack_bits(pixels[:, :, 1:] > pixels[:, :, :-1])
+
+# ==========================================
+# PHASH (dùng để xác nhận các cặp có điểm dhash sát ngưỡng)
+# ==========================================
+def dct_matrix(n):
+    """Ma trận DCT-II (không chuẩn hóa, giống scipy.fftpack.dct mặc định)"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    return 2 * np.cos(np.pi * (2 * x + 1) * k / (2 * n))
+
+def phash_frames(frames, hash_size=8):
+    """frames: mảng uint8 (N, S, S) ảnh xám đã thu nhỏ -> mảng uint64 (N,).
+
+    Giống imagehash.phash: DCT 2 chiều, lấy khối tần số thấp hash_size x hash_size, so với trung vị.
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    if len(frames) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    dct = dct_matrix(frames.shape[1])
+    coeffs = dct @ frames @ dct.T
+    low = coeffs[:, :hash_size, :hash_size].reshape(len(frames), -1)
+    return pack_bits(low > np.median(low, axis=1, keepdims=True))
+
+# ==========================================
+# RUN-LENGTH (gộp các frame liên tiếp có hash giống hệt nhau)
+# ==========================================
+# Cảnh tĩnh (slide, người nói trước camera...) cho ra hàng trăm frame cùng hash.
+# Chỉ lưu giá trị của mỗi đoạn lặp + frame bắt đầu đoạn; truy cập theo frame bằng searchsorted.
+
+class RunLengthHashes:
+    """Mảng hash theo frame dạng nén. Hỗ trợ len(), cắt lát [a:b:step], chỉ số mảng và np.asarray()"""
+
+    __slots__ = ('values', 'starts', 'count')
+
+    def __init__(self, values, starts, count):
+        self.values = values
+        self.starts = starts
+        self.count = count
+
+    @classmethod
+    def from_hashes(cls, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if len(hashes) == 0:
+            return cls(hashes.copy(), np.zeros(0, dtype=np.uint32), 0)
+        starts = np.flatnonzero(np.concatenate(([True], hashes[1:] != hashes[:-1]))).astype(np.uint32)
+        return cls(hashes[starts], starts, len(hashes))
+
+    def take(self, frames):
+        frames = np.asarray(frames, dtype=np.int64)
+        return self.values[np.searchsorted(self.starts, frames, side='right') - 1]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.take(np.arange(*key.indices(self.count)))
+        if np.ndim(key) == 0:
+            return self.take([key + self.count if key < 0 else key])[0]
+        return self.take(key)
+
+    def __array__(self, dtype=None, copy=None):
+        lengths = np.diff(np.append(self.starts.astype(np.int64), self.count))
+        expanded = np.repeat(self.values, lengths)
+        return expanded if dtype is None else expanded.astype(dtype)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.starts.nbytes
+
+# ==========================================
+# ĐOẠN CẢNH (fingerprint rút gọn, --scenes)
+# ==========================================
+# Cảnh quay tĩnh/chậm cho ra các frame có hash gần giống nhau (không giống hệt nên run-length
+# không gộp được). Chia video thành các đoạn liên tiếp, mỗi đoạn chỉ lưu 1 hash (bit đa số của
+# các frame trong đoạn) + frame bắt đầu đoạn. Đoạn được nối dài tới khi có frame lệch khỏi hash
+# đại diện từ SCENE_CUT_DISTANCE bit (cắt cảnh / camera đã di chuyển nhiều) hoặc dài quá
+# SCENE_FALLBACK_FRAMES frame (giữ timestamp đủ dày để căn chỉnh clip con).
+SCENE_CUT_DISTANCE = 9         # Mọi frame lệch <= 8 bit so với hash thay thế (ngưỡng khớp là 12)
+SCENE_FALLBACK_FRAMES = 80     # 10 giây ở 8 fps
+# Video chuyển động liên tục gần như frame nào cũng là đoạn mới: nếu không nhỏ đi ít nhất
+# SCENE_MIN_SHRINK lần thì giữ hash từng frame (tránh mất độ chính xác mà không tiết kiệm được bao nhiêu)
+SCENE_MIN_SHRINK = 4
+
+def scene_segments(hashes, cut_distance=SCENE_CUT_DISTANCE, fallback=SCENE_FALLBACK_FRAMES):
+    """Trả về (frame bắt đầu từng đoạn uint32, hash đại diện từng đoạn uint64)"""
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    bits = unpack_bits(hashes).astype(np.int32)
+    starts, values = [], []
+    start = 0
+    while start < len(hashes):
+        end = start + 1
+        counts = bits[start].copy()
+        value = hashes[start]
+        while end < len(hashes) and end - start < fallback:
+            grown = counts + bits[end]
+            majority = pack_bits((grown * 2 > end - start + 1)[None])[0]
+            if hamming_one_to_many(majority, hashes[start:end + 1]).max() >= cut_distance:
+                break
+            counts, value = grown, majority
+            end += 1
+        starts.append(start)
+        values.append(value)
+        start = end
+    return np.array(starts, dtype=np.uint32), np.array(values, dtype=np.uint64)
+
+def scene_fingerprint(hashes, cut_distance=SCENE_CUT_DISTANCE, fallback=SCENE_FALLBACK_FRAMES):
+    """RunLengthHashes theo đoạn cảnh, hoặc chính `hashes` nếu rút gọn không đáng kể"""
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    starts, values = scene_segments(hashes, cut_distance, fallback)
+    scenes = RunLengthHashes(values, starts, len(hashes))
+    if scenes.nbytes * SCENE_MIN_SHRINK > hashes.nbytes:
+        return hashes
+    return scenes
@@ -0,0 +1,304 @@
+import numpy as np
+
+from dedup_hash import pack_bits, unpack_bits, popcount64, RunLengthHashes
+
+# ==========================================
+# CANDIDATE INDEX (Tránh so sánh tất cả các cặp)
+# ==========================================
+# Mỗi video được tóm tắt bằng vài "signature" 64-bit: mỗi signature là hash
+# đa số (majority vote) của SIGNATURE_FRAMES frame liên tiếp, lấy tại các vị trí
+# cố định tính từ đầu video. Hai video trùng nhau (so sánh frame i với frame i)
+# sẽ có signature gần giống nhau tại cùng vị trí.
+SIGNATURE_FRAMES = 16
+SIGNATURE_STARTS = (0, 80, 400, 2000)  # Frame bắt đầu của từng cửa sổ (8 fps: 0s, 10s, 50s, 250s)
+SIGNATURE_RADIUS = 11                   # Khớp với ngưỡng "diff < 12" của từng frame
+
+# Multi-index hashing: chia 64 bit thành 4 khúc 16 bit
+MIH_CHUNKS = 4
+MIH_CHUNK_BITS = 16
+# Bỏ qua bucket quá đông (intro đen / intro chung, đoạn đầu im lặng của index audio...): nếu không,
+# số cặp ứng viên tăng theo bình phương số video. Slot khác của video vẫn tìm được bản trùng
+CANDIDATE_MAX_POSTINGS = 500
+# Số video được tra cùng một lượt khi sinh ứng viên (không giữ danh sách ứng viên của cả index trong RAM)
+CANDIDATE_QUERY_BLOCK = 2048
+
+def window_signatures(hashes):
+    """hashes: mảng uint64 của từng frame. Trả về {vị trí cửa sổ: signature}"""
+    count = len(hashes)
+    signatures = {}
+    for slot, start in enumerate(SIGNATURE_STARTS):
+        if start + SIGNATURE_FRAMES > count:
+            break
+        window = unpack_bits(hashes[start:start + SIGNATURE_FRAMES])
+        signatures[slot] = int(pack_bits(window.sum(axis=0, keepdims=True) * 2 > len(window))[0])
+    return signatures
+
+def _neighbour_masks(bits, radius):
+    """Tất cả mask có tối đa `radius` bit bật trong `bits` bit"""
+    masks = [0]
+    frontier = [(0, -1)]
+    for _ in range(radius):
+        next_frontier = []
+        for mask, last in frontier:
+            for b in range(last + 1, bits):
+                next_frontier.append((mask | (1 << b), b))
+        masks.extend(m for m, _ in next_frontier)
+        frontier = next_frontier
+    return np.array(masks, dtype=np.uint32)
+
+def _chunk(codes, k):
+    return ((codes >> np.uint64(k * MIH_CHUNK_BITS)) & np.uint64((1 << MIH_CHUNK_BITS) - 1)).astype(np.uint32)
+
+class MultiIndexHasher:
+    """Tìm các cặp mã 64-bit có khoảng cách Hamming <= radius mà không duyệt tất cả các cặp.
+
+    Nếu 2 mã cách nhau <= r bit thì (nguyên lý Dirichlet) ít nhất một khúc 16 bit
+    cách nhau <= r // 4 bit, nên chỉ cần dò các khúc lân cận trong bảng đã sắp xếp
+    rồi kiểm tra lại khoảng cách đầy đủ. Toàn bộ phép dò chạy bằng NumPy theo lô.
+    """
+
+    def __init__(self, codes, radius=SIGNATURE_RADIUS, max_postings=CANDIDATE_MAX_POSTINGS):
+        self.codes = np.asarray(codes, dtype=np.uint64)
+        self.radius = radius
+        self.max_postings = max_postings
+        self.masks = _neighbour_masks(MIH_CHUNK_BITS, radius // MIH_CHUNKS)
+        # Mỗi khúc 16 bit chỉ có 65536 giá trị nên dùng bảng bucket trực tiếp (không cần tìm kiếm)
+        self.tables = []
+        for k in range(MIH_CHUNKS):
+            chunk = _chunk(self.codes, k)
+            order = np.argsort(chunk, kind='stable')
+            bucket_counts = np.bincount(chunk, minlength=1 << MIH_CHUNK_BITS)
+            bucket_starts = np.cumsum(bucket_counts) - bucket_counts
+            self.tables.append((order, bucket_starts, bucket_counts))
+
+    def join(self, query_codes):
+        """Trả về (chỉ số query, chỉ số trong bảng) của mọi cặp cách nhau <= radius"""
+        query_codes = np.asarray(query_codes, dtype=np.uint64)
+        q_parts, b_parts = [], []
+        for k, (order, bucket_starts, bucket_counts) in enumerate(self.tables):
+            q_chunk = _chunk(query_codes, k)
+            for mask in self.masks:
+                probe = q_chunk ^ mask
+                lo = bucket_starts[probe]
+                counts = bucket_counts[probe]
+                counts[counts > self.max_postings] = 0
+                total = int(counts.sum())
+                if total == 0:
+                    continue
+                starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+                q_parts.append(np.repeat(np.arange(len(probe)), counts))
+                b_parts.append(order[starts + np.arange(total)])
+
+        if not q_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        q_idx = np.concatenate(q_parts)
+        b_idx = np.concatenate(b_parts)
+        keep = popcount64(query_codes[q_idx] ^ self.codes[b_idx]) <= self.radius
+        pair_keys = np.unique(q_idx[keep] * len(self.codes) + b_idx[keep])
+        return pair_keys // len(self.codes), pair_keys % len(self.codes)
+
+class CandidateIndex:
+    """Sinh danh sách ứng viên trùng lặp cho từng video.
+
+    Video quá ngắn để có signature sẽ được so sánh với tất cả (như cách cũ),
+    trừ khi match_unindexed=False (vd. index audio: video không có tiếng thì bỏ qua).
+    """
+
+    def __init__(self, radius=SIGNATURE_RADIUS, slots=len(SIGNATURE_STARTS), match_unindexed=True):
+        self.radius = radius
+        self.slots = slots
+        self.match_unindexed = match_unindexed
+        self.signatures = []
+        self.unindexed = []
+        self._block = None      # (video đầu tiên của lô, {video: ứng viên}) của lô vừa tra
+        self._hashers = None
+
+    def add(self, signatures):
+        """Thêm video (theo thứ tự), trả về id của video trong index"""
+        item_id = len(self.signatures)
+        self.signatures.append(signatures)
+        if not signatures and self.match_unindexed:
+            self.unindexed.append(item_id)
+        self._block = None
+        self._hashers = None
+        return item_id
+
+    def _slot_hashers(self):
+        if self._hashers is None:
+            self._hashers = []
+            for slot in range(self.slots):
+                ids = np.array([i for i, sig in enumerate(self.signatures) if slot in sig], dtype=np.int64)
+                codes = [self.signatures[i][slot] for i in ids]
+                self._hashers.append((ids, MultiIndexHasher(codes, self.radius)))
+        return self._hashers
+
+    def _block_neighbours(self, first):
+        """Ứng viên của các video [first, first + CANDIDATE_QUERY_BLOCK), tra cả lô một lần"""
+        members = range(first, min(len(self.signatures), first + CANDIDATE_QUERY_BLOCK))
+        neighbours = {i: set() for i in members}
+        for slot, (ids, hasher) in enumerate(self._slot_hashers()):
+            query = np.array([i for i in members if slot in self.signatures[i]], dtype=np.int64)
+            if len(ids) < 2 or len(query) == 0:
+                continue
+            q_idx, b_idx = hasher.join([self.signatures[i][slot] for i in query])
+            for a, b in zip(query[q_idx].tolist(), ids[b_idx].tolist()):
+                if a != b:
+                    neighbours[a].add(b)
+        return neighbours
+
+    def candidates(self, item_id):
+        signatures = self.signatures[item_id]
+        if not signatures:
+            return set(range(len(self.signatures))) - {item_id} if self.match_unindexed else set()
+
+        # Thường được gọi lần lượt theo id -> chỉ giữ ứng viên của lô hiện tại
+        first = item_id - item_id % CANDIDATE_QUERY_BLOCK
+        if self._block is None or self._block[0] != first:
+            self._block = (first, self._block_neighbours(first))
+        found = self._block[1][item_id] | set(self.unindexed)
+        found.discard(item_id)
+        return found
+
+    def query(self, signatures):
+        """Tìm ứng viên cho một video chưa có trong index"""
+        if not signatures:
+            return set(range(len(self.signatures))) if self.match_unindexed else set()
+
+        found = set(self.unindexed)
+        hashers = self._slot_hashers()
+        for slot, code in signatures.items():
+            ids, hasher = hashers[slot]
+            if len(ids) == 0:
+                continue
+            _, b_idx = hasher.join([code])
+            found.update(ids[b_idx].tolist())
+        return found
+
+# ==========================================
+# SUBCLIP INDEX (Tìm clip con bị cắt từ video dài hơn)
+# ==========================================
+# Inverted index: mỗi khúc 16 bit của frame hash -> danh sách (video, frame).
+# Một clip ngắn tra từng frame của nó, mỗi lần trùng khúc sẽ "bỏ phiếu" cho cặp
+# (video nguồn, độ lệch = frame nguồn - frame clip). Độ lệch đúng sẽ nhận nhiều
+# phiếu nhất nên không cần trượt cửa sổ qua toàn bộ video nguồn.
+SUBCLIP_INDEX_STEP = 4        # Chỉ index 1/4 số frame của video nguồn (độ lệch vẫn chính xác)
+SUBCLIP_MIN_FRAMES = 16       # Clip ngắn hơn 2 giây (8 fps) không tìm clip con
+SUBCLIP_MAX_POSTINGS = 5000   # Bỏ qua bucket quá đông (frame đen, frame tĩnh...)
+SUBCLIP_MIN_VOTES = 3
+SUBCLIP_MAX_RESULTS = 3       # Số cặp (nguồn, độ lệch) tốt nhất trả về cho mỗi clip
+SUBCLIP_MIN_COVERAGE = 0.9    # Clip phải nằm gần trọn trong video nguồn
+
+def segment_positions(hashes, step):
+    """(frame bắt đầu, hash) của từng đoạn nếu là fingerprint theo cảnh (đủ thưa), ngược lại None.
+
+    Index và tra cứu theo đầu các đoạn cảnh: độ lệch được căn theo chuỗi cắt cảnh của 2 video.
+    """
+    if isinstance(hashes, RunLengthHashes) and len(hashes.values) * step <= len(hashes):
+        return hashes.starts.astype(np.int64), np.asarray(hashes.values, dtype=np.uint64)
+    return None
+
+class SubclipIndex:
+    def __init__(self, step=SUBCLIP_INDEX_STEP):
+        self.step = step
+        self.lengths = np.zeros(0, dtype=np.int64)
+
+    def build(self, all_hashes):
+        """all_hashes: list mảng uint64 theo thứ tự id video"""
+        self.lengths = np.array([len(h) for h in all_hashes], dtype=np.int64)
+        keys, vids, frames = [], [], []
+        for vid, hashes in enumerate(all_hashes):
+            segments = segment_positions(hashes, self.step)
+            if segments is not None:
+                positions, sampled = segments
+            else:
+                positions = np.arange(0, len(hashes), self.step)
+                # Chỉ lấy các frame cần index (không bung toàn bộ mảng nếu hash đang nén run-length)
+                sampled = np.asarray(hashes[positions], dtype=np.uint64)
+            for k in range(MIH_CHUNKS):
+                keys.append(_chunk(sampled, k).astype(np.int64) + (k << MIH_CHUNK_BITS))
+                vids.append(np.full(len(positions), vid, dtype=np.int32))
+                frames.append(positions.astype(np.int32))
+
+        total_keys = MIH_CHUNKS << MIH_CHUNK_BITS
+        if not keys:
+            self.vids = self.frames = np.zeros(0, dtype=np.int32)
+            self.bucket_counts = self.bucket_starts = np.zeros(total_keys, dtype=np.int64)
+            return
+
+        keys = np.concatenate(keys)
+        order = np.argsort(keys, kind='stable')
+        self.vids = np.concatenate(vids)[order]
+        self.frames = np.concatenate(frames)[order]
+        self.bucket_counts = np.bincount(keys, minlength=total_keys)
+        self.bucket_starts = np.cumsum(self.bucket_counts) - self.bucket_counts
+
+    @property
+    def nbytes(self):
+        """Dung lượng RAM của index (posting + bảng bucket)"""
+        if not hasattr(self, 'vids'):
+            return 0
+        return self.vids.nbytes + self.frames.nbytes + self.bucket_counts.nbytes + self.bucket_starts.nbytes
+
+    def query(self, item_id, hashes, reverse=False):
+        """Trả về list (id nguồn, độ lệch frame, số phiếu), phiếu cao nhất trước.
+
+        reverse=True: tìm thêm các video ngắn hơn nằm trong `hashes` (độ lệch âm).
+        """
+        clip_len = len(hashes)
+        if clip_len < SUBCLIP_MIN_FRAMES or len(self.vids) == 0:
+            return []
+
+        segments = segment_positions(hashes, self.step)
+        if segments is not None:
+            clip_frames, hashes = segments
+        else:
+            hashes = np.asarray(hashes, dtype=np.uint64)
+            clip_frames = np.arange(clip_len, dtype=np.int64)
+        vid_parts, offset_parts = [], []
+        for k in range(MIH_CHUNKS):
+            key = _chunk(hashes, k).astype(np.int64) + (k << MIH_CHUNK_BITS)
+            counts = self.bucket_counts[key].copy()
+            counts[counts > SUBCLIP_MAX_POSTINGS] = 0
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            lo = self.bucket_starts[key]
+            pos = np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(total)
+            vid_parts.append(self.vids[pos])
+            offset_parts.append(self.frames[pos] - np.repeat(clip_frames, counts))
+
+        if not vid_parts:
+            return []
+
+        vids = np.concatenate(vid_parts).astype(np.int64)
+        offsets = np.concatenate(offset_parts)
+
+        # Chỉ giữ nguồn dài hơn clip và độ lệch để clip nằm gần trọn trong nguồn
+        src_len = self.lengths[vids]
+        valid = (src_len >= clip_len) & (offsets >= 0)
+        valid &= offsets + clip_len * SUBCLIP_MIN_COVERAGE <= src_len
+        if reverse:
+            inside = (src_len < clip_len) & (offsets <= 0) & (src_len >= SUBCLIP_MIN_FRAMES)
+            valid |= inside & (src_len * SUBCLIP_MIN_COVERAGE - offsets <= clip_len)
+        valid &= vids != item_id
+        vids, offsets = vids[valid], offsets[valid]
+        if len(vids) == 0:
+            return []
+
+        # Độ lệch có thể âm (reverse) nên dời về số dương trước khi gộp phiếu
+        shift = clip_len
+        span = int(self.lengths.max()) + shift + 1
+        votes_keys, votes = np.unique(vids * span + offsets + shift, return_counts=True)
+        results = []
+        seen = set()
+        for idx in np.argsort(-votes, kind='stable'):
+            if votes[idx] < SUBCLIP_MIN_VOTES or len(results) >= SUBCLIP_MAX_RESULTS:
+                break
+            vid, offset = divmod(int(votes_keys[idx]), span)
+            offset -= shift
+            if vid in seen:
+                continue
+            seen.add(vid)
+            results.append((vid, offset, int(votes[idx])))
+        return results
@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import struct
+
+import numpy as np
+
+from dedup_store import split_entry
+
+# ==========================================
+# FILE FINGERPRINT DI ĐỘNG (export / import giữa các máy)
+# ==========================================
+# Mỗi máy ingest export index của mình ra 1 file (--export=...). Máy khác nhập vào index của nó
+# (--import=...) để không phải quét lại nội dung dùng chung, hoặc máy trung tâm gộp nhiều file lại
+# (--from-fingerprints=...) để tìm trùng trên toàn hệ thống mà không cần đọc file video gốc.
+#
+# Cấu trúc file (little-endian):
+#   0  : magic b'DVFP'
+#   4  : version (uint32)
+#   8  : độ dài header (uint64, đã tính phần đệm)
+#   16 : header JSON UTF-8 {settings, node, created, entries}, đệm khoảng trắng cho tròn 8 byte
+#   .. : hash uint64 của mọi file nối liền nhau, mỗi file [hình][audio] giống shard của index
+# Phần hash được đọc qua memmap: file lớn cũng không phải nạp hết vào RAM.
+
+FINGERPRINT_MAGIC = b'DVFP'
+FINGERPRINT_VERSION = 1
+# Metadata của từng file được ghi vào header
+ENTRY_FIELDS = ('size', 'mtime', 'duration', 'count', 'audio_count', 'frames', 'media')
+
+def write_fingerprint_file(out_path, settings, records, node=None):
+    """records: list (path, metadata, dữ liệu uint64 [hình][audio]). Trả về số file đã ghi"""
+    entries = []
+    offset = 0
+    for path, meta, data in records:
+        entry = {"path": path, "offset": offset}
+        entry.update({k: meta.get(k) for k in ENTRY_FIELDS})
+        entries.append(entry)
+        offset += len(data)
+
+    header = json.dumps({
+        "settings": settings,
+        "node": node,
+        "created": time.time(),
+        "entries": entries
+    }, ensure_ascii=False).encode('utf-8')
+    header += b' ' * (-len(header) % 8)
+
+    # Ghi ra file tạm rồi đổi tên: file đang được máy khác đọc không bị hỏng giữa chừng
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(FINGERPRINT_MAGIC + struct.pack('<IQ', FINGERPRINT_VERSION, len(header)))
+        f.write(header)
+        for _, _, data in records:
+            f.write(np.ascontiguousarray(data, dtype='<u8').tobytes())
+    os.replace(tmp_path, out_path)
+    return len(entries)
+
+class FingerprintFile:
+    """Đọc file fingerprint đã export. File sai định dạng/phiên bản -> ValueError"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            head = f.read(16)
+            if len(head) < 16 or head[:4] != FINGERPRINT_MAGIC:
+                raise ValueError("not a fingerprint file")
+            version, length = struct.unpack('<IQ', head[4:])
+            if version != FINGERPRINT_VERSION:
+                raise ValueError(f"unsupported fingerprint file version {version}")
+            header = json.loads(f.read(length).decode('utf-8'))
+
+        self.settings = header['settings']
+        self.node = header.get('node')
+        self.created = header.get('created', 0)
+        self.entries = header['entries']
+        total = sum(e['count'] + (e.get('audio_count') or 0) for e in self.entries)
+        if total:
+            self.data = np.memmap(path, dtype='<u8', mode='r', offset=16 + length, shape=(total,))
+        else:
+            self.data = np.zeros(0, dtype='<u8')
+
+    def __len__(self):
+        return len(self.entries)
+
+    def raw(self, i):
+        """Dữ liệu [hình][audio] của file thứ i"""
+        entry = self.entries[i]
+        start = entry['offset']
+        return self.data[start:start + entry['count'] + (entry.get('audio_count') or 0)]
+
+    def video(self, i):
+        """File thứ i dưới dạng video đã quét (giống kết quả của PHASE 1)"""
+        entry = self.entries[i]
+        hashes, audio = split_entry(self.raw(i), entry)
+        video = {
+            "path": entry['path'],
+            "filename": os.path.basename(entry['path'].replace('\\', '/')),
+            "duration": entry['duration'],
+            "hashes": hashes,
+            "audio": audio
+        }
+        if entry.get('media'):
+            video['media'] = entry['media']
+        return video
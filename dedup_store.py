@@ -0,0 +1,395 @@
+import os
+import json
+
+import numpy as np
+
+from dedup_hash import hashes_to_hex, hashes_from_hex, RunLengthHashes
+
+# ==========================================
+# FINGERPRINT INDEX (Lưu kết quả quét ra đĩa)
+# ==========================================
+# Cấu trúc thư mục index:
+#   catalog.json    : metadata từng file (size, mtime, thời lượng, vị trí hash trong shard)
+#                     + thông tin container đã probe (codec, độ phân giải, bitrate)
+#   shard_NNNN.u64  : hash uint64 (little-endian) của nhiều video nối liền nhau
+#                     (mỗi video: hash hình rồi tới hash audio nếu có; fingerprint theo cảnh
+#                     lưu hash các keyframe rồi tới frame bắt đầu của từng keyframe)
+#   journal.jsonl   : nhật ký ghi nối từng file vừa quét xong (hoặc bị bỏ qua) kể từ lần save()
+#                     gần nhất. App bị tắt giữa chừng -> lần chạy sau đọc lại journal và quét tiếp.
+# Hash được đọc qua memmap nên không cần giữ toàn bộ fingerprint trong RAM:
+# hệ điều hành chỉ nạp những trang đang được so sánh.
+
+# Tăng số này khi định dạng index thay đổi
+INDEX_VERSION = 4
+CATALOG_FILE = "catalog.json"
+JOURNAL_FILE = "journal.jsonl"
+SHARD_MAX_BYTES = 256 * 1024 * 1024
+
+def split_entry(data, meta):
+    """(hash hình, hash audio hoặc None) từ dữ liệu liền nhau [hình][audio] của 1 file"""
+    visual = data[:meta['count']]
+    if meta.get('frames') is not None:
+        # Fingerprint theo cảnh: [hash đại diện..., frame bắt đầu...]
+        keys = meta['count'] // 2
+        visual = RunLengthHashes(visual[:keys], visual[keys:].astype(np.uint32), meta['frames'])
+    if meta.get('audio_count') is None:
+        return visual, None
+    return visual, data[meta['count']:meta['count'] + meta['audio_count']]
+
+class FingerprintIndex:
+    """Index fingerprint trên đĩa, khóa theo đường dẫn + kích thước + mtime.
+
+    Toàn bộ index bị bỏ khi tham số hash (fps, size, thuật toán) thay đổi.
+    """
+
+    def __init__(self, index_dir, settings):
+        self.index_dir = index_dir
+        self.settings = settings
+        self.entries = {}     # path -> {size, mtime, duration, shard, offset, count, audio_count, frames}
+        self.pending = {}     # path -> hash (hình + audio) chưa ghi xuống shard
+        self.skipped = {}     # path -> {size, mtime, reason}: file làm ffmpeg treo / quá giới hạn
+        self.media = {}       # path -> {size, mtime, info}: thông tin container (lọc remux không cần decode)
+        self.journal = None
+        self.next_shard = 0
+        self.current_shard = None   # Shard đang được ghi thêm (None = tạo shard mới)
+        self.maps = {}
+        self.dirty = False
+
+    # --- Đọc / ghi catalog ---
+    def _shard_path(self, shard):
+        return os.path.join(self.index_dir, f"shard_{shard:04d}.u64")
+
+    def _shard_files(self):
+        try:
+            names = os.listdir(self.index_dir)
+        except OSError:
+            return []
+        return [n for n in names if n.startswith('shard_') and n.endswith('.u64')]
+
+    def load(self):
+        try:
+            with open(os.path.join(self.index_dir, CATALOG_FILE), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+
+        # Tham số hash đã đổi -> hash cũ không so sánh được với hash mới
+        if not data or data.get('version') != INDEX_VERSION or data.get('settings') != self.settings:
+            for name in self._shard_files():
+                try:
+                    os.remove(os.path.join(self.index_dir, name))
+                except OSError:
+                    pass
+            self.dirty = data is not None
+        else:
+            self.entries = data.get('entries', {})
+            self.skipped = data.get('skipped', {})
+            self.media = data.get('media', {})
+            self.next_shard = data.get('next_shard', 0)
+            self.current_shard = self.next_shard - 1 if self.next_shard else None
+
+        self._replay_journal()
+
+    # --- Journal (khôi phục lần quét bị ngắt giữa chừng) ---
+    def _journal_path(self):
+        return os.path.join(self.index_dir, JOURNAL_FILE)
+
+    def _replay_journal(self):
+        try:
+            f = open(self._journal_path(), 'r', encoding='utf-8')
+        except OSError:
+            return
+        stale = False
+        with f:
+            header = None
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Dòng cuối bị cắt ngang khi app bị tắt
+                    break
+                if header is None:
+                    header = record
+                    stale = header.get('version') != INDEX_VERSION or header.get('settings') != self.settings
+                    if stale:
+                        break
+                    continue
+                key = record['path']
+                if 'reason' in record:
+                    self.skipped[key] = {"size": record['size'], "mtime": record['mtime'], "reason": record['reason']}
+                    self.dirty = True
+                    continue
+                audio = hashes_from_hex(record['audio']) if record.get('audio') is not None else None
+                self._put(key, record['size'], record['mtime'], record['duration'],
+                          hashes_from_hex(record['hashes']), audio, record.get('frames'))
+        # Entry đọc lại chỉ nằm trong RAM tới lần save() -> giữ journal, chỉ bỏ journal của tham số hash cũ
+        if stale:
+            try:
+                os.remove(self._journal_path())
+            except OSError:
+                pass
+
+    def _log(self, record):
+        """Ghi nối 1 dòng vào journal (flush ngay để không mất khi app bị tắt)"""
+        try:
+            if self.journal is None:
+                os.makedirs(self.index_dir, exist_ok=True)
+                # Journal mới chứa mọi thứ chưa save (kể cả entry đọc lại từ journal cũ và `record`).
+                # Ghi ra file tạm rồi đổi tên: bị tắt giữa chừng thì journal cũ vẫn còn nguyên
+                tmp_path = self._journal_path() + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(json.dumps({"version": INDEX_VERSION, "settings": self.settings}) + '\n')
+                    for key, data in self.pending.items():
+                        f.write(json.dumps(self._journal_record(key, data)) + '\n')
+                    for key, meta in self.skipped.items():
+                        f.write(json.dumps({"path": key, **meta}) + '\n')
+                os.replace(tmp_path, self._journal_path())
+                self.journal = open(self._journal_path(), 'a', encoding='utf-8')
+            else:
+                self.journal.write(json.dumps(record) + '\n')
+            self.journal.flush()
+        except OSError:
+            pass
+
+    def _journal_record(self, key, data):
+        meta = self.entries[key]
+        count = meta['count']
+        audio = data[count:] if meta.get('audio_count') is not None else None
+        return {
+            "path": key, "size": meta['size'], "mtime": meta['mtime'], "duration": meta['duration'],
+            "hashes": hashes_to_hex(data[:count]),
+            "audio": hashes_to_hex(audio) if audio is not None else None,
+            "frames": meta.get('frames')
+        }
+
+    def _close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def _write_catalog(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        # Ghi ra file tạm rồi đổi tên để không làm hỏng index nếu bị tắt giữa chừng
+        catalog_path = os.path.join(self.index_dir, CATALOG_FILE)
+        tmp_path = catalog_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "settings": self.settings,
+                "next_shard": self.next_shard,
+                "entries": self.entries,
+                "skipped": self.skipped,
+                "media": self.media
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, catalog_path)
+
+    # --- Truy cập hash ---
+    def _map(self, shard):
+        if shard not in self.maps:
+            self.maps[shard] = np.memmap(self._shard_path(shard), dtype='<u8', mode='r')
+        return self.maps[shard]
+
+    def _data(self, key):
+        if key in self.pending:
+            return self.pending[key]
+        meta = self.entries[key]
+        total = meta['count'] + (meta.get('audio_count') or 0)
+        return self._map(meta['shard'])[meta['offset']:meta['offset'] + total]
+
+    def hashes(self, file_path):
+        key = os.path.abspath(file_path)
+        return split_entry(self._data(key), self.entries[key])[0]
+
+    def audio(self, file_path):
+        """Hash audio, None nếu file được quét khi tắt kênh audio"""
+        key = os.path.abspath(file_path)
+        return split_entry(self._data(key), self.entries[key])[1]
+
+    def get(self, file_path, stat):
+        """Trả về {duration, hashes, audio} nếu file chưa bị sửa kể từ lần quét trước"""
+        key = os.path.abspath(file_path)
+        meta = self.entries.get(key)
+        if not meta or meta['size'] != stat.st_size or meta['mtime'] != stat.st_mtime_ns:
+            return None
+        try:
+            return {"duration": meta['duration'], "hashes": self.hashes(key), "audio": self.audio(key)}
+        except (OSError, ValueError):
+            # Shard bị thiếu/hỏng -> coi như chưa quét
+            return None
+
+    def put(self, file_path, stat, duration, hashes, audio=None):
+        key = os.path.abspath(file_path)
+        self._put(key, stat.st_size, stat.st_mtime_ns, duration, hashes, audio)
+        self.skipped.pop(key, None)
+        self._log(self._journal_record(key, self.pending[key]))
+
+    def _put(self, key, size, mtime, duration, hashes, audio, frames=None):
+        if isinstance(hashes, RunLengthHashes):
+            frames = hashes.count
+            hashes = np.concatenate([hashes.values, hashes.starts.astype(np.uint64)])
+        self.entries[key] = {
+            "size": size,
+            "mtime": mtime,
+            "duration": duration,
+            "shard": None,
+            "offset": 0,
+            "count": len(hashes),
+            "audio_count": None if audio is None else len(audio),
+            "frames": frames
+        }
+        data = hashes if audio is None else np.concatenate([hashes, audio])
+        self.pending[key] = np.ascontiguousarray(data, dtype='<u8')
+        self.dirty = True
+
+    def skip(self, file_path, stat, reason):
+        """Ghi nhận file bị bỏ qua (ffmpeg treo / quá giới hạn) để lần sau không quét lại"""
+        key = os.path.abspath(file_path)
+        self.skipped[key] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "reason": reason}
+        self.dirty = True
+        self._log({"path": key, **self.skipped[key]})
+
+    def skip_reason(self, file_path, stat):
+        """Lý do bỏ qua nếu file chưa bị sửa kể từ lần bị bỏ qua, ngược lại None"""
+        meta = self.skipped.get(os.path.abspath(file_path))
+        if not meta or meta['size'] != stat.st_size or meta['mtime'] != stat.st_mtime_ns:
+            return None
+        return meta['reason']
+
+    def clear_skipped(self):
+        if self.skipped:
+            self.skipped = {}
+            self.dirty = True
+
+    def media_info(self, file_path, stat):
+        """Thông tin container đã probe nếu file chưa bị sửa, ngược lại None"""
+        meta = self.media.get(os.path.abspath(file_path))
+        if not meta or meta['size'] != stat.st_size or meta['mtime'] != stat.st_mtime_ns:
+            return None
+        return meta['info']
+
+    def put_media(self, file_path, stat, info):
+        # Không ghi journal: probe lại rất rẻ nếu bị mất
+        self.media[os.path.abspath(file_path)] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "info": info}
+        self.dirty = True
+
+    def discard(self, file_path):
+        key = os.path.abspath(file_path)
+        self.pending.pop(key, None)
+        self.media.pop(key, None)
+        if self.entries.pop(key, None) is not None:
+            self.dirty = True
+
+    def prune(self):
+        """Xóa entry của các file không còn tồn tại"""
+        missing = [p for p in self.entries if not os.path.isfile(p)]
+        for p in missing:
+            self.discard(p)
+        gone = [p for p in self.skipped if not os.path.isfile(p)]
+        for p in gone:
+            del self.skipped[p]
+            self.dirty = True
+        for p in [p for p in self.media if not os.path.isfile(p)]:
+            del self.media[p]
+            self.dirty = True
+        return len(missing)
+
+    # --- Export / import (file fingerprint di động, xem dedup_portable.py) ---
+    def records(self):
+        """(path, metadata, dữ liệu [hình][audio]) của mọi file trong index"""
+        for key, meta in self.entries.items():
+            info = dict(meta)
+            media = self.media.get(key)
+            if media and media['size'] == meta['size'] and media['mtime'] == meta['mtime']:
+                info['media'] = media['info']
+            yield key, info, self._data(key)
+
+    def merge(self, file_path, stat, meta, data):
+        """Thêm fingerprint quét ở máy khác cho file cục bộ `file_path` (stat của file cục bộ).
+
+        Không ghi đè entry đang dùng được. Trả về True nếu đã thêm.
+        """
+        key = os.path.abspath(file_path)
+        if self.get(key, stat) is not None:
+            return False
+        count = meta['count']
+        audio = None if meta.get('audio_count') is None else data[count:count + meta['audio_count']]
+        self._put(key, stat.st_size, stat.st_mtime_ns, meta['duration'], np.asarray(data[:count]), audio,
+                  meta.get('frames'))
+        self.skipped.pop(key, None)
+        if meta.get('media'):
+            self.put_media(key, stat, meta['media'])
+        return True
+
+    # --- Ghi xuống đĩa ---
+    def _append(self, key, hashes):
+        shard = self.current_shard
+        size = 0
+        if shard is not None:
+            path = self._shard_path(shard)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+        if shard is None or size + hashes.nbytes > SHARD_MAX_BYTES:
+            shard = self.current_shard = self.next_shard
+            self.next_shard += 1
+            path = self._shard_path(shard)
+            size = 0
+
+        with open(path, 'ab') as f:
+            f.write(hashes.tobytes())
+        # memmap cũ chỉ thấy kích thước file lúc mở
+        self.maps.pop(shard, None)
+        meta = self.entries[key]
+        meta['shard'] = shard
+        meta['offset'] = size // 8
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(self.index_dir, exist_ok=True)
+        for key, hashes in self.pending.items():
+            if key in self.entries:
+                self._append(key, hashes)
+        self.pending = {}
+        self._write_catalog()
+        self.dirty = False
+        # Mọi thứ trong journal đã nằm trong shard + catalog
+        self._close_journal()
+        try:
+            os.remove(self._journal_path())
+        except OSError:
+            pass
+
+    def compact(self):
+        """Viết lại shard khi phần lớn dữ liệu thuộc về file đã xóa.
+
+        Chỉ gọi ngay sau load()/prune(), trước khi có memmap nào được mở.
+        """
+        live = sum(m['count'] + (m.get('audio_count') or 0) for m in self.entries.values() if m['shard'] is not None)
+        total = 0
+        for name in self._shard_files():
+            try:
+                total += os.path.getsize(os.path.join(self.index_dir, name)) // 8
+            except OSError:
+                pass
+        if total <= 2 * live:
+            return False
+
+        old_files = self._shard_files()
+        old_entries = {k: dict(m) for k, m in self.entries.items() if m['shard'] is not None}
+        # Shard mới luôn có số thứ tự lớn hơn shard cũ nên không bị ghi đè
+        self.next_shard = max([self.next_shard] + [int(n[6:10]) + 1 for n in old_files])
+        self.current_shard = None
+        first_new = self.next_shard
+        for key, meta in old_entries.items():
+            data = np.fromfile(self._shard_path(meta['shard']), dtype='<u8',
+                               count=meta['count'] + (meta.get('audio_count') or 0), offset=meta['offset'] * 8)
+            self._append(key, data)
+        self.maps = {}
+        self._write_catalog()
+
+        for name in old_files:
+            if int(name[6:10]) < first_new:
+                try:
+                    os.remove(os.path.join(self.index_dir, name))
+                except OSError:
+                    pass
+        return True
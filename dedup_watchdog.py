@@ -0,0 +1,61 @@
+import subprocess
+import threading
+
+# ==========================================
+# WATCHDOG CHO TIẾN TRÌNH FFMPEG
+# ==========================================
+# File hỏng có thể làm ffmpeg treo (hoặc xuất frame mãi không dừng), khiến vòng đọc pipe
+# bị chặn vô thời hạn. Watchdog giết ffmpeg khi quá thời gian cho phép, vòng đọc nhận EOF
+# và thoát; file đó được ghi nhận là bị bỏ qua thay vì làm treo cả lần quét.
+
+class DecodeBudgetExceeded(Exception):
+    """File vượt quá thời gian / dung lượng cho phép khi decode"""
+
+def stop_process(process, grace=5):
+    """Dừng tiến trình con và chờ nó thoát hẳn (không để lại process zombie)"""
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    for stream in (process.stdout, process.stderr):
+        if stream:
+            stream.close()
+
+class DecodeWatchdog:
+    """with DecodeWatchdog(process, seconds) as dog: ... -> giết process nếu quá `seconds` giây.
+
+    seconds <= 0 hoặc None: không giới hạn. Khi thoát khối with, process luôn được dừng và thu hồi.
+    """
+
+    def __init__(self, process, seconds):
+        self.process = process
+        self.seconds = seconds
+        self.expired = False
+        self._timer = None
+
+    def _expire(self):
+        self.expired = True
+        try:
+            self.process.kill()
+        except OSError:
+            pass
+
+    def __enter__(self):
+        if self.seconds and self.seconds > 0:
+            self._timer = threading.Timer(self.seconds, self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._timer:
+            self._timer.cancel()
+        stop_process(self.process)
+        return False
+
+    def check(self):
+        if self.expired:
+            raise DecodeBudgetExceeded(f"decode timed out after {self.seconds:.0f}s")
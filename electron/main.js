@@ -524,7 +524,8 @@ ipcMain.handle('backend:stopAnalyzeSync', () => {
 
 ipcMain.handle('backend:analyzeSync', async (e, { videoPath, audioPath, srtPath }) => {
     try {
-        const tempId = Date.now();
+        // Thư mục làm việc cố định theo file audio: chạy lại sau khi sửa SRT chỉ cắt lại các dòng bị đổi
+        const tempId = crypto.createHash('md5').update(path.resolve(audioPath)).digest('hex').slice(0, 12);
         const tempDir = path.join(app.getPath('userData'), `sync_temp_${tempId}`);
         ensureDir(tempDir);
 
@@ -539,7 +540,8 @@ ipcMain.handle('backend:analyzeSync', async (e, { videoPath, audioPath, srtPath
             const pythonEnv = { ...process.env, PYTHONIOENCODING: 'utf-8' };
 
             // Gọi Python: script video audio srt temp_dir ffmpeg_path
-            syncProcess = spawn('python', ['-u', scriptPath, videoPath, audioPath, srtPath, tempDir, ffmpegPath], { env: pythonEnv });
+            // --segments=virtual: không ghi từng file audio_NNN.wav, trả về 1 file PCM + vị trí từng đoạn
+            syncProcess = spawn('python', ['-u', scriptPath, videoPath, audioPath, srtPath, tempDir, ffmpegPath, '--segments=virtual'], { env: pythonEnv });
 
             syncProcess.stdout.on('data', (data) => {
                 const lines = data.toString().split('\n');
@@ -668,6 +670,20 @@ const getEncoderConfig = (encoderName) => {
     }
 };
 
+// Helper: Tham số input FFmpeg cho giọng đọc của 1 dòng
+// - Có file_path (--segments=files): đọc file WAV riêng của dòng đó
+// - Không có (--segments=virtual): đọc thẳng vùng byte của dòng trong file PCM chung (subfile, không chép dữ liệu)
+const voiceInputArgs = (ref, pcmSource) => {
+    if (ref.file_path || !pcmSource) return ['-i', ref.file_path];
+    const frameSize = pcmSource.channels * 2;
+    const start = pcmSource.data_offset + ref.sample_offset * frameSize;
+    const end = start + ref.sample_count * frameSize;
+    return [
+        '-f', pcmSource.sample_format, '-ar', String(pcmSource.sample_rate), '-ac', String(pcmSource.channels),
+        '-i', `subfile,,start,${start},end,${end},,:${pcmSource.path}`
+    ];
+};
+
 // 1. BUILD GAP SEGMENT
 const buildGapSegment = async (inputVideo, segIndex, segStart, segEnd, workDir, bgVolume, hasAudioStream, encoderName) => {
     const segDuration = Math.max(0.0, segEnd - segStart);
@@ -708,7 +724,7 @@ const buildGapSegment = async (inputVideo, segIndex, segStart, segEnd, workDir,
 };
 
 // 2. BUILD LINE SEGMENT
-const buildLineSegment = async (inputVideo, segIndex, segStart, segEnd, voicePath, voiceDuration, workDir, bgVolume, syncSpeed, hasAudioStream, encoderName) => {
+const buildLineSegment = async (inputVideo, segIndex, segStart, segEnd, voiceInput, voiceDuration, workDir, bgVolume, syncSpeed, hasAudioStream, encoderName) => {
     const segDuration = Math.max(0.0, segEnd - segStart);
     if (segDuration < 0.1 || voiceDuration < 0.1) {
         return buildGapSegment(inputVideo, segIndex, segStart, segEnd, workDir, bgVolume, hasAudioStream, encoderName);
@@ -751,7 +767,7 @@ const buildLineSegment = async (inputVideo, segIndex, segStart, segEnd, voicePat
         ...hw_dec, // Thêm cờ giải mã phần cứng
         '-ss', `${segStart.toFixed(6)}`, '-to', `${segEnd.toFixed(6)}`,
         '-i', inputVideo,
-        '-i', voicePath,
+        ...voiceInput,
         '-filter_complex', filterComplex,
         '-map', '[vout]', '-map', '[aout]',
         ...codec, // Thêm cờ mã hóa phần cứng
@@ -771,7 +787,7 @@ ipcMain.handle('backend:stopRenderSync', () => { renderProcessStop = true; retur
 ipcMain.handle('backend:renderSync', async (e, { inputs, config, analysisData }) => {
     renderProcessStop = false;
     const { videoPath, outputPath } = inputs;
-    const { audio_segments, tempDir } = analysisData; 
+    const { audio_segments, tempDir, pcm_source } = analysisData; 
     const { bgVolume, syncSpeed, encoder } = config;
 
     const encoderName = encoder || 'libx264';
@@ -846,7 +862,7 @@ ipcMain.handle('backend:renderSync', async (e, { inputs, config, analysisData })
                         i, 
                         item.start, 
                         item.end, 
-                        item.ref.file_path, 
+                        voiceInputArgs(item.ref, pcm_source), 
                         item.ref.duration, 
                         renderDir, 
                         bgVolume, 
@@ -878,7 +894,12 @@ ipcMain.handle('backend:renderSync', async (e, { inputs, config, analysisData })
         ]);
 
         if(mainWindow) mainWindow.webContents.send('render-progress', { percent: 100, step: "Done!" });
-        removeDir(tempDir);
+        // Chỉ giữ sync_state.json (lần sync sau chỉ cắt lại các dòng bị sửa). Bản PCM trong tempDir là
+        // hard link vào cache PCM: giữ lại thì cache dọn LRU cũng không giải phóng được ổ đĩa.
+        // Lần sync sau lấy lại bản decode từ cache
+        for (const name of fs.readdirSync(tempDir)) {
+            if (name !== 'sync_state.json') fs.rmSync(path.join(tempDir, name), { recursive: true, force: true });
+        }
 
         return { success: true, message: "Done! Saved to: " + path.basename(outputPath) };
 
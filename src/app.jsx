@@ -634,7 +634,7 @@ const SyncVideoTab = () => {
                         <div className="flex items-center gap-2 mb-4 border-b border-gray-700 pb-2"><FileVideo className="text-orange-500" size={20} /><h3 className="font-bold text-gray-200">Source Files</h3></div>
                         <PathInput label="Original Video" placeholder="Select video..." value={inputs.videoPath} onChange={(v) => handleSetInput('videoPath', v)} isFile={true} filters={[{ name: 'Video', extensions: ['mp4', 'mov', 'mkv', 'avi'] }]} />
                         <PathInput label="Voiceover Audio" placeholder="Select audio..." value={inputs.audioPath} onChange={(v) => handleSetInput('audioPath', v)} isFile={true} filters={[{ name: 'Audio', extensions: ['mp3', 'wav', 'm4a'] }]} />
-                        <PathInput label="Subtitle (SRT)" placeholder="Select .srt..." value={inputs.srtPath} onChange={(v) => handleSetInput('srtPath', v)} isFile={true} filters={[{ name: 'Subtitle', extensions: ['srt'] }]} />
+                        <PathInput label="Subtitle (SRT)" placeholder="Select .srt..." value={inputs.srtPath} onChange={(v) => handleSetInput('srtPath', v)} isFile={true} filters={[{ name: 'Subtitle', extensions: ['srt', 'vtt', 'ass', 'ssa'] }]} />
                     </div>
 
                     <div className="bg-[#1e222b] p-5 rounded border border-gray-700 shadow-lg">
@@ -920,7 +920,7 @@ const TTSTab = () => {
 
                 <div className="bg-[#1e222b] p-4 rounded border border-gray-700 shadow-md">
                     <h3 className="text-blue-400 font-bold text-sm mb-4 uppercase flex items-center gap-2"><Folder size={16}/> File & Output</h3>
-                    <PathInput label="Nội dung (.txt hoặc .srt)" value={config.inputPath} onChange={v => setConfig({...config, inputPath: v})} isFile={true} filters={[{name: 'Text/Sub', extensions:['txt', 'srt']}]} />
+                    <PathInput label="Nội dung (.txt hoặc .srt)" value={config.inputPath} onChange={v => setConfig({...config, inputPath: v})} isFile={true} filters={[{name: 'Text/Sub', extensions:['txt', 'srt', 'vtt', 'ass', 'ssa']}]} />
                     <PathInput label="Thư mục lưu kết quả" value={config.outputFolder} onChange={v => setConfig({...config, outputFolder: v})} />
                     
                     <div className="mt-3">
@@ -1226,7 +1226,7 @@ const JPVoiceTab = () => {
 
                 <div className="bg-[#1e222b] p-4 rounded border border-gray-700 shadow-md">
                     <h3 className="text-blue-400 font-bold text-sm mb-4 uppercase flex items-center gap-2"><Folder size={16}/> File & Output</h3>
-                    <PathInput label="Nội dung (.txt hoặc .srt)" value={config.inputPath} onChange={v => setConfig({...config, inputPath: v})} isFile={true} filters={[{name: 'Text/Sub', extensions:['txt', 'srt']}]} />
+                    <PathInput label="Nội dung (.txt hoặc .srt)" value={config.inputPath} onChange={v => setConfig({...config, inputPath: v})} isFile={true} filters={[{name: 'Text/Sub', extensions:['txt', 'srt', 'vtt', 'ass', 'ssa']}]} />
                     <PathInput label="Thư mục lưu kết quả" value={config.outputFolder} onChange={v => setConfig({...config, outputFolder: v})} />
                     
                     <div className="mt-3">
@@ -1403,7 +1403,7 @@ const FSpeechTab = () => {
                 </div>
                 <div className="bg-[#1e222b] p-4 rounded border border-gray-700 shadow-md">
                     <h3 className="text-blue-400 font-bold text-sm mb-4 uppercase flex items-center gap-2"><Folder size={16}/> File & Output</h3>
-                    <PathInput label="Input Content (.txt or .srt)" value={config.inputPath} onChange={v => setConfig({...config, inputPath: v})} isFile={true} filters={[{name: 'Text/Sub', extensions:['txt', 'srt']}]} />
+                    <PathInput label="Input Content (.txt or .srt)" value={config.inputPath} onChange={v => setConfig({...config, inputPath: v})} isFile={true} filters={[{name: 'Text/Sub', extensions:['txt', 'srt', 'vtt', 'ass', 'ssa']}]} />
                     <PathInput label="Output Folder" value={config.outputFolder} onChange={v => setConfig({...config, outputFolder: v})} />
                     <div className="mt-3">
                         <label className="block text-gray-500 text-[10px] font-bold mb-1 uppercase font-mono">Output Filename (Optional):</label>
@@ -0,0 +1,120 @@
+import sys
+import os
+import re
+import time
+import random
+import tracemalloc
+
+from sync_engine import parse_options
+from subtitle_parser import parse_subtitles
+
+# ==========================================
+# BENCHMARK ĐỌC PHỤ ĐỀ
+# Cách dùng: python subtitle_bench.py [--cues=100000] [--out=bench_subs] [--seed=1]
+# Sinh file SRT (LF, CRLF, CRLF + khoảng trắng thừa), VTT, ASS cùng nội dung rồi so sánh subtitle_parser
+# với regex cũ của sync_engine và pysrt (nếu có cài): thời gian, bộ nhớ đỉnh, số dòng thoại đọc được.
+# ==========================================
+
+WORDS = "the quick brown fox jumps over lazy dog xin chào thế giới こんにちは 世界".split()
+
+def legacy_parse_srt(srt_path):
+    """parse_srt cũ của sync_engine (đọc cả file + 1 regex giả định xuống dòng '\\n')"""
+    segments = []
+    with open(srt_path, 'r', encoding='utf-8-sig') as f:
+        content = f.read()
+    pattern = re.compile(r'(\d+)\n(\d{2}:\d{2}:\d{2}[,.]\d{3}) --> (\d{2}:\d{2}:\d{2}[,.]\d{3})\n((?:(?!\n\n).)*)', re.DOTALL)
+    for idx, start_str, end_str, text in pattern.findall(content):
+        segments.append({"id": idx, "start": start_str, "end": end_str, "text": text.replace('\n', ' ').strip()})
+    return segments
+
+def pysrt_parse(path):
+    import pysrt
+    return list(pysrt.open(path, encoding='utf-8'))
+
+def timestamp(ms, sep=',', hour_digits=2):
+    h, ms = divmod(ms, 3600000)
+    m, ms = divmod(ms, 60000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:0{hour_digits}d}:{m:02d}:{s:02d}{sep}{ms:03d}"
+
+def synthetic_cues(count, seed=1):
+    rng = random.Random(seed)
+    cues, t = [], 0
+    for _ in range(count):
+        t += rng.randint(100, 1500)
+        length = rng.randint(700, 4000)
+        lines = [' '.join(rng.choices(WORDS, k=rng.randint(3, 9))) for _ in range(rng.randint(1, 2))]
+        cues.append((t, t + length, lines))
+        t += length
+    return cues
+
+def write_files(cues, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+
+    srt = ''.join(f"{i}\n{timestamp(a)} --> {timestamp(b)}\n" + '\n'.join(lines) + "\n\n"
+                  for i, (a, b, lines) in enumerate(cues, 1))
+    for name, newline in (('srt', '\n'), ('srt-crlf', '\r\n')):
+        paths[name] = os.path.join(out_dir, f"{name}.srt")
+        with open(paths[name], 'w', encoding='utf-8', newline=newline) as f:
+            f.write(srt)
+
+    # File soạn tay trên Windows: CRLF, khoảng trắng thừa cuối dòng, dòng "trống" chứa dấu cách
+    messy = ''.join(f"{i} \n{timestamp(a)} --> {timestamp(b)} \n" + '\n'.join(lines) + "\n \n"
+                    for i, (a, b, lines) in enumerate(cues, 1))
+    paths['messy'] = os.path.join(out_dir, "messy.srt")
+    with open(paths['messy'], 'w', encoding='utf-8-sig', newline='\r\n') as f:
+        f.write(messy)
+
+    paths['vtt'] = os.path.join(out_dir, "vtt.vtt")
+    with open(paths['vtt'], 'w', encoding='utf-8') as f:
+        f.write("WEBVTT\n\n")
+        for a, b, lines in cues:
+            f.write(f"{timestamp(a, '.')} --> {timestamp(b, '.')}\n" + '\n'.join(lines) + "\n\n")
+
+    paths['ass'] = os.path.join(out_dir, "ass.ass")
+    with open(paths['ass'], 'w', encoding='utf-8') as f:
+        f.write("[Script Info]\nScriptType: v4.00+\n\n[Events]\n"
+                "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n")
+        for a, b, lines in cues:
+            f.write(f"Dialogue: 0,{timestamp(a, '.', 1)[:-1]},{timestamp(b, '.', 1)[:-1]},Default,,0,0,0,,"
+                    + '\\N'.join(lines) + "\n")
+    return paths
+
+def measure(parse, path):
+    """(số cue, thời gian, bộ nhớ đỉnh MB). Đo thời gian riêng vì tracemalloc làm chậm đi nhiều lần"""
+    try:
+        t0 = time.perf_counter()
+        count = len(parse(path))
+        elapsed = time.perf_counter() - t0
+    except ImportError:
+        return None, 0, 0
+    tracemalloc.start()
+    parse(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak / 1e6
+
+def main():
+    _, options = parse_options(sys.argv[1:])
+    count = int(options.get('cues', 100000))
+    out_dir = options.get('out', 'bench_subs')
+    cues = synthetic_cues(count, int(options.get('seed', 1)))
+    paths = write_files(cues, out_dir)
+
+    parsers = [
+        ("subtitle_parser", parse_subtitles, ('srt', 'srt-crlf', 'messy', 'vtt', 'ass')),
+        ("legacy regex", legacy_parse_srt, ('srt', 'srt-crlf', 'messy')),
+        ("pysrt", pysrt_parse, ('srt', 'srt-crlf', 'messy')),
+    ]
+    print(f"{count} cues, srt {os.path.getsize(paths['srt']) / 1e6:.1f} MB")
+    for name, parse, formats in parsers:
+        for fmt in formats:
+            found, elapsed, peak = measure(parse, paths[fmt])
+            if found is None:
+                print(f"{name:16s} {fmt:9s}: not installed")
+                break
+            print(f"{name:16s} {fmt:9s}: {elapsed:7.3f}s  peak {peak:7.1f} MB  {found}/{count} cues")
+
+if __name__ == "__main__":
+    main()
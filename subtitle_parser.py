@@ -0,0 +1,168 @@
+import os
+import re
+import html
+from itertools import chain
+from collections import namedtuple
+
+# ==========================================
+# ĐỌC PHỤ ĐỀ (SRT / VTT / ASS) - dùng chung cho sync_engine và tts_engine
+# ==========================================
+# - Đọc từng dòng (streaming), 1 lượt duy nhất: file 100k dòng thoại cũng không phải nạp hết vào RAM
+#   rồi chạy regex trên cả khối.
+# - Chịu được CRLF / CR, BOM (UTF-8 và UTF-16), thiếu dòng trống giữa 2 block, block hỏng
+#   (thiếu hoặc sai dòng thời gian -> bỏ qua block đó, không làm hỏng các block sau).
+# - Mỗi dòng thoại là 1 Cue gọn nhẹ: index (int), start / end (mili giây, int), text (các dòng nối bằng '\n').
+
+Cue = namedtuple('Cue', 'index start end text')
+
+SUBTITLE_EXTENSIONS = ('.srt', '.vtt', '.ass', '.ssa')
+
+# H:MM:SS,mmm (SRT), [HH:]MM:SS.mmm (VTT), H:MM:SS.cc (ASS). Phần lẻ 1-3 chữ số, tính theo phần nghìn
+TIME_PATTERN = r'(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[,.](\d{1,3}))?'
+TIMING_RE = re.compile(r'\s*' + TIME_PATTERN + r'\s*-->\s*' + TIME_PATTERN)
+TIME_RE = re.compile(r'\s*' + TIME_PATTERN + r'\s*$')
+
+VTT_TAG_RE = re.compile(r'<[^>]*>')
+ASS_OVERRIDE_RE = re.compile(r'\{[^}]*\}')
+ASS_DEFAULT_FORMAT = ['layer', 'start', 'end', 'style', 'name', 'marginl', 'marginr', 'marginv', 'effect', 'text']
+
+def is_subtitle_file(path):
+    return os.path.splitext(str(path))[1].lower() in SUBTITLE_EXTENSIONS
+
+def _ms(hours, minutes, seconds, fraction):
+    total = (int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)) * 1000
+    return total + (int(fraction.ljust(3, '0')) if fraction else 0)
+
+def _fixed_timing(s):
+    """Đường nhanh cho dạng chuẩn 'HH:MM:SS,mmm --> HH:MM:SS,mmm' (cắt chuỗi, không regex). Khác -> None"""
+    if (len(s) < 29 or s[12:17] != ' --> ' or s[2] != ':' or s[5] != ':' or s[19] != ':' or s[22] != ':'
+            or s[8] not in ',.' or s[25] not in ',.' or (len(s) > 29 and not s[29].isspace())):
+        return None
+    try:
+        return (int(s[0:2]) * 3600000 + int(s[3:5]) * 60000 + int(s[6:8]) * 1000 + int(s[9:12]),
+                int(s[17:19]) * 3600000 + int(s[20:22]) * 60000 + int(s[23:25]) * 1000 + int(s[26:29]))
+    except ValueError:
+        return None
+
+def parse_time(text):
+    """'00:01:02,500' / '01:02.5' / '0:01:02.50' -> mili giây. Sai định dạng -> None"""
+    m = TIME_RE.match(text)
+    return _ms(*m.groups()) if m else None
+
+def _open_text(path):
+    """Mở file phụ đề dạng text, tự nhận BOM UTF-16 / UTF-8 (CRLF được chuyển về '\n')"""
+    with open(path, 'rb') as f:
+        head = f.read(2)
+    encoding = 'utf-16' if head in (b'\xff\xfe', b'\xfe\xff') else 'utf-8-sig'
+    return open(path, 'r', encoding=encoding, errors='replace')
+
+def _detect_format(path, first_line):
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext == '.vtt':
+        return 'vtt'
+    if ext in ('.ass', '.ssa'):
+        return 'ass'
+    stripped = first_line.strip()
+    if stripped.startswith('WEBVTT'):
+        return 'vtt'
+    if stripped.lower() == '[script info]':
+        return 'ass'
+    return 'srt'
+
+def _vtt_text(text):
+    return html.unescape(VTT_TAG_RE.sub('', text))
+
+def _ass_text(text):
+    text = ASS_OVERRIDE_RE.sub('', text)
+    return text.replace('\\N', '\n').replace('\\n', '\n').replace('\\h', ' ')
+
+def _iter_blocks(lines, clean=None):
+    """SRT / VTT: block = [định danh] + dòng thời gian + các dòng text, ngăn cách bằng dòng trống"""
+    match_timing = TIMING_RE.match
+    ordinal = 0
+    pending = None   # dòng nằm trước dòng thời gian (số thứ tự SRT / định danh VTT)
+    ident = None     # block đang đọc: định danh, thời gian, các dòng text (text None = chưa có block)
+    start = end = 0
+    text = None
+
+    for line in lines:
+        s = line.strip()
+        if not s:
+            if text is not None:
+                body = clean('\n'.join(text)) if clean else '\n'.join(text)
+                yield Cue(int(ident) if ident and ident.isdigit() else ordinal, start, end, body)
+                text = None
+            pending = None
+            continue
+
+        timing = None
+        if '-->' in s:
+            timing = _fixed_timing(s)
+            if timing is None:
+                m = match_timing(s)
+                if m is not None:
+                    h1, m1, s1, f1, h2, m2, s2, f2 = m.groups()
+                    timing = (_ms(h1, m1, s1, f1), _ms(h2, m2, s2, f2))
+        if timing is None:
+            if text is not None:
+                text.append(s)
+            else:
+                # Block chưa có dòng thời gian (header VTT, NOTE, block hỏng...) -> chỉ giữ dòng cuối
+                pending = s
+            continue
+
+        if text is not None:
+            # Thiếu dòng trống giữa 2 block: dòng số cuối cùng là số thứ tự của block mới
+            pending = text.pop() if text and text[-1].isdigit() else None
+            body = clean('\n'.join(text)) if clean else '\n'.join(text)
+            yield Cue(int(ident) if ident and ident.isdigit() else ordinal, start, end, body)
+        start, end = timing
+        ordinal += 1
+        ident = pending
+        pending = None
+        text = []
+
+    if text is not None:
+        body = clean('\n'.join(text)) if clean else '\n'.join(text)
+        yield Cue(int(ident) if ident and ident.isdigit() else ordinal, start, end, body)
+
+def _iter_ass(lines):
+    """ASS / SSA: các dòng 'Dialogue:' trong [Events], cột theo dòng 'Format:'"""
+    in_events = False
+    fields = ASS_DEFAULT_FORMAT
+    ordinal = 0
+    for line in lines:
+        s = line.strip()
+        if s.startswith('['):
+            in_events = s.lower() == '[events]'
+            continue
+        if not in_events:
+            continue
+        key, _, value = s.partition(':')
+        if key == 'Format':
+            fields = [f.strip().lower() for f in value.split(',')]
+        elif key == 'Dialogue':
+            values = value.split(',', len(fields) - 1)
+            if len(values) < len(fields):
+                continue
+            row = dict(zip(fields, values))
+            start, end = parse_time(row.get('start', '')), parse_time(row.get('end', ''))
+            if start is None or end is None:
+                continue
+            ordinal += 1
+            yield Cue(ordinal, start, end, _ass_text(row.get('text', '').strip()))
+
+def iter_cues(path, fmt=None):
+    """Đọc lần lượt từng Cue. fmt: 'srt' | 'vtt' | 'ass' (None = đoán theo đuôi file / dòng đầu)"""
+    with _open_text(path) as f:
+        first = f.readline()
+        fmt = fmt or _detect_format(path, first)
+        lines = chain([first], f)
+        if fmt == 'ass':
+            yield from _iter_ass(lines)
+        else:
+            yield from _iter_blocks(lines, _vtt_text if fmt == 'vtt' else None)
+
+def parse_subtitles(path, fmt=None):
+    """Toàn bộ Cue của file, theo thứ tự trong file"""
+    return list(iter_cues(path, fmt))
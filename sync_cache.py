@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import hashlib
+
+# ==========================================
+# CACHE AUDIO ĐÃ DECODE (cho các lần chạy sync lặp lại)
+# ==========================================
+# Người dùng thường chạy lại bước sync nhiều lần với cùng 1 file thuyết minh trong lúc sửa SRT.
+# Bản decode PCM được giữ lại theo NỘI DUNG file audio (không theo đường dẫn) + tham số decode,
+# lần sau cắt thẳng từ file này (memmap) mà không gọi ffmpeg.
+#
+# Cấu trúc thư mục cache:
+#   <key>.wav   : PCM 16-bit đã decode (key = blake2b(hash nội dung file + tham số decode))
+#   index.json  : {"entries": {key: {size, last_used}},
+#                  "digests": {đường dẫn: {size, mtime, digest}}}
+#                 digests ghi nhớ hash nội dung theo size + mtime để lần sau khỏi đọc lại cả file.
+# Vượt quá dung lượng cho phép -> xoá các bản ít dùng gần đây nhất (LRU).
+
+PCM_CACHE_VERSION = 1
+PCM_CACHE_INDEX = "index.json"
+PCM_CACHE_MAX_BYTES = 4 * 1024 ** 3
+HASH_CHUNK = 4 * 1024 * 1024
+
+def file_digest(file_path, chunk=HASH_CHUNK):
+    """Hash toàn bộ nội dung file (blake2b, đọc từng khối)"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(chunk)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+class PcmCache:
+    """Thư mục cache PCM, khóa theo nội dung file audio + tham số decode, giới hạn theo dung lượng"""
+
+    def __init__(self, folder, max_bytes=PCM_CACHE_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.entries = {}
+        self.digests = {}
+        os.makedirs(folder, exist_ok=True)
+        try:
+            with open(os.path.join(folder, PCM_CACHE_INDEX), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == PCM_CACHE_VERSION:
+                self.entries = data.get('entries', {})
+                self.digests = data.get('digests', {})
+        except (OSError, ValueError):
+            pass
+        # File bị xoá tay khỏi thư mục cache / file audio gốc không còn -> bỏ khỏi index
+        self.entries = {k: v for k, v in self.entries.items() if os.path.exists(self.path(k))}
+        self.digests = {p: v for p, v in self.digests.items() if os.path.exists(p)}
+
+    def path(self, key):
+        return os.path.join(self.folder, f"{key}.wav")
+
+    def temp_path(self, key):
+        return os.path.join(self.folder, f"{key}.tmp.wav")
+
+    def key(self, file_path, params):
+        """Khóa cache: hash nội dung file (dùng lại nếu size + mtime không đổi) + tham số decode"""
+        stat = os.stat(file_path)
+        name = os.path.abspath(file_path)
+        known = self.digests.get(name)
+        if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime_ns:
+            digest = known['digest']
+        else:
+            digest = file_digest(file_path)
+            self.digests[name] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "digest": digest}
+        return hashlib.blake2b((digest + json.dumps(params, sort_keys=True)).encode(), digest_size=16).hexdigest()
+
+    def get(self, key):
+        """Đường dẫn bản decode đã cache (đánh dấu vừa dùng), None nếu chưa có"""
+        if key not in self.entries:
+            return None
+        self.entries[key]['last_used'] = time.time()
+        self.save()
+        return self.path(key)
+
+    def put(self, key, tmp_path):
+        """Đưa file decode xong (temp_path) vào cache rồi dọn bớt theo LRU. Trả về đường dẫn cuối"""
+        final_path = self.path(key)
+        os.replace(tmp_path, final_path)
+        self.entries[key] = {"size": os.path.getsize(final_path), "last_used": time.time()}
+        self.evict(keep=key)
+        self.save()
+        return final_path
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+        self.save()
+
+    def evict(self, keep=None):
+        """Xoá các bản ít dùng gần đây nhất tới khi tổng dung lượng <= max_bytes (trừ `keep`)"""
+        total = sum(e['size'] for e in self.entries.values())
+        for key in sorted(self.entries, key=lambda k: self.entries[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                # Windows: file đang được process khác memmap -> để lần sau
+                continue
+            total -= self.entries.pop(key)['size']
+
+    def save(self):
+        index_path = os.path.join(self.folder, PCM_CACHE_INDEX)
+        tmp_path = index_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "version": PCM_CACHE_VERSION,
+                    "entries": self.entries,
+                    "digests": self.digests
+                }, f)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            pass
+
+# ==========================================
+# TRẠNG THÁI TỪNG DÒNG (re-sync tăng dần)
+# ==========================================
+# temp_dir/sync_state.json ghi lại kết quả của lần chạy trước theo digest từng dòng:
+#   digest = hash(danh tính file audio + thiết lập cắt + start/end theo SRT)
+# Lần chạy sau chỉ cắt lại các dòng mới hoặc bị sửa thời gian; dòng chỉ sửa chữ vẫn dùng lại audio cũ.
+
+SYNC_STATE_FILE = "sync_state.json"
+SYNC_STATE_VERSION = 1
+
+def source_identity(file_path):
+    """Danh tính file audio nguồn: đường dẫn tuyệt đối + kích thước + mtime (không cần đọc nội dung)"""
+    stat = os.stat(file_path)
+    return f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+def cue_digest(settings, start, end):
+    """Digest 1 dòng: thiết lập của cả lần chạy (dict) + mốc SRT làm tròn tới ms"""
+    text = f"{json.dumps(settings, sort_keys=True)}|{round(start * 1000)}|{round(end * 1000)}"
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=12).hexdigest()
+
+def load_sync_state(temp_dir):
+    """{"cues": {digest: kết quả của dòng}, "pcm_source": manifest hoặc None}. Không có / hỏng -> rỗng"""
+    try:
+        with open(os.path.join(temp_dir, SYNC_STATE_FILE), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('version') == SYNC_STATE_VERSION:
+            return {"cues": state.get('cues', {}), "pcm_source": state.get('pcm_source')}
+    except (OSError, ValueError):
+        pass
+    return {"cues": {}, "pcm_source": None}
+
+def save_sync_state(temp_dir, cues, pcm_source=None):
+    state_path = os.path.join(temp_dir, SYNC_STATE_FILE)
+    tmp_path = state_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": SYNC_STATE_VERSION, "cues": cues, "pcm_source": pcm_source}, f)
+        os.replace(tmp_path, state_path)
+    except OSError:
+        pass
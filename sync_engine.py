@@ -2,7 +2,18 @@ import sys
 import os
 import json
 import subprocess
-import re
+import wave
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from subtitle_parser import iter_cues
+from sync_cache import (
+    PcmCache, PCM_CACHE_MAX_BYTES, source_identity, cue_digest, load_sync_state, save_sync_state
+)
+from sync_vad import energy_envelope, speech_mask, refine_boundaries, REFINE_WINDOW_MS
 
 # Set UTF-8 for Windows console
 if sys.platform == "win32":
@@ -13,42 +24,481 @@ def send_json(msg_type, data):
     print(json.dumps({"type": msg_type, **data}, ensure_ascii=False))
     sys.stdout.flush()
 
-def timestamp_to_seconds(timestamp):
-    timestamp = timestamp.replace(',', '.')
-    hrs, mins, secs = timestamp.split(':')
-    return float(hrs) * 3600 + float(mins) * 60 + float(secs)
-
 def parse_srt(srt_path):
+    """Đọc file phụ đề (SRT / VTT / ASS) -> danh sách đoạn, thời gian tính bằng giây"""
     segments = []
-    try:
-        with open(srt_path, 'r', encoding='utf-8') as f: content = f.read()
-    except:
-        with open(srt_path, 'r', encoding='utf-8-sig') as f: content = f.read()
-            
-    pattern = re.compile(r'(\d+)\n(\d{2}:\d{2}:\d{2}[,.]\d{3}) --> (\d{2}:\d{2}:\d{2}[,.]\d{3})\n((?:(?!\n\n).)*)', re.DOTALL)
-    matches = pattern.findall(content)
-    for match in matches:
-        idx, start_str, end_str, text = match
-        start = timestamp_to_seconds(start_str)
-        end = timestamp_to_seconds(end_str)
-        text = text.replace('\n', ' ').strip()
-        segments.append({"id": idx, "start": start, "end": end, "text": text, "duration": end - start})
+    for cue in iter_cues(srt_path):
+        start = cue.start / 1000
+        end = cue.end / 1000
+        text = cue.text.replace('\n', ' ').strip()
+        segments.append({"id": str(cue.index), "start": start, "end": end, "text": text, "duration": end - start})
     return segments
 
+def parse_options(argv):
+    """Tách tham số vị trí và các cờ dạng --key=value (cờ không có giá trị = True)"""
+    positional, options = [], {}
+    for arg in argv:
+        if arg.startswith('--'):
+            key, sep, value = arg[2:].partition('=')
+            options[key.replace('-', '_')] = value if sep else True
+        else:
+            positional.append(arg)
+    return positional, options
+
+# ==========================================
+# CẮT AUDIO 1 LẦN DECODE
+# ==========================================
+# Cách cũ (--cut=per-cue): mỗi dòng SRT 1 lần gọi ffmpeg với -ss/-to đặt sau -i, nên ffmpeg phải
+# decode lại từ đầu file tới dòng đó -> tổng thời gian tăng theo bình phương số dòng.
+# Cách mới (mặc định): decode toàn bộ audio ra 1 file PCM 16-bit (giữ nguyên sample rate / số kênh
+# như cách cũ), rồi cắt từng đoạn bằng offset sample và ghi thẳng ra WAV.
+
+SOURCE_WAV_NAME = "audio_source.wav"
+# Tham số decode, là 1 phần của khóa cache PCM (đổi cách decode -> bản cache cũ không dùng nữa)
+DECODE_PARAMS = {"codec": "pcm_s16le", "format": "wav"}
+PCM_CACHE_DIR_NAME = "sync_pcm_cache"
+
+class PcmSource:
+    """File WAV PCM 16-bit đã decode: vị trí và kích thước phần dữ liệu"""
+
+    def __init__(self, path, rate, channels, data_offset, frames):
+        self.path = path
+        self.rate = rate
+        self.channels = channels
+        self.data_offset = data_offset
+        self.frames = frames
+        self.frame_size = 2 * channels
+        self._samples = None
+
+    @property
+    def samples(self):
+        """Mảng int16 (frames, channels) đọc qua memmap: chỉ nạp những đoạn được cắt"""
+        if self._samples is None:
+            if self.frames:
+                self._samples = np.memmap(self.path, dtype='<i2', mode='r', offset=self.data_offset,
+                                          shape=(self.frames, self.channels))
+            else:
+                self._samples = np.zeros((0, self.channels), dtype='<i2')
+        return self._samples
+
+    def close(self):
+        # Windows không cho xoá file đang được memmap
+        self._samples = None
+
+def read_wav_layout(wav_path):
+    """Đọc header WAV (RIFF hoặc RF64 cho file > 4GB) -> PcmSource. Sai định dạng -> ValueError"""
+    file_size = os.path.getsize(wav_path)
+    with open(wav_path, 'rb') as f:
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff not in (b'RIFF', b'RF64') or wave_id != b'WAVE':
+            raise ValueError("not a WAV file")
+        fmt, ds64_data_size = None, None
+        while True:
+            head = f.read(8)
+            if len(head) < 8:
+                raise ValueError("WAV file has no data chunk")
+            chunk_id, chunk_size = struct.unpack('<4sI', head)
+            if chunk_id == b'data':
+                data_offset = f.tell()
+                if ds64_data_size is not None:
+                    chunk_size = ds64_data_size
+                # ffmpeg chưa kịp sửa header (bị ngắt giữa chừng) -> lấy tới hết file
+                chunk_size = min(chunk_size, file_size - data_offset)
+                break
+            body = f.read(chunk_size + (chunk_size & 1))
+            if chunk_id == b'fmt ':
+                fmt = struct.unpack('<HHIIHH', body[:16])
+            elif chunk_id == b'ds64':
+                ds64_data_size = struct.unpack('<Q', body[8:16])[0]
+
+    if fmt is None:
+        raise ValueError("WAV file has no fmt chunk")
+    _, channels, rate, _, _, bits = fmt
+    if bits != 16:
+        raise ValueError(f"expected 16-bit PCM, got {bits}-bit")
+    return PcmSource(wav_path, rate, channels, data_offset, chunk_size // (2 * channels))
+
+def decode_audio(audio_path, out_path, ffmpeg_path='ffmpeg'):
+    """Decode toàn bộ audio ra WAV PCM 16-bit (1 lần duy nhất). Lỗi -> RuntimeError"""
+    cmd = [
+        ffmpeg_path, '-y', '-v', 'error', '-i', audio_path,
+        '-vn', '-c:a', 'pcm_s16le', '-rf64', 'auto', out_path
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0 or not os.path.exists(out_path):
+        detail = result.stderr.decode('utf-8', errors='replace').strip().splitlines()
+        raise RuntimeError(f"Cannot decode audio: {detail[-1] if detail else 'ffmpeg failed'}")
+    return read_wav_layout(out_path)
+
+def segment_range(source, start, end):
+    """[start, end] (giây) -> (frame đầu, frame cuối) trong source. None nếu end < start (như ffmpeg)"""
+    if end < start:
+        return None
+    first = min(max(0, round(start * source.rate)), source.frames)
+    last = min(max(first, round(end * source.rate)), source.frames)
+    return first, last
+
+def write_segment(source, start, end, out_path):
+    """Ghi đoạn [start, end] (giây) của source ra WAV riêng. False nếu end < start"""
+    frames = segment_range(source, start, end)
+    if frames is None:
+        return False
+    data = source.samples[frames[0]:frames[1]].tobytes()
+    with wave.open(out_path, 'wb') as w:
+        w.setnchannels(source.channels)
+        w.setsampwidth(2)
+        w.setframerate(source.rate)
+        w.writeframes(data)
+    return True
+
+# ==========================================
+# CHẠY SONG SONG
+# ==========================================
+# Mỗi đoạn chỉ là 1 subprocess ffmpeg (per-cue) hoặc đọc/ghi file (single) -> đều nhả GIL,
+# nên dùng thread pool là đủ. Số worker chỉnh bằng --workers=N.
+
+# Gửi progress tối đa 1 lần mỗi khoảng này (giây), tránh hàng nghìn dòng JSON cho SRT dài
+PROGRESS_INTERVAL = 0.25
+
+def default_workers():
+    return max(1, os.cpu_count() or 1)
+
+class ProgressReporter:
+    """Gộp progress của nhiều worker, gửi theo chu kỳ; lần cuối (done == total) luôn được gửi"""
+
+    def __init__(self, total, base=10, span=80, interval=PROGRESS_INTERVAL):
+        self.total = total
+        self.base = base
+        self.span = span
+        self.interval = interval
+        self.done = 0
+        self.last_sent = 0.0
+
+    def advance(self):
+        self.done += 1
+        now = time.monotonic()
+        if self.done < self.total and now - self.last_sent < self.interval:
+            return
+        self.last_sent = now
+        send_json("progress", {
+            "step": f"Cutting Audio {self.done}/{self.total}",
+            "percent": self.base + int((self.done / self.total) * self.span)
+        })
+
+def cut_segments(items, cut_one, workers=1):
+    """items: list (vị trí trong SRT, đoạn). Chạy cut_one(i, seg) -> bool với tối đa `workers` việc cùng lúc.
+
+    Kết quả giữ nguyên thứ tự SRT, không phụ thuộc thứ tự hoàn thành.
+    """
+    total_segs = len(items)
+    if not total_segs:
+        return []
+    progress = ProgressReporter(total_segs)
+    ok = [False] * total_segs
+
+    def run(k):
+        try:
+            return cut_one(*items[k])
+        except Exception:
+            return False
+
+    if workers <= 1 or total_segs <= 1:
+        for k in range(total_segs):
+            ok[k] = run(k)
+            progress.advance()
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, total_segs)) as pool:
+            futures = {pool.submit(run, k): k for k in range(total_segs)}
+            for future in as_completed(futures):
+                ok[futures[future]] = future.result()
+                progress.advance()
+
+    return [seg for (_, seg), cut in zip(items, ok) if cut]
+
+def segment_path(audio_folder, i):
+    return os.path.join(audio_folder, f"audio_{i:03d}.wav")
+
+def decode_private(audio_path, temp_dir, ffmpeg_path):
+    """Decode vào temp_dir/SOURCE_WAV_NAME (bản riêng của lần chạy, không qua cache).
+
+    File cũ có thể là hard link tới 1 bản trong cache (pin_source): phải xoá trước, ghi đè tại chỗ
+    sẽ làm hỏng luôn bản cache đó.
+    """
+    target = os.path.join(temp_dir, SOURCE_WAV_NAME)
+    try:
+        os.remove(target)
+    except OSError:
+        pass
+    return decode_audio(audio_path, target, ffmpeg_path)
+
+def load_source(audio_path, temp_dir, ffmpeg_path, cache=None):
+    """Bản decode PCM của audio_path: lấy từ cache nếu có, không thì decode (và đưa vào cache).
+
+    Trả về (PcmSource, True nếu file thuộc riêng lần chạy này và cần xoá sau khi cắt).
+    """
+    if cache is None:
+        send_json("progress", {"step": "Decoding audio...", "percent": 10})
+        return decode_private(audio_path, temp_dir, ffmpeg_path), True
+
+    send_json("progress", {"step": "Checking audio cache...", "percent": 10})
+    key = cache.key(audio_path, DECODE_PARAMS)
+    cached_path = cache.get(key)
+    if cached_path:
+        try:
+            source = read_wav_layout(cached_path)
+            print(f"[CACHE] Reused decoded audio for {os.path.basename(audio_path)}")
+            sys.stdout.flush()
+            return source, False
+        except (OSError, ValueError, struct.error):
+            cache.discard(key)
+
+    send_json("progress", {"step": "Decoding audio...", "percent": 10})
+    tmp_path = cache.temp_path(key)
+    try:
+        decode_audio(audio_path, tmp_path, ffmpeg_path)
+        return read_wav_layout(cache.put(key, tmp_path)), False
+    except OSError:
+        # Không ghi được vào thư mục cache -> decode vào temp_dir như khi không có cache
+        try: os.remove(tmp_path)
+        except OSError: pass
+        return decode_private(audio_path, temp_dir, ffmpeg_path), True
+
+def refine_segments(audio_segments, source, window_ms=REFINE_WINDOW_MS):
+    """--refine: dời start / end của từng đoạn về biên tiếng nói gần nhất (xem sync_vad).
+
+    Mốc SRT gốc được giữ lại trong srt_start / srt_end của những đoạn bị dời.
+    """
+    send_json("progress", {"step": "Refining cue boundaries...", "percent": 12})
+    t0 = time.perf_counter()
+    envelope, hop = energy_envelope(source.samples, source.rate)
+    mask = speech_mask(envelope)
+    valid = [seg for seg in audio_segments if seg['end'] >= seg['start']]
+    starts, ends = refine_boundaries([seg['start'] for seg in valid], [seg['end'] for seg in valid],
+                                     mask, hop / source.rate, window_ms)
+    moved = 0
+    for seg, start, end in zip(valid, starts, ends):
+        start, end = round(float(start), 3), round(float(end), 3)
+        if start == seg['start'] and end == seg['end']:
+            continue
+        seg['srt_start'], seg['srt_end'] = seg['start'], seg['end']
+        seg['start'], seg['end'], seg['duration'] = start, end, end - start
+        moved += 1
+    print(f"[REFINE] {moved}/{len(audio_segments)} cues snapped to speech boundaries "
+          f"in {time.perf_counter() - t0:.2f}s")
+    sys.stdout.flush()
+
+# ==========================================
+# ĐOẠN ẢO (--segments=virtual, mặc định)
+# ==========================================
+# Thay vì ghi hàng nghìn file audio_NNN.wav (nhiều file nhỏ, tốn ổ đĩa gấp đôi), chỉ giữ 1 file PCM
+# và trả về manifest: "pcm_source" {path, data_offset, sample_rate, channels, sample_format} ở mức
+# ngoài cùng, mỗi đoạn có sample_offset / sample_count (tính theo frame) thay cho file_path.
+# Bước render đọc thẳng vùng byte đó (ffmpeg subfile). Cần file riêng thì chạy với --segments=files.
+
+def pin_source(source, temp_dir):
+    """Giữ bản decode trong cache sống tới lúc render: hard link vào temp_dir (không chép dữ liệu).
+
+    Không link được (khác ổ đĩa...) -> dùng thẳng file trong cache.
+    """
+    pinned = os.path.join(temp_dir, SOURCE_WAV_NAME)
+    try:
+        if os.path.exists(pinned):
+            os.remove(pinned)
+        os.link(source.path, pinned)
+    except OSError:
+        return source.path
+    return pinned
+
+def virtual_segments(items, source):
+    """Gắn sample_offset / sample_count vào từng đoạn. Trả về các đoạn hợp lệ, giữ thứ tự SRT"""
+    final_audio_list = []
+    for _, seg in items:
+        frames = segment_range(source, seg['start'], seg['end'])
+        if frames is None:
+            continue
+        seg['sample_offset'] = frames[0]
+        seg['sample_count'] = frames[1] - frames[0]
+        final_audio_list.append(seg)
+    return final_audio_list
+
+def pcm_manifest(source, path):
+    return {
+        "path": os.path.abspath(path),
+        "data_offset": source.data_offset,
+        "sample_rate": source.rate,
+        "channels": source.channels,
+        "sample_format": "s16le"
+    }
+
+def cut_single_pass(items, audio_path, audio_folder, temp_dir, ffmpeg_path, workers=1, cache=None,
+                    virtual=False, refine_window=None, pcm_source=None):
+    """Decode 1 lần (hoặc lấy từ cache) rồi cắt các đoạn trong items (list (vị trí, đoạn)) từ bản decode đó.
+
+    refine_window (ms): tinh chỉnh mốc theo tiếng nói trước khi cắt (None = giữ mốc SRT).
+    pcm_source: manifest của lần chạy trước, dùng lại khi không còn đoạn nào phải cắt.
+    Trả về (các đoạn đã cắt được, manifest pcm_source nếu virtual, không thì None).
+    """
+    if not items:
+        # Mọi dòng đều dùng lại được: không cần decode (trừ khi file PCM của bản manifest cũ đã mất)
+        if not virtual:
+            return [], None
+        if pcm_source and os.path.exists(pcm_source['path']):
+            return [], pcm_source
+
+    source, owned = load_source(audio_path, temp_dir, ffmpeg_path, cache)
+    if refine_window and items:
+        refine_segments([seg for _, seg in items], source, refine_window)
+
+    if virtual:
+        send_json("progress", {"step": "Indexing segments...", "percent": 80})
+        source.close()
+        path = source.path if owned else pin_source(source, temp_dir)
+        return virtual_segments(items, source), pcm_manifest(source, path)
+
+    def cut_one(i, seg):
+        out_path = segment_path(audio_folder, i)
+        if not write_segment(source, seg['start'], seg['end'], out_path):
+            return False
+        seg['file_path'] = out_path
+        return True
+
+    try:
+        return cut_segments(items, cut_one, workers), None
+    finally:
+        source.close()
+        # Bản decode không nằm trong cache chỉ dùng để cắt, xoá đi cho đỡ tốn ổ đĩa
+        if owned:
+            try: os.remove(source.path)
+            except OSError: pass
+
+def cut_per_cue(items, audio_path, audio_folder, ffmpeg_path, workers=1):
+    """Cách cũ: 1 lần gọi ffmpeg cho mỗi dòng SRT"""
+
+    def cut_one(i, seg):
+        out_path = segment_path(audio_folder, i)
+        cmd = [
+            ffmpeg_path, '-y', '-i', audio_path,
+            '-ss', str(seg['start']), '-to', str(seg['end']),
+            '-c', 'pcm_s16le', out_path
+        ]
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if not os.path.exists(out_path):
+            return False
+        seg['file_path'] = out_path
+        return True
+
+    return cut_segments(items, cut_one, workers)
+
+# ==========================================
+# RE-SYNC TĂNG DẦN
+# ==========================================
+# Sửa vài dòng trong SRT 2000 dòng không cần cắt lại cả 2000 đoạn: mỗi dòng có 1 digest
+# (danh tính file audio + thiết lập cắt + mốc SRT, xem sync_cache). Dòng có digest trùng lần chạy
+# trước -> dùng lại kết quả cũ (mốc đã tinh chỉnh, vị trí trong file PCM, file WAV đã cắt).
+
+# Các trường kết quả của 1 đoạn được lưu lại để dùng cho lần sau
+RESULT_FIELDS = ('start', 'end', 'duration', 'srt_start', 'srt_end', 'sample_offset', 'sample_count')
+
+def plan_incremental(audio_segments, digests, state, audio_folder, files=False):
+    """Áp kết quả cũ cho các dòng không đổi. Trả về (các đoạn dùng lại, list (vị trí, đoạn) cần cắt).
+
+    files=True: các file WAV dùng lại được đổi tên về đúng audio_NNN.wav theo thứ tự mới,
+    file cũ không dùng nữa bị xoá.
+    """
+    reused, pending, claimed, staged = [], [], set(), []
+    for i, (seg, digest) in enumerate(zip(audio_segments, digests)):
+        old = state['cues'].get(digest)
+        # 2 dòng trùng hệt mốc thời gian: file cũ chỉ dùng lại được cho 1 dòng
+        if old is None or digest in claimed:
+            pending.append((i, seg))
+            continue
+        if files:
+            tmp_path = os.path.join(audio_folder, f"reuse_{len(staged)}.tmp")
+            try:
+                os.replace(os.path.join(audio_folder, old.get('file', '')), tmp_path)
+            except OSError:
+                pending.append((i, seg))
+                continue
+            staged.append((tmp_path, i, seg))
+        claimed.add(digest)
+        seg.update({k: v for k, v in old.items() if k in RESULT_FIELDS})
+        reused.append(seg)
+
+    if files:
+        # Các file đang dùng lại đã được chuyển sang tên tạm -> còn lại đều là file cũ
+        for name in os.listdir(audio_folder):
+            if name.startswith('audio_') and name.endswith('.wav'):
+                try: os.remove(os.path.join(audio_folder, name))
+                except OSError: pass
+        for tmp_path, i, seg in staged:
+            out_path = segment_path(audio_folder, i)
+            os.replace(tmp_path, out_path)
+            seg['file_path'] = out_path
+    return reused, pending
+
+def state_record(seg):
+    record = {k: seg[k] for k in RESULT_FIELDS if k in seg}
+    if seg.get('file_path'):
+        record['file'] = os.path.basename(seg['file_path'])
+    return record
+
 def main():
-    if len(sys.argv) < 5:
+    args, options = parse_options(sys.argv[1:])
+    if len(args) < 4:
         send_json("error", {"message": "Missing args"})
         return
 
-    # Args: script.py [video] [audio] [srt] [temp_dir] [ffmpeg_path]
-    video_path = sys.argv[1]
-    audio_path = sys.argv[2]
-    srt_path = sys.argv[3]
-    temp_dir = sys.argv[4]
-    ffmpeg_path = sys.argv[5]
+    # Args: script.py [video] [audio] [srt] [temp_dir] [ffmpeg_path] [--cut=single|per-cue] [--workers=N]
+    #       [--segments=virtual|files] [--pcm-cache=DIR] [--pcm-cache-size=MB] [--no-pcm-cache]
+    #       [--refine] [--refine-window=MS] [--full-resync]
+    video_path = args[0]
+    audio_path = args[1]
+    srt_path = args[2]
+    temp_dir = args[3]
+    ffmpeg_path = args[4] if len(args) > 4 else 'ffmpeg'
+    cut_mode = options.get('cut', 'single')
+    if cut_mode not in ('single', 'per-cue'):
+        send_json("error", {"message": f"Unknown cut mode: {cut_mode}"})
+        return
+    # Cắt kiểu cũ luôn ra file riêng
+    segments_mode = 'files' if cut_mode == 'per-cue' else options.get('segments', 'virtual')
+    if segments_mode not in ('virtual', 'files'):
+        send_json("error", {"message": f"Unknown segments mode: {segments_mode}"})
+        return
+    refine_window = None
+    if options.get('refine') or options.get('refine_window'):
+        try:
+            refine_window = float(options.get('refine_window', REFINE_WINDOW_MS))
+        except (TypeError, ValueError):
+            refine_window = REFINE_WINDOW_MS
+        if cut_mode == 'per-cue':
+            # Cần bản decode đầy đủ của cả track -> chỉ có ở chế độ single
+            print("[REFINE] Ignored with --cut=per-cue")
+            sys.stdout.flush()
+            refine_window = None
+    try:
+        workers = int(options.get('workers', default_workers()))
+    except ValueError:
+        workers = 1
 
     if not os.path.exists(temp_dir): os.makedirs(temp_dir)
 
+    # Cache PCM mặc định nằm cạnh các thư mục sync_temp_* (sau khi render temp_dir chỉ còn sync_state.json)
+    cache = None
+    if cut_mode == 'single' and not options.get('no_pcm_cache'):
+        cache_dir = options.get('pcm_cache')
+        if not cache_dir or cache_dir is True:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(temp_dir)), PCM_CACHE_DIR_NAME)
+        try:
+            max_bytes = int(float(options['pcm_cache_size']) * 1024 * 1024) if 'pcm_cache_size' in options \
+                else PCM_CACHE_MAX_BYTES
+        except (TypeError, ValueError):
+            max_bytes = PCM_CACHE_MAX_BYTES
+        try:
+            cache = PcmCache(cache_dir, max_bytes)
+        except OSError:
+            cache = None
+
     try:
         # 1. PARSE SRT
         send_json("progress", {"step": "Reading SRT...", "percent": 10})
@@ -60,34 +510,51 @@ def main():
 
         # 2. CUT AUDIO
         audio_folder = os.path.join(temp_dir, "audio_segments")
-        if not os.path.exists(audio_folder): os.makedirs(audio_folder)
+        if segments_mode == 'files' and not os.path.exists(audio_folder): os.makedirs(audio_folder)
         
-        total_segs = len(audio_segments)
-        final_audio_list = []
-        
-        for i, seg in enumerate(audio_segments):
-            send_json("progress", {"step": f"Cutting Audio {i+1}/{total_segs}", "percent": 10 + int((i/total_segs)*80)})
-            out_name = f"audio_{i:03d}.wav"
-            out_path = os.path.join(audio_folder, out_name)
-            
-            cmd = [
-                ffmpeg_path, '-y', '-i', audio_path,
-                '-ss', str(seg['start']), '-to', str(seg['end']),
-                '-c', 'pcm_s16le', out_path
-            ]
-            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            
-            if os.path.exists(out_path):
-                seg['file_path'] = out_path
-                final_audio_list.append(seg)
+        # Chỉ cắt lại các dòng mới / bị sửa so với lần chạy trước trong cùng temp_dir
+        settings = {
+            "source": source_identity(audio_path),
+            "cut": cut_mode,
+            "segments": segments_mode,
+            "refine": refine_window,
+            "decode": DECODE_PARAMS
+        }
+        digests = [cue_digest(settings, seg['start'], seg['end']) for seg in audio_segments]
+        state = load_sync_state(temp_dir) if not options.get('full_resync') else {"cues": {}, "pcm_source": None}
+        reused, pending = plan_incremental(audio_segments, digests, state, audio_folder, segments_mode == 'files')
+
+        pcm_source = None
+        if cut_mode == 'per-cue':
+            cut = cut_per_cue(pending, audio_path, audio_folder, ffmpeg_path, workers)
+        else:
+            cut, pcm_source = cut_single_pass(pending, audio_path, audio_folder, temp_dir, ffmpeg_path, workers,
+                                              cache, segments_mode == 'virtual', refine_window,
+                                              state['pcm_source'])
+
+        done_ids = {id(seg) for seg in reused} | {id(seg) for seg in cut}
+        final_audio_list = [seg for seg in audio_segments if id(seg) in done_ids]
+        save_sync_state(temp_dir, {
+            digest: state_record(seg)
+            for seg, digest in zip(audio_segments, digests) if id(seg) in done_ids
+        }, pcm_source)
+        if state['cues']:
+            print(f"[INCREMENTAL] {len(reused)} cues reused, {len(cut)} regenerated")
+            sys.stdout.flush()
         
         # 3. NO VIDEO SCENE DETECTION (TIMELINE MODE)
         # Trả về danh sách rỗng cho video_scenes vì ta không dùng nữa
-        send_json("done", {
+        done = {
             "audio_segments": final_audio_list,
             "video_scenes": [], 
-            "message": f"Prepared {len(final_audio_list)} audio segments from SRT."
-        })
+            "reused": len(reused),
+            "regenerated": len(cut),
+            "message": f"Prepared {len(final_audio_list)} audio segments from SRT "
+                       f"({len(reused)} reused, {len(cut)} regenerated)."
+        }
+        if pcm_source:
+            done["pcm_source"] = pcm_source
+        send_json("done", done)
 
     except Exception as e:
         send_json("error", {"message": str(e)})
@@ -0,0 +1,103 @@
+import numpy as np
+
+# ==========================================
+# TINH CHỈNH MỐC THỜI GIAN THEO GIỌNG NÓI (--refine)
+# ==========================================
+# Mốc SRT thường lỏng: đoạn cắt dư khoảng lặng ở đầu/cuối hoặc cụt mất âm đầu của từ.
+# 1. Tính năng lượng ngắn hạn (RMS theo dB, mỗi HOP_MS) cho cả track trong 1 lượt NumPy,
+#    đọc theo từng khối để RAM không tăng theo độ dài track.
+# 2. Ngưỡng tiếng nói tự thích nghi: nằm giữa mức nền (percentile thấp) và mức tiếng nói (percentile cao).
+# 3. Mỗi mốc chỉ được dời trong cửa sổ dung sai:
+#    - start trong khoảng lặng -> tới điểm bắt đầu tiếng nói kế tiếp (bỏ khoảng lặng đầu)
+#      start giữa tiếng nói    -> lùi về điểm bắt đầu của tiếng nói đó (không cụt âm đầu)
+#    - end   trong khoảng lặng -> lùi về điểm kết thúc tiếng nói trước đó
+#      end   giữa tiếng nói    -> tới điểm kết thúc của tiếng nói đó
+#    Không có mốc phù hợp trong cửa sổ -> giữ nguyên mốc SRT.
+
+HOP_MS = 10
+REFINE_WINDOW_MS = 300
+# Chừa lại 1 chút trước/sau tiếng nói để không cắt sát phụ âm
+REFINE_PAD_MS = 40
+NOISE_PERCENTILE = 10
+SPEECH_PERCENTILE = 95
+THRESHOLD_RATIO = 0.35
+# Khoảng lặng ngắn hơn mức này (giữa 2 từ) không tính là ngắt
+MIN_GAP_MS = 80
+BLOCK_HOPS = 6000
+
+def energy_envelope(samples, rate, hop_ms=HOP_MS, block_hops=BLOCK_HOPS):
+    """Năng lượng (dB) của từng khung hop_ms. samples: mảng int16 (frames, channels), có thể là memmap"""
+    hop = max(1, round(rate * hop_ms / 1000))
+    count = len(samples) // hop
+    envelope = np.empty(count, dtype=np.float32)
+    for first in range(0, count, block_hops):
+        last = min(count, first + block_hops)
+        block = np.asarray(samples[first * hop:last * hop], dtype=np.float32)
+        block = block.reshape(last - first, -1)
+        envelope[first:last] = np.einsum('ij,ij->i', block, block) / block.shape[1]
+    return 10 * np.log10(envelope + 1.0), hop
+
+def speech_mask(envelope_db, hop_ms=HOP_MS, min_gap_ms=MIN_GAP_MS):
+    """True ở các khung có tiếng nói (ngưỡng tự thích nghi, lấp các khoảng lặng ngắn giữa từ)"""
+    if not len(envelope_db):
+        return np.zeros(0, dtype=bool)
+    floor, speech = np.percentile(envelope_db, [NOISE_PERCENTILE, SPEECH_PERCENTILE])
+    mask = envelope_db > floor + (speech - floor) * THRESHOLD_RATIO
+
+    # Lấp khoảng lặng ngắn: các đoạn False nằm giữa 2 đoạn True và ngắn hơn `gap` khung
+    gap = max(1, round(min_gap_ms / hop_ms))
+    edges = np.flatnonzero(np.diff(mask.astype(np.int8)))
+    falls = edges[~mask[edges + 1]] + 1     # khung đầu tiên của khoảng lặng
+    rises = edges[mask[edges + 1]] + 1      # khung đầu tiên của tiếng nói
+    if len(falls) and len(rises):
+        rises = rises[rises > falls[0]]
+        falls = falls[:len(rises)]
+        short = rises - falls < gap
+        fill = np.zeros(len(mask) + 1, dtype=np.int32)
+        np.add.at(fill, falls[short], 1)
+        np.add.at(fill, rises[short], -1)
+        mask |= np.cumsum(fill[:-1]) > 0
+    return mask
+
+def speech_edges(mask):
+    """(khung bắt đầu tiếng nói, khung ngay sau khi tiếng nói kết thúc), đều đã sắp xếp"""
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    change = np.diff(padded)
+    return np.flatnonzero(change == 1), np.flatnonzero(change == -1)
+
+def refine_boundaries(starts, ends, mask, frame_seconds, window_ms=REFINE_WINDOW_MS, pad_ms=REFINE_PAD_MS):
+    """Dời các mốc (giây) về biên tiếng nói gần nhất trong cửa sổ dung sai. Trả về (starts, ends) mới"""
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    rises, falls = speech_edges(mask)
+    if not len(rises):
+        return starts, ends
+
+    window = window_ms / 1000
+    pad = pad_ms / 1000
+    rise_t = rises * frame_seconds
+    fall_t = falls * frame_seconds
+    last = len(mask) - 1
+
+    def speaking(t):
+        return mask[np.clip((t / frame_seconds).astype(np.int64), 0, last)]
+
+    # start: tiếng nói kế tiếp (đang lặng) hoặc điểm bắt đầu của tiếng nói hiện tại (đang nói)
+    in_speech = speaking(starts)
+    nxt = np.searchsorted(rise_t, starts, side='left')
+    prv = np.searchsorted(rise_t, starts, side='right') - 1
+    target = np.where(in_speech, rise_t[np.clip(prv, 0, None)], rise_t[np.clip(nxt, 0, len(rise_t) - 1)])
+    valid = np.where(in_speech, prv >= 0, nxt < len(rise_t)) & (np.abs(target - starts) <= window)
+    new_starts = np.where(valid, np.maximum(0.0, target - pad), starts)
+
+    # end: điểm kết thúc của tiếng nói hiện tại (đang nói) hoặc tiếng nói trước đó (đang lặng)
+    in_speech = speaking(ends)
+    nxt = np.searchsorted(fall_t, ends, side='left')
+    prv = np.searchsorted(fall_t, ends, side='right') - 1
+    target = np.where(in_speech, fall_t[np.clip(nxt, 0, len(fall_t) - 1)], fall_t[np.clip(prv, 0, None)])
+    valid = np.where(in_speech, nxt < len(fall_t), prv >= 0) & (np.abs(target - ends) <= window)
+    new_ends = np.where(valid, target + pad, ends)
+
+    # Mốc mới bị đảo (đoạn rỗng) -> giữ nguyên mốc SRT của dòng đó
+    broken = new_ends <= new_starts
+    return np.where(broken, starts, new_starts), np.where(broken, ends, new_ends)
@@ -0,0 +1,153 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dedup_engine
+from dedup_engine import (
+    cascade_score, compare_videos, run_from_fingerprints, normalize_roots, list_library_files, watch_folder
+)
+from dedup_store import FingerprintIndex
+from dedup_portable import write_fingerprint_file
+
+
+def make_video(name, hashes, width, height):
+    return {
+        "path": f"/library/{name}",
+        "filename": name,
+        "duration": len(hashes) / 10,
+        "hashes": hashes,
+        "audio": None,
+        "media": {"width": width, "height": height, "bitrate": width * height},
+    }
+
+
+def test_subclip_does_not_win_keep_policy_over_its_source():
+    # Nguồn 1200 frame, bản 4K của frame 0-300 và 1 đoạn cắt 600-900 (không liên quan tới bản 4K)
+    source = np.random.default_rng(7).integers(0, 2**63, 1200, dtype=np.uint64)
+    videos = [
+        make_video("source.mp4", source, 1280, 720),
+        make_video("intro_4k.mp4", source[0:300].copy(), 3840, 2160),
+        make_video("middle.mp4", source[600:900].copy(), 1280, 720),
+    ]
+
+    _, _, report = compare_videos(videos, ["/library"], None, subclips=True, policy='resolution', dry_run=True)
+
+    assert len(report) == 1
+    assert report[0]["keep"] == "/library/source.mp4"
+    assert sorted(d["path"] for d in report[0]["duplicates"]) == ["/library/intro_4k.mp4", "/library/middle.mp4"]
+
+
+def test_keep_policy_still_applies_between_full_length_copies():
+    source = np.random.default_rng(8).integers(0, 2**63, 1200, dtype=np.uint64)
+    videos = [
+        make_video("source.mp4", source, 1280, 720),
+        make_video("source_4k.mp4", source.copy(), 3840, 2160),
+        make_video("middle.mp4", source[600:900].copy(), 1280, 720),
+    ]
+
+    _, _, report = compare_videos(videos, ["/library"], None, subclips=True, policy='resolution', dry_run=True)
+
+    assert len(report) == 1
+    assert report[0]["keep"] == "/library/source_4k.mp4"
+
+
+def test_confirm_does_not_override_audio_match(monkeypatch):
+    # Bản lật hình: hash hình không khớp, audio khớp 92% -> không được chấm lại bằng pHash (vốn sẽ cho ~0)
+    rng = np.random.default_rng(9)
+    audio = rng.integers(1, 2**63, 1000, dtype=np.uint64)
+    mirrored_audio = audio.copy()
+    mirrored_audio[0:80:10] = ~audio[0:80:10]
+    original = make_video("original.mp4", rng.integers(0, 2**63, 1000, dtype=np.uint64), 1280, 720)
+    mirrored = make_video("mirrored.mp4", rng.integers(0, 2**63, 1000, dtype=np.uint64), 1280, 720)
+    original["audio"], mirrored["audio"] = audio, mirrored_audio
+    monkeypatch.setattr(dedup_engine, "confirm_similarity", lambda *args: 0)
+
+    assert cascade_score(original, mirrored, confirm='phash') >= 90
+
+
+def fingerprint_record(path, size, mtime, hashes):
+    meta = {"size": size, "mtime": mtime, "duration": len(hashes) / 10, "count": len(hashes), "audio_count": None}
+    return path, meta, hashes
+
+
+def test_same_path_on_two_nodes_is_only_merged_for_the_same_file(tmp_path, capsys):
+    rng = np.random.default_rng(10)
+    shared = rng.integers(0, 2**63, 500, dtype=np.uint64)
+    paths = []
+    # Mỗi máy có 1 file khác nhau cùng đường dẫn D:/Videos/clip.mp4, cả 2 cùng thấy 1 file trên NAS
+    for node, size in (("node-a", 1000), ("node-b", 2000)):
+        records = [
+            fingerprint_record("D:/Videos/clip.mp4", size, 1, rng.integers(0, 2**63, 500, dtype=np.uint64)),
+            fingerprint_record("//nas/share/movie.mp4", 5000, 2 * 10**9, shared),
+        ]
+        paths.append(str(tmp_path / f"{node}.dvfp"))
+        write_fingerprint_file(paths[-1], {"fps": 1}, records, node)
+
+    run_from_fingerprints(paths)
+
+    assert "[IMPORT] 3 fingerprints from 2 files" in capsys.readouterr().out
+
+
+def test_same_root_with_trailing_slash_lists_each_file_once(tmp_path):
+    (tmp_path / "a.mp4").write_bytes(b"video")
+    roots = normalize_roots([str(tmp_path), str(tmp_path) + os.sep])
+
+    assert roots == [os.path.realpath(tmp_path)]
+    assert len(list_library_files(roots)) == 1
+    # Danh sách root chưa chuẩn hóa cũng không liệt kê 1 file 2 lần
+    assert len(list_library_files([str(tmp_path), str(tmp_path) + os.sep])) == 1
+
+
+def test_nested_root_is_dropped_when_recursive(tmp_path):
+    nested = tmp_path / "nested"
+    nested.mkdir()
+    (nested / "a.mp4").write_bytes(b"video")
+    roots = normalize_roots([str(tmp_path), str(nested)], recursive=True)
+
+    assert roots == [os.path.realpath(tmp_path)]
+    assert len(list_library_files([str(tmp_path), str(nested)], recursive=True)) == 1
+    # Không đệ quy: root con là thư mục riêng, vẫn phải được quét
+    assert len(normalize_roots([str(tmp_path), str(nested)])) == 2
+
+
+class StopWatch(Exception):
+    pass
+
+
+def run_watch_polls(monkeypatch, folder, cache, polls, **kwargs):
+    """Chạy watch_folder `polls` lần kiểm tra thư mục, trả về các file đã bị đem đi decode"""
+    decoded = []
+    sleeps = []
+
+    def fake_sleep(_):
+        sleeps.append(1)
+        if len(sleeps) > polls:
+            raise StopWatch()
+
+    monkeypatch.setattr(dedup_engine.time, "sleep", fake_sleep)
+    monkeypatch.setattr(dedup_engine, "fingerprint_video", lambda path, *args: decoded.append(path))
+    with pytest.raises(StopWatch):
+        watch_folder([str(folder)], "ffmpeg", cache, [], interval=0, **kwargs)
+    return decoded
+
+
+def test_watch_does_not_retry_files_that_hung_ffmpeg(tmp_path, monkeypatch):
+    hung = tmp_path / "hung.mp4"
+    hung.write_bytes(b"video")
+    cache = FingerprintIndex(str(tmp_path / ".index"), {"fps": 1})
+    cache.skip(str(hung), os.stat(hung), "decode timeout")
+
+    assert run_watch_polls(monkeypatch, tmp_path, cache, polls=3) == []
+
+
+def test_watch_does_not_report_phase0_duplicates_again(tmp_path, monkeypatch):
+    copy = tmp_path / "copy.mp4"
+    copy.write_bytes(b"video")
+    cache = FingerprintIndex(str(tmp_path / ".index"), {"fps": 1})
+
+    assert run_watch_polls(monkeypatch, tmp_path, cache, polls=3, handled=[str(copy)]) == []
+    assert run_watch_polls(monkeypatch, tmp_path, cache, polls=3) == [str(copy)]
@@ -0,0 +1,25 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup_index import CandidateIndex, CANDIDATE_MAX_POSTINGS
+
+
+def test_crowded_signature_bucket_does_not_make_everything_a_candidate():
+    # Mọi video có chung intro (slot 0 giống hệt nhau); video 1 là bản trùng của video 0
+    rng = random.Random(3)
+    count = CANDIDATE_MAX_POSTINGS * 2
+    index = CandidateIndex()
+    for i in range(count):
+        if i == 1:
+            signatures = dict(index.signatures[0])
+            signatures[3] ^= 1
+        else:
+            signatures = {0: 0x0123456789abcdef, 1: rng.getrandbits(64), 2: rng.getrandbits(64),
+                          3: rng.getrandbits(64)}
+        index.add(signatures)
+
+    assert index.candidates(0) == {1}
+    assert sum(len(index.candidates(i)) for i in range(count)) == 2
@@ -0,0 +1,39 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup_store import FingerprintIndex
+
+SETTINGS = {"fps": 1}
+
+
+def open_index(index_dir):
+    index = FingerprintIndex(str(index_dir), SETTINGS)
+    index.load()
+    return index
+
+
+def test_replayed_journal_survives_a_second_interruption(tmp_path):
+    stat = SimpleNamespace(st_size=100, st_mtime_ns=1)
+    index = open_index(tmp_path)
+    index.put(str(tmp_path / "a.mp4"), stat, 10.0, np.arange(20, dtype=np.uint64))
+    # Bị tắt trước save(), rồi lần chạy sau cũng bị tắt trước khi quét xong file nào
+    index._close_journal()
+
+    assert open_index(tmp_path).get(str(tmp_path / "a.mp4"), stat) is not None
+    index = open_index(tmp_path)
+    assert index.get(str(tmp_path / "a.mp4"), stat) is not None
+
+    index.put(str(tmp_path / "b.mp4"), stat, 10.0, np.arange(30, dtype=np.uint64))
+    index._close_journal()
+    index = open_index(tmp_path)
+    assert index.get(str(tmp_path / "a.mp4"), stat) is not None
+    assert index.get(str(tmp_path / "b.mp4"), stat) is not None
+
+    index.save()
+    assert not os.path.exists(tmp_path / "journal.jsonl")
+    assert open_index(tmp_path).get(str(tmp_path / "b.mp4"), stat) is not None
@@ -25,17 +25,17 @@ def ensure_library(package_name, import_name=None):
             else: print(err_msg)
 
 ensure_library("requests")
-ensure_library("pysrt")
 ensure_library("pydub")
 ensure_library("customtkinter")
 import re
 
 import requests
-import pysrt
 from pydub import AudioSegment
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 
+from subtitle_parser import parse_subtitles, is_subtitle_file
+
 # --- CẤU HÌNH MẶC ĐỊNH ---
 CONFIG_FILE = "dvmaker_config.json"
 DEFAULT_CONFIG = {
@@ -166,11 +166,11 @@ class VoicevoxLogic:
         raise Exception(f"Không thể tổng hợp âm thanh sau {max_retries} lần thử.")
 
     def process_srt(self, srt_path, output_path, speaker_id, format="wav", progress_callback=None):
-        subs = pysrt.open(srt_path)
+        subs = parse_subtitles(srt_path)
         combined_audio = AudioSegment.silent(duration=0)
         
         if len(subs) > 0:
-            last_end_time = subs[-1].end.ordinal
+            last_end_time = subs[-1].end
             combined_audio = AudioSegment.silent(duration=last_end_time + 2000)
 
         for i, sub in enumerate(subs):
@@ -191,7 +191,7 @@ class VoicevoxLogic:
                 segment = AudioSegment.from_wav(temp_file)
                 os.remove(temp_file)
                 
-                start_time = sub.start.ordinal
+                start_time = sub.start
                 combined_audio = combined_audio.overlay(segment, position=start_time)
                 
             except Exception as e:
@@ -315,12 +315,12 @@ class DVMakerLogic:
             raise e
 
     def process_srt(self, srt_path, output_path, ref_audio, ref_text, ref_lang, target_lang, speed=1.0, format="wav", progress_callback=None):
-        subs = pysrt.open(srt_path)
+        subs = parse_subtitles(srt_path)
         combined_audio = AudioSegment.silent(duration=0)
         
         if len(subs) > 0:
             # Tạo file rỗng dài bằng tổng thời gian file sub + 2 giây
-            last_end_time = subs[-1].end.ordinal
+            last_end_time = subs[-1].end
             combined_audio = AudioSegment.silent(duration=last_end_time + 2000)
 
         for i, sub in enumerate(subs):
@@ -344,7 +344,7 @@ class DVMakerLogic:
                 segment = AudioSegment.from_wav(temp_file)
                 os.remove(temp_file)
                 
-                start_time = sub.start.ordinal
+                start_time = sub.start
                 combined_audio = combined_audio.overlay(segment, position=start_time)
                 
             except Exception as e:
@@ -457,11 +457,11 @@ class FishSpeechLogic:
             raise Exception(f"Fish Speech API Error ({response.status_code}): {response.text}")
 
     def process_srt(self, srt_path, output_path, ref_audio_path, ref_text, format="wav", progress_callback=None):
-        subs = pysrt.open(srt_path)
+        subs = parse_subtitles(srt_path)
         combined_audio = AudioSegment.silent(duration=0)
         
         if len(subs) > 0:
-            last_end_time = subs[-1].end.ordinal
+            last_end_time = subs[-1].end
             combined_audio = AudioSegment.silent(duration=last_end_time + 2000)
 
         for i, sub in enumerate(subs):
@@ -479,7 +479,7 @@ class FishSpeechLogic:
                 segment = AudioSegment.from_wav(temp_output_file)
                 os.remove(temp_output_file)
                 
-                start_time = sub.start.ordinal
+                start_time = sub.start
                 combined_audio = combined_audio.overlay(segment, position=start_time)
                 
             except Exception as e:
@@ -761,7 +761,7 @@ Sau khi xong, quay lại Tool này, vào Tab TTS và bấm "Làm mới" (nếu c
             messagebox.showerror("Lỗi", str(e))
 
     def browse_input(self):
-        file_path = filedialog.askopenfilename(filetypes=[("Text/Subtitle", "*.txt *.srt")])
+        file_path = filedialog.askopenfilename(filetypes=[("Text/Subtitle", "*.txt *.srt *.vtt *.ass *.ssa")])
         if file_path:
             self.entry_input_path.delete(0, "end")
             self.entry_input_path.insert(0, file_path)
@@ -818,7 +818,7 @@ Sau khi xong, quay lại Tool này, vào Tab TTS và bấm "Làm mới" (nếu c
             name_only = os.path.splitext(filename)[0]
             output_file = os.path.join(output_folder, f"{name_only}_output.{out_format}")
 
-            if input_path.lower().endswith(".srt"):
+            if is_subtitle_file(input_path):
                 self.log("Phát hiện file SRT. Đang xử lý từng dòng theo timecode...")
                 self.logic.process_srt(
                     input_path, output_file, ref_audio, ref_text, ref_lang, target_lang, 
@@ -928,7 +928,7 @@ if __name__ == "__main__":
                 
                 electron_log(f"Bắt đầu xử lý JP VOICE: {input_path.name}")
 
-                if input_path.suffix.lower() == ".srt":
+                if is_subtitle_file(input_path):
                     logic.process_srt(
                         str(input_path), str(output_file), speaker_id,
                         format=out_format, progress_callback=electron_log
@@ -945,7 +945,7 @@ if __name__ == "__main__":
                 logic = FishSpeechLogic(params.get('apiUrl', 'http://127.0.0.1:8080'))
                 electron_log(f"Bắt đầu xử lý Fish Speech cho file: {input_path.name}")
 
-                if input_path.suffix.lower() == ".srt":
+                if is_subtitle_file(input_path):
                     logic.process_srt(
                         str(input_path), str(output_file), 
                         params['refAudio'], params['refText'],
@@ -982,8 +982,8 @@ if __name__ == "__main__":
 
                 electron_log(f"Bắt đầu xử lý GPT-SoVITS: {input_path.name} (Speed: {speed}, Pitch: {pitch})")
 
-                if input_path.suffix.lower() == ".srt":
-                    subs = pysrt.open(str(input_path))
+                if is_subtitle_file(input_path):
+                    subs = parse_subtitles(str(input_path))
                     total = len(subs)
 
                     def progress_wrapper(msg):